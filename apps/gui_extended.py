@@ -17,7 +17,7 @@
   - LoggingUtils: ログ管理
 ■ 主要機能:
   - 設定ファイル（config.json）ベースの初期化
-  - 動的プラグインシステム（plugins/ディレクトリから自動読み込み）
+  - 動的プラグインシステム（マニフェスト・エントリポイントから検出し、使用時に読み込み）
   - 複数レイアウトモード（タブモード/ツールバーモード）の切り替え
   - メニューシステム（ファイル、編集、表示、ツール、ヘルプ）
   - 進捗ダイアログ付き長時間処理実行
@@ -38,6 +38,7 @@ import customtkinter as ctk
 from image_toolkit.core.font_manager import FontManager
 from image_toolkit.core.style_manager import StyleManager
 from image_toolkit.core.image_utils import ImageUtils
+from image_toolkit.core.plugin_base import PluginManager
 from image_toolkit.widgets.scalable_widgets import ScalableLabel, StyledButton
 from image_toolkit.layouts.tab_mode import TabLayout
 # 以下はダミークラス（本来はplugins, layouts, widgets, utils等で拡張）
@@ -46,11 +47,6 @@ class ConfigManager:
         return default
     def save_config(self):
         pass
-class PluginManager:
-    def load_all_plugins(self, app):
-        pass
-    def get_loaded_plugins(self):
-        return []
 class MessageDialog:
     @staticmethod
     def show_info(*args, **kwargs):
@@ -102,12 +98,12 @@ class ExtendedGuiApp(ctk.CTk):
             self.font_mgr = FontManager(14)
         self.style_mgr = StyleManager()
         
+        # プラグイン検出（名前・メタデータのみ。モジュールはタブ構築時に読み込む）
+        self.load_plugins()
+        
         # UI構築
         self.setup_ui()
         
-        # プラグイン読み込み
-        self.load_plugins()
-        
         self.logger.info("拡張GUIアプリケーションが起動しました")
     
     def setup_window(self):
@@ -211,19 +207,42 @@ class ExtendedGuiApp(ctk.CTk):
         if not isinstance(self.current_layout, TabLayout):
             return
             
-        # プラグインのUIを各タブに追加
-        for plugin in self.plugin_manager.get_loaded_plugins():
-            if hasattr(plugin, 'create_ui'):
-                tab_parent = None
-                if plugin.name == "サンプルフィルター":
-                    tab_parent = self.current_layout.tabview.tab("フィルタ")
-                elif plugin.name == "画像分析":
-                    tab_parent = self.current_layout.tabview.tab("解析")
-                
-                if tab_parent:
-                    plugin_ui = plugin.create_ui(tab_parent)
-                    if plugin_ui:
-                        plugin_ui.pack(expand=True, fill="both", padx=10, pady=10)
+        # 配置先のタブ（マニフェストの tab）ごとにプラグイン名をまとめ、タブだけを先に用意する
+        # 各タブの中身（プラグインの読み込みと create_ui）は最初に表示された時に構築する
+        tabview = self.current_layout.tabview
+        self._pending_tabs = {}
+        for spec in self.plugin_manager.get_specs():
+            if not spec.tab:
+                continue
+            if spec.tab not in self._pending_tabs:
+                try:
+                    tabview.tab(spec.tab)
+                except ValueError:
+                    tabview.add(spec.tab)
+                self._pending_tabs[spec.tab] = []
+            self._pending_tabs[spec.tab].append(spec.name)
+        
+        tabview.configure(command=self.on_tab_changed)
+        self.build_tab_content(tabview.get())
+    
+    def on_tab_changed(self):
+        """タブ切り替え時に、未構築のタブの中身を構築"""
+        if isinstance(self.current_layout, TabLayout):
+            self.build_tab_content(self.current_layout.tabview.get())
+    
+    def build_tab_content(self, tab_name):
+        """タブに配置するプラグインを読み込み、UIを作成（2回目以降は何もしない）"""
+        names = self._pending_tabs.pop(tab_name, None)
+        if not names:
+            return
+        tab_parent = self.current_layout.tabview.tab(tab_name)
+        for name in names:
+            plugin = self.plugin_manager.get_plugin(name)
+            if plugin is not None and hasattr(plugin, 'create_ui'):
+                plugin_ui = plugin.create_ui(tab_parent)
+                if plugin_ui:
+                    plugin_ui.pack(expand=True, fill="both", padx=10, pady=10)
+        self.logger.info(f"タブ「{tab_name}」を構築しました")
     
     def setup_toolbar_content(self):
         """ツールバーレイアウトのコンテンツを設定"""
@@ -254,9 +273,8 @@ class ExtendedGuiApp(ctk.CTk):
     def load_plugins(self):
         """プラグインを読み込み"""
         try:
-            self.plugin_manager.load_all_plugins(self)
-            loaded_count = len(self.plugin_manager.get_loaded_plugins())
-            self.logger.info(f"{loaded_count}個のプラグインを読み込みました")
+            specs = self.plugin_manager.load_all_plugins(self)
+            self.logger.info(f"{len(specs)}個のプラグインを検出しました")
         except Exception as e:
             self.logger.error(f"プラグイン読み込みエラー: {e}")
     
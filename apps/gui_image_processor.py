@@ -6,16 +6,50 @@
 - 原画像と処理後画像の並列表示
 - リアルタイム画像処理プレビュー
 - 複数の画像処理フィルター
+- 処理設定の元に戻す/やり直し（Ctrl+Z / Ctrl+Y）
 """
 
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
+import copy
+import functools
+import json
+import multiprocessing
 import os
-from PIL import Image, ImageTk, ImageEnhance, ImageFilter, ImageOps
+import threading
+from PIL import Image
 import cv2
 import numpy as np
 from pathlib import Path
 
+from image_toolkit.core.duplicate_finder import compute_hashes, duplicates_to_hide, find_duplicate_groups
+from image_toolkit.core.edit_history import EditHistory
+from image_toolkit.core.export_queue import ExportQueue
+from image_toolkit.core.image_utils import ImageUtils
+from image_toolkit.core.memory_accountant import get_memory_accountant
+from image_toolkit.core.plugin_base import PluginManager
+from image_toolkit.core.presets import PresetStore, ProcessingPreset, resolve_plugins
+from image_toolkit.core.progressive_denoise import ProgressiveDenoiser
+from image_toolkit.core.quality_scoring import rank_images, score_images
+from image_toolkit.core.video_stream import is_multi_frame_path, make_preset_processor, process_multi_frame
+from image_toolkit.widgets.canvas_image_surface import CanvasImageSurface
+
+# GUIからワーカースレッド経由で起動するプロセスプール用のコンテキスト
+# （Tkや処理スレッドが動いている状態で fork すると、保持中のロックごと複製されてワーカーが停止することがある）
+WORKER_PROCESS_CONTEXT = multiprocessing.get_context("spawn")
+
+# 編集履歴の状態0（読み込んだままの画像）に対応する処理設定
+DEFAULT_EDIT_SETTINGS = {
+    "process_type": "基本調整",
+    "brightness": 1.0,
+    "contrast": 1.0,
+    "saturation": 1.0,
+    "plugin_settings": {},
+}
+
+# スライダー操作が止まってから履歴に記録するまでの時間（ドラッグ中の値を1ステップにまとめる）
+HISTORY_RECORD_DELAY_MS = 400
+
 
 class ImageProcessorApp(ctk.CTk):
     def __init__(self):
@@ -32,8 +66,49 @@ class ImageProcessorApp(ctk.CTk):
         self.original_image = None
         self.processed_image = None
         
+        # 処理タイプ・パラメータのコンパイル結果（プリセットの一括適用と同じ実装を使う）
+        self._compiled_preset = None
+        self._compiled_key = None
+        
+        # ノイズ処理のプログレッシブ実行（高速プレビュー → フル解像度結果）
+        self.denoiser = ProgressiveDenoiser()
+        self._denoise_poll_id = None
+        
+        # バックグラウンド保存キュー
+        self.export_queue = ExportQueue()
+        self._export_poll_id = None
+        
+        # 処理プリセット（読み込んだプリセットのプラグイン設定はプレビューと保存にも引き継ぐ）
+        self.preset_store = PresetStore()
+        self.plugin_settings = {}
+        
+        # プラグイン（プリセットのプラグイン設定の適用先。プラグインUIの「元に戻す」は編集履歴に接続）
+        self.plugin_manager = PluginManager()
+        self.plugin_manager.discover()
+        
+        # 編集履歴（処理設定の変更を1ステップとして記録し、元に戻す/やり直しで画像と設定を復元）
+        self.edit_history = None
+        self._history_record_id = None
+        
+        # 画質スコア（ナビゲーション順の並べ替え用）
+        self.quality_table = None
+        self._quality_thread = None
+        self._quality_result = None
+        
+        # 重複画像（ナビゲーションから隠した画像）
+        self.duplicate_groups = []
+        self.hidden_duplicates = []
+        self._duplicate_thread = None
+        self._duplicate_result = None
+        
+        # マルチページ画像の全ページ保存
+        self._frames_thread = None
+        self._frames_result = None
+        
         # GUI作成
         self.create_widgets()
+        self.bind("<Control-z>", self.undo_edit)
+        self.bind("<Control-y>", self.redo_edit)
         
     def create_widgets(self):
         """GUI要素を作成"""
@@ -89,6 +164,22 @@ class ImageProcessorApp(ctk.CTk):
         )
         self.next_button.pack(side="left", padx=5)
         
+        self.quality_button = ctk.CTkButton(
+            nav_frame,
+            text="🏆 画質順",
+            command=self.sort_by_quality,
+            width=100
+        )
+        self.quality_button.pack(side="left", padx=5)
+        
+        self.duplicate_button = ctk.CTkButton(
+            nav_frame,
+            text="🧹 重複を隠す",
+            command=self.toggle_duplicates,
+            width=110
+        )
+        self.duplicate_button.pack(side="left", padx=5)
+        
         # 保存ボタン
         self.save_button = ctk.CTkButton(
             control_frame,
@@ -98,6 +189,40 @@ class ImageProcessorApp(ctk.CTk):
         )
         self.save_button.pack(side="right", padx=10, pady=20)
         
+        # プリセット
+        self.load_preset_button = ctk.CTkButton(
+            control_frame,
+            text="📂 プリセット適用",
+            command=self.load_preset,
+            width=120
+        )
+        self.load_preset_button.pack(side="right", padx=5, pady=20)
+        
+        self.save_preset_button = ctk.CTkButton(
+            control_frame,
+            text="⭐ プリセット保存",
+            command=self.save_preset,
+            width=120
+        )
+        self.save_preset_button.pack(side="right", padx=5, pady=20)
+        
+        # 元に戻す/やり直し
+        self.redo_button = ctk.CTkButton(
+            control_frame,
+            text="↷ やり直し",
+            command=self.redo_edit,
+            width=90
+        )
+        self.redo_button.pack(side="right", padx=5, pady=20)
+        
+        self.undo_button = ctk.CTkButton(
+            control_frame,
+            text="↶ 元に戻す",
+            command=self.undo_edit,
+            width=90
+        )
+        self.undo_button.pack(side="right", padx=5, pady=20)
+        
     def create_image_display_area(self):
         """画像表示エリアを作成"""
         display_frame = ctk.CTkFrame(self.main_frame)
@@ -110,6 +235,7 @@ class ImageProcessorApp(ctk.CTk):
         ctk.CTkLabel(original_frame, text="原画像", font=("Arial", 16, "bold")).pack(pady=5)
         self.original_canvas = ctk.CTkCanvas(original_frame, bg="white")
         self.original_canvas.pack(fill="both", expand=True, padx=10, pady=10)
+        self.original_surface = CanvasImageSurface(self.original_canvas)
         
         # 処理後画像表示
         processed_frame = ctk.CTkFrame(display_frame)
@@ -118,6 +244,7 @@ class ImageProcessorApp(ctk.CTk):
         ctk.CTkLabel(processed_frame, text="処理後画像", font=("Arial", 16, "bold")).pack(pady=5)
         self.processed_canvas = ctk.CTkCanvas(processed_frame, bg="white")
         self.processed_canvas.pack(fill="both", expand=True, padx=10, pady=10)
+        self.processed_surface = CanvasImageSurface(self.processed_canvas)
         
     def create_parameter_panel(self):
         """処理パラメータパネルを作成"""
@@ -225,6 +352,10 @@ class ImageProcessorApp(ctk.CTk):
         supported_formats = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif'}
         
         self.image_files = []
+        self.quality_table = None
+        self.duplicate_groups = []
+        self.hidden_duplicates = []
+        self.duplicate_button.configure(text="🧹 重複を隠す")
         for file_path in Path(self.current_directory).iterdir():
             if file_path.suffix.lower() in supported_formats:
                 self.image_files.append(str(file_path))
@@ -242,7 +373,9 @@ class ImageProcessorApp(ctk.CTk):
             
         image_path = self.image_files[self.current_image_index]
         try:
-            self.original_image = Image.open(image_path)
+            # メモリ予算を超える画像は縮小デコード（できない形式はエラー）してスワップを避ける
+            self.original_image = get_memory_accountant().open_image(image_path)
+            self.reset_edit_history()
             self.display_original_image()
             self.update_image()
             self.update_navigation_label()
@@ -264,14 +397,8 @@ class ImageProcessorApp(ctk.CTk):
             
         display_image = self.resize_image_for_display(self.original_image, canvas_width, canvas_height)
         
-        # Canvas に表示
-        self.original_photo = ImageTk.PhotoImage(display_image)
-        self.original_canvas.delete("all")
-        self.original_canvas.create_image(
-            canvas_width//2, 
-            canvas_height//2, 
-            image=self.original_photo
-        )
+        # Canvas に表示（同じ表示サイズならPhotoImageを再利用）
+        self.original_surface.show(display_image, canvas_width, canvas_height)
         
     def resize_image_for_display(self, image, canvas_width, canvas_height):
         """表示用に画像をリサイズ"""
@@ -304,52 +431,65 @@ class ImageProcessorApp(ctk.CTk):
         self.contrast_value.configure(text=f"{contrast:.1f}")
         self.saturation_value.configure(text=f"{saturation:.1f}")
         
+        # 前回のパラメータで実行中のバックグラウンド処理は破棄
+        self.denoiser.cancel()
+        
         # 選択された処理タイプに応じて処理を実行
         process_type = self.process_type.get()
-        processed = self.apply_image_processing(self.original_image, process_type, brightness, contrast, saturation)
+        processed = self.apply_image_processing(
+            self.original_image, process_type, brightness, contrast, saturation, progressive=True
+        )
         
         self.processed_image = processed
         self.display_processed_image()
-        
-    def apply_image_processing(self, image, process_type, brightness, contrast, saturation):
-        """画像処理を適用"""
-        processed = image.copy()
-        
-        if process_type == "基本調整":
-            # 明度調整
-            enhancer = ImageEnhance.Brightness(processed)
-            processed = enhancer.enhance(brightness)
-            
-            # コントラスト調整
-            enhancer = ImageEnhance.Contrast(processed)
-            processed = enhancer.enhance(contrast)
-            
-            # 彩度調整
-            enhancer = ImageEnhance.Color(processed)
-            processed = enhancer.enhance(saturation)
-            
-        elif process_type == "芸術的効果":
-            processed = self.apply_artistic_effects(processed, brightness, contrast, saturation)
-            
-        elif process_type == "プロ補正":
-            processed = self.apply_professional_correction(processed, brightness, contrast, saturation)
-            
-        elif process_type == "フィルター効果":
-            processed = self.apply_filter_effects(processed, brightness, contrast, saturation)
-            
-        elif process_type == "エッジ・輪郭":
-            processed = self.apply_edge_detection(processed, brightness, contrast, saturation)
-            
-        elif process_type == "ノイズ処理":
-            processed = self.apply_noise_processing(processed, brightness, contrast, saturation)
-            
-        elif process_type == "色彩変換":
-            processed = self.apply_color_transformation(processed, brightness, contrast, saturation)
-            
-        elif process_type == "ヴィンテージ":
-            processed = self.apply_vintage_effects(processed, brightness, contrast, saturation)
-            
-        return processed
+        self.schedule_history_record()
+        
+    def compile_processing(self, process_type, brightness, contrast, saturation):
+        """処理タイプとパラメータをコンパイル（同じ設定が続く間はLUT・マスクのキャッシュを再利用）"""
+        key = (process_type, brightness, contrast, saturation, json.dumps(self.plugin_settings, sort_keys=True))
+        if self._compiled_key != key:
+            preset = ProcessingPreset("", process_type, {
+                "brightness": brightness,
+                "contrast": contrast,
+                "saturation": saturation,
+            }, self.plugin_settings)
+            self._compiled_preset = preset.compile(self.resolve_plugins(self.plugin_settings))
+            self._compiled_key = key
+        return self._compiled_preset
+    
+    def resolve_plugins(self, plugin_settings):
+        """プリセットのプラグイン設定に対応するプラグインを読み込み、「元に戻す」コールバックを編集履歴に接続"""
+        plugins = resolve_plugins(plugin_settings, self.plugin_manager)
+        for plugin in plugins:
+            self.connect_undo_callbacks(plugin)
+        return plugins
+    
+    def connect_undo_callbacks(self, plugin):
+        """プラグインの set_undo_*_callback をすべてアプリの元に戻す操作に接続"""
+        for attr in dir(plugin):
+            if attr.startswith("set_undo_") and attr.endswith("_callback"):
+                getattr(plugin, attr)(self.undo_edit)
+        
+    def apply_image_processing(self, image, process_type, brightness, contrast, saturation, progressive=False):
+        """
+        画像処理を適用（処理本体はプリセットの一括適用と共通の CompiledPreset）
+        progressive=True の場合、ノイズ除去は縮小プロキシの近似結果を先に返し、正確な結果はバックグラウンドで計算する
+        """
+        compiled = self.compile_processing(process_type, brightness, contrast, saturation)
+        rgb = np.asarray(ImageUtils.ensure_rgb(image))
+        if not (progressive and compiled.denoise_stage is not None):
+            return Image.fromarray(compiled.apply_array(rgb))
+        
+        cv_image = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+        self.denoiser.submit(
+            cv_image,
+            finalize=lambda denoised: Image.fromarray(compiled.apply_array(
+                cv2.cvtColor(denoised, cv2.COLOR_BGR2RGB), skip_denoise=True
+            ))
+        )
+        self.schedule_denoise_poll()
+        preview = cv2.cvtColor(self.denoiser.preview(cv_image), cv2.COLOR_BGR2RGB)
+        return Image.fromarray(compiled.apply_array(preview, skip_denoise=True))
         
     def display_processed_image(self):
         """処理後画像を表示"""
@@ -366,14 +506,8 @@ class ImageProcessorApp(ctk.CTk):
             
         display_image = self.resize_image_for_display(self.processed_image, canvas_width, canvas_height)
         
-        # Canvas に表示
-        self.processed_photo = ImageTk.PhotoImage(display_image)
-        self.processed_canvas.delete("all")
-        self.processed_canvas.create_image(
-            canvas_width//2, 
-            canvas_height//2, 
-            image=self.processed_photo
-        )
+        # Canvas に表示（同じ表示サイズならPhotoImageを再利用）
+        self.processed_surface.show(display_image, canvas_width, canvas_height)
         
     def previous_image(self):
         """前の画像に移動"""
@@ -393,10 +527,127 @@ class ImageProcessorApp(ctk.CTk):
             current = self.current_image_index + 1
             total = len(self.image_files)
             filename = Path(self.image_files[self.current_image_index]).name
-            self.image_label.configure(text=f"{current}/{total}: {filename}")
+            frames = getattr(self.original_image, "n_frames", 1)
+            pages = f" ({frames}ページ)" if frames > 1 else ""
+            self.image_label.configure(text=f"{current}/{total}: {filename}{pages}")
         else:
             self.image_label.configure(text="画像: 0/0")
             
+    def sort_by_quality(self):
+        """画質スコアを算出し、ナビゲーション順をスコアの高い順に並べ替え"""
+        if not self.image_files:
+            messagebox.showwarning("警告", "画像が読み込まれていません。")
+            return
+        if self._quality_thread is not None:
+            return
+        
+        # 数千枚規模でもUIを止めないよう、スコアリングはワーカースレッドからプロセスプールで実行
+        paths = list(self.image_files)
+        
+        def worker():
+            try:
+                self._quality_result = score_images(paths, mp_context=WORKER_PROCESS_CONTEXT)
+            except Exception as e:
+                self._quality_result = e
+        
+        self.quality_button.configure(state="disabled", text="⏳ 採点中")
+        self._quality_thread = threading.Thread(target=worker, daemon=True)
+        self._quality_thread.start()
+        self.after(200, self.poll_quality_result)
+    
+    def poll_quality_result(self):
+        """画質スコアの完了を確認してナビゲーション順に反映"""
+        if self._quality_thread.is_alive():
+            self.after(200, self.poll_quality_result)
+            return
+        self._quality_thread = None
+        result, self._quality_result = self._quality_result, None
+        self.quality_button.configure(state="normal", text="🏆 画質順")
+        if isinstance(result, Exception):
+            messagebox.showerror("エラー", f"画質スコアの算出に失敗しました: {str(result)}")
+            return
+        self.apply_quality_order(rank_images(result))
+    
+    def apply_quality_order(self, table):
+        """スコア表の順にナビゲーション順を並べ替え（表示中の画像は維持）"""
+        current_path = self.image_files[self.current_image_index] if self.image_files else None
+        loaded = set(self.image_files)
+        ranked = [path for path in table["path"] if path in loaded]
+        ranked_set = set(ranked)
+        self.quality_table = table
+        self.image_files = ranked + [path for path in self.image_files if path not in ranked_set]
+        if current_path in self.image_files:
+            self.current_image_index = self.image_files.index(current_path)
+        self.update_navigation_label()
+        print(f"🏆 画質順に並べ替えました: {len(ranked)} 枚")
+    
+    def toggle_duplicates(self):
+        """類似画像のうち1枚だけをナビゲーションに残す（隠している場合は元に戻す）"""
+        if self.hidden_duplicates:
+            self.image_files = self.image_files + self.hidden_duplicates
+            print(f"👀 隠していた重複画像 {len(self.hidden_duplicates)} 枚を戻しました")
+            self.hidden_duplicates = []
+            self.duplicate_button.configure(text="🧹 重複を隠す")
+            self.update_navigation_label()
+            return
+        if not self.image_files:
+            messagebox.showwarning("警告", "画像が読み込まれていません。")
+            return
+        if self._duplicate_thread is not None:
+            return
+        
+        # 知覚ハッシュの算出（縮小デコード）はワーカースレッドからプロセスプールで実行
+        paths = list(self.image_files)
+        
+        def worker():
+            try:
+                self._duplicate_result = find_duplicate_groups(compute_hashes(paths, mp_context=WORKER_PROCESS_CONTEXT))
+            except Exception as e:
+                self._duplicate_result = e
+        
+        self.duplicate_button.configure(state="disabled", text="⏳ 検出中")
+        self._duplicate_thread = threading.Thread(target=worker, daemon=True)
+        self._duplicate_thread.start()
+        self.after(200, self.poll_duplicate_result)
+    
+    def poll_duplicate_result(self):
+        """重複検出の完了を確認してナビゲーションに反映"""
+        if self._duplicate_thread.is_alive():
+            self.after(200, self.poll_duplicate_result)
+            return
+        self._duplicate_thread = None
+        result, self._duplicate_result = self._duplicate_result, None
+        self.duplicate_button.configure(state="normal", text="🧹 重複を隠す")
+        if isinstance(result, Exception):
+            messagebox.showerror("エラー", f"重複画像の検出に失敗しました: {str(result)}")
+            return
+        self.apply_duplicate_filter(result)
+    
+    def apply_duplicate_filter(self, groups):
+        """重複グループごとに1枚（画質スコアがあれば最高スコア）を残し、残りをナビゲーションから隠す"""
+        scores = None
+        if self.quality_table is not None:
+            scores = dict(zip(self.quality_table["path"], self.quality_table["quality"]))
+        hidden = set(duplicates_to_hide(groups, scores))
+        current_path = self.image_files[self.current_image_index] if self.image_files else None
+        self.duplicate_groups = groups
+        self.hidden_duplicates = [path for path in self.image_files if path in hidden]
+        self.image_files = [path for path in self.image_files if path not in hidden]
+        if not self.hidden_duplicates:
+            print("🧹 重複画像は見つかりませんでした")
+            return
+        self.duplicate_button.configure(text=f"👀 重複を表示 ({len(self.hidden_duplicates)})")
+        print(f"🧹 {len(groups)} グループ・{len(self.hidden_duplicates)} 枚の重複画像を隠しました")
+        if current_path in self.image_files:
+            self.current_image_index = self.image_files.index(current_path)
+            self.update_navigation_label()
+        else:
+            # 表示中の画像を隠した場合は、同じグループで残した画像を表示
+            kept = next((path for group in groups if current_path in group
+                         for path in group if path not in hidden), None)
+            self.current_image_index = self.image_files.index(kept) if kept in self.image_files else 0
+            self.load_current_image()
+            
     def on_process_type_change(self, choice):
         """処理タイプ変更時の処理"""
         # TODO: 選択された処理タイプに応じてパラメータパネルを変更
@@ -413,207 +664,240 @@ class ImageProcessorApp(ctk.CTk):
             filetypes=[
                 ("PNG files", "*.png"),
                 ("JPEG files", "*.jpg"),
+                ("TIFF files", "*.tiff"),
+                ("GIF files", "*.gif"),
+                ("WebP files", "*.webp"),
                 ("All files", "*.*")
             ]
         )
         
+        # マルチページ画像をTIFF/GIFで保存する場合は全ページを処理して書き出す
+        if file_path and is_multi_frame_path(file_path) and getattr(self.original_image, "n_frames", 1) > 1:
+            self.save_all_frames(self.image_files[self.current_image_index], file_path)
+            return
+        
         if file_path:
+            # エンコードはバックグラウンドで実行し、UIスレッドをブロックしない
             try:
-                self.processed_image.save(file_path)
-                messagebox.showinfo("成功", f"画像を保存しました: {file_path}")
+                self.export_queue.submit(self.processed_image, file_path)
             except Exception as e:
                 messagebox.showerror("エラー", f"画像の保存に失敗しました: {str(e)}")
+                return
+            self.schedule_export_poll()
+    
+    def save_all_frames(self, source_path, file_path):
+        """現在の処理設定をマルチページ画像の全ページに適用し、1ページずつ書き出す"""
+        if self._frames_thread is not None:
+            return
+        process = make_preset_processor(self.get_current_preset("").compile(plugin_manager=self.plugin_manager))
+        
+        def worker():
+            try:
+                self._frames_result = process_multi_frame(source_path, file_path, process)
+            except Exception as e:
+                self._frames_result = e
+        
+        self.save_button.configure(state="disabled", text="⏳ 保存中")
+        self._frames_thread = threading.Thread(target=worker, daemon=True)
+        self._frames_thread.start()
+        self.after(200, lambda: self.poll_frames_result(file_path))
+    
+    def poll_frames_result(self, file_path):
+        """全ページ保存の完了を確認して通知"""
+        if self._frames_thread.is_alive():
+            self.after(200, lambda: self.poll_frames_result(file_path))
+            return
+        self._frames_thread = None
+        result, self._frames_result = self._frames_result, None
+        self.save_button.configure(state="normal", text="💾 保存")
+        if isinstance(result, Exception):
+            messagebox.showerror("エラー", f"画像の保存に失敗しました: {str(result)}")
+            return
+        print(f"💾 保存完了: {file_path} ({result['frames']} ページ, {result['elapsed']:.1f} 秒)")
+        messagebox.showinfo("成功", f"{result['frames']} ページを保存しました: {file_path}")
+    
+    def schedule_export_poll(self):
+        """保存ジョブの完了確認をスケジュール"""
+        if self._export_poll_id is None:
+            self._export_poll_id = self.after(100, self.poll_export_results)
+    
+    def poll_export_results(self):
+        """完了した保存ジョブの結果を通知"""
+        self._export_poll_id = None
+        pending = self.export_queue.pending_count()
+        for result in self.export_queue.poll_results():
+            if result["error"]:
+                messagebox.showerror("エラー", f"画像の保存に失敗しました: {result['error']}")
+            else:
+                size_kb = result["size_bytes"] / 1024
+                print(f"💾 保存完了: {result['path']} ({size_kb:.0f} KB, {result['encode_time'] * 1000:.0f} ms)")
+                messagebox.showinfo("成功", f"画像を保存しました: {result['path']}")
+        if pending:
+            self.schedule_export_poll()
                 
-    # ========== 高度な画像処理メソッド ==========
+    def get_current_preset(self, name):
+        """現在の処理タイプとスライダー値をプリセットとして取得"""
+        return ProcessingPreset(
+            name,
+            self.process_type.get(),
+            {
+                "brightness": self.brightness_slider.get() / 100.0,
+                "contrast": self.contrast_slider.get() / 100.0,
+                "saturation": self.saturation_slider.get() / 100.0,
+            },
+            self.plugin_settings
+        )
     
-    def apply_artistic_effects(self, image, brightness, contrast, saturation):
-        """芸術的効果を適用"""
-        processed = image.copy()
-        
-        # セピア効果（brightness値で強度調整）
-        if brightness > 1.0:
-            # RGB画像をセピア調に変換
-            sepia_matrix = (
-                0.393 + 0.607 * (2 - brightness), 0.769 - 0.769 * (brightness - 1), 0.189 - 0.189 * (brightness - 1), 0,
-                0.349 - 0.349 * (brightness - 1), 0.686 + 0.314 * (2 - brightness), 0.168 - 0.168 * (brightness - 1), 0,
-                0.272 - 0.272 * (brightness - 1), 0.534 - 0.534 * (brightness - 1), 0.131 + 0.869 * (2 - brightness), 0
-            )
-            processed = processed.convert('RGB')
-            processed = processed.convert('RGB', sepia_matrix)
-        
-        # 油絵風効果（contrast値で強度調整）
-        if contrast > 1.0:
-            # OpenCVを使用してより高度な処理
-            cv_image = cv2.cvtColor(np.array(processed), cv2.COLOR_RGB2BGR)
-            # 平滑化フィルタを適用
-            kernel_size = int(contrast * 5)
-            if kernel_size % 2 == 0:
-                kernel_size += 1
-            cv_image = cv2.bilateralFilter(cv_image, kernel_size, 80, 80)
-            processed = Image.fromarray(cv2.cvtColor(cv_image, cv2.COLOR_BGR2RGB))
-        
-        # ポスタライゼーション（saturation値で色数調整）
-        if saturation != 1.0:
-            # 色数を制限してポスター風に
-            color_levels = max(2, int(8 * saturation))
-            cv_image = cv2.cvtColor(np.array(processed), cv2.COLOR_RGB2BGR)
-            factor = 255.0 / (color_levels - 1)
-            cv_image = (cv_image / factor).astype(np.uint8) * factor
-            processed = Image.fromarray(cv2.cvtColor(cv_image, cv2.COLOR_BGR2RGB))
-        
-        return processed
+    def save_preset(self):
+        """現在の設定をプリセットとして保存"""
+        name = ctk.CTkInputDialog(text="プリセット名:", title="プリセット保存").get_input()
+        if not name:
+            return
+        try:
+            self.preset_store.add(self.get_current_preset(name))
+            messagebox.showinfo("成功", f"プリセットを保存しました: {name}")
+        except Exception as e:
+            messagebox.showerror("エラー", f"プリセットの保存に失敗しました: {str(e)}")
+    
+    def load_preset(self):
+        """保存済みプリセットをスライダーに反映"""
+        names = self.preset_store.list_names()
+        if not names:
+            messagebox.showwarning("警告", "保存済みのプリセットがありません。")
+            return
+        name = ctk.CTkInputDialog(
+            text="プリセット名:\n" + "\n".join(names), title="プリセット適用"
+        ).get_input()
+        preset = self.preset_store.get(name) if name else None
+        if preset is None:
+            return
+        self.plugin_settings = {name: dict(settings) for name, settings in preset.plugin_settings.items()}
+        self.process_type.set(preset.process_type)
+        self.brightness_slider.set(preset.params["brightness"] * 100)
+        self.contrast_slider.set(preset.params["contrast"] * 100)
+        self.saturation_slider.set(preset.params["saturation"] * 100)
+        self.update_image()
+                
+    # ========== バックグラウンドノイズ除去 ==========
     
-    def apply_professional_correction(self, image, brightness, contrast, saturation):
-        """プロフェッショナル補正を適用"""
-        processed = image.copy()
-        
-        # ヒストグラム均等化
-        if brightness > 1.2:
-            cv_image = cv2.cvtColor(np.array(processed), cv2.COLOR_RGB2BGR)
-            # 各チャンネルに対してヒストグラム均等化
-            cv_image[:,:,0] = cv2.equalizeHist(cv_image[:,:,0])
-            cv_image[:,:,1] = cv2.equalizeHist(cv_image[:,:,1])
-            cv_image[:,:,2] = cv2.equalizeHist(cv_image[:,:,2])
-            processed = Image.fromarray(cv2.cvtColor(cv_image, cv2.COLOR_BGR2RGB))
-        
-        # ガンマ補正
-        if contrast != 1.0:
-            gamma = 1.0 / contrast
-            cv_image = np.array(processed, dtype=np.float32) / 255.0
-            cv_image = np.power(cv_image, gamma)
-            cv_image = (cv_image * 255).astype(np.uint8)
-            processed = Image.fromarray(cv_image)
-        
-        # アンシャープマスク（シャープネス強化）
-        if saturation > 1.0:
-            cv_image = cv2.cvtColor(np.array(processed), cv2.COLOR_RGB2BGR)
-            blurred = cv2.GaussianBlur(cv_image, (0, 0), 2.0)
-            sharpened = cv2.addWeighted(cv_image, 1.0 + saturation, blurred, -saturation, 0)
-            processed = Image.fromarray(cv2.cvtColor(sharpened, cv2.COLOR_BGR2RGB))
-        
-        return processed
+    def schedule_denoise_poll(self):
+        """バックグラウンドノイズ除去の完了確認をスケジュール"""
+        if self._denoise_poll_id is None:
+            self._denoise_poll_id = self.after(50, self.poll_denoise_result)
     
-    def apply_filter_effects(self, image, brightness, contrast, saturation):
-        """フィルター効果を適用"""
-        processed = image.copy()
-        
-        # ぼかし効果
-        if brightness < 1.0:
-            blur_radius = (1.0 - brightness) * 5
-            processed = processed.filter(ImageFilter.GaussianBlur(radius=blur_radius))
-        
-        # シャープネス
-        elif brightness > 1.0:
-            sharpness_factor = brightness
-            enhancer = ImageEnhance.Sharpness(processed)
-            processed = enhancer.enhance(sharpness_factor)
-        
-        # エンボス効果
-        if contrast > 1.5:
-            processed = processed.filter(ImageFilter.EMBOSS)
-        
-        # 輪郭強調
-        if saturation > 1.5:
-            processed = processed.filter(ImageFilter.EDGE_ENHANCE_MORE)
-        
-        return processed
+    def poll_denoise_result(self):
+        """フル解像度のノイズ除去結果が届いたらプレビューと置き換える"""
+        self._denoise_poll_id = None
+        # 完了の取りこぼしを防ぐため、結果取得より先に実行中かどうかを確認
+        busy = self.denoiser.is_busy()
+        result = self.denoiser.poll()
+        if result is not None:
+            _, processed = result
+            self.processed_image = processed
+            self.display_processed_image()
+        elif busy:
+            self.schedule_denoise_poll()
     
-    def apply_edge_detection(self, image, brightness, contrast, saturation):
-        """エッジ検出を適用"""
-        cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2GRAY)
-        
-        # Cannyエッジ検出
-        low_threshold = int(50 * brightness)
-        high_threshold = int(150 * contrast)
-        edges = cv2.Canny(cv_image, low_threshold, high_threshold)
-        
-        # エッジを3チャンネルに変換
-        edges_colored = cv2.cvtColor(edges, cv2.COLOR_GRAY2RGB)
-        
-        # 元画像とエッジを合成
-        if saturation > 0.5:
-            alpha = min(saturation, 1.0)
-            cv_original = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-            cv_original = cv2.cvtColor(cv_original, cv2.COLOR_BGR2RGB)
-            blended = cv2.addWeighted(cv_original, 1-alpha, edges_colored, alpha, 0)
-            return Image.fromarray(blended)
-        else:
-            return Image.fromarray(edges_colored)
+    # ========== 編集履歴（元に戻す/やり直し） ==========
     
-    def apply_noise_processing(self, image, brightness, contrast, saturation):
-        """ノイズ処理を適用"""
-        cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-        
-        # ノイズ除去
-        if brightness > 1.0:
-            # Non-local Means Denoising
-            denoised = cv2.fastNlMeansDenoisingColored(cv_image, None, 10, 10, 7, 21)
-            processed = Image.fromarray(cv2.cvtColor(denoised, cv2.COLOR_BGR2RGB))
+    def reset_edit_history(self):
+        """読み込んだ画像を状態0として履歴をやり直す"""
+        self.cancel_history_record()
+        base = np.asarray(ImageUtils.ensure_rgb(self.original_image))
+        if self.edit_history is None:
+            self.edit_history = EditHistory(base)
         else:
-            processed = image.copy()
-        
-        # モルフォロジー演算
-        if contrast > 1.0:
-            kernel = np.ones((3,3), np.uint8)
-            cv_image = cv2.cvtColor(np.array(processed), cv2.COLOR_RGB2BGR)
-            cv_image = cv2.morphologyEx(cv_image, cv2.MORPH_CLOSE, kernel)
-            processed = Image.fromarray(cv2.cvtColor(cv_image, cv2.COLOR_BGR2RGB))
-        
-        return processed
+            self.edit_history.clear(base)
     
-    def apply_color_transformation(self, image, brightness, contrast, saturation):
-        """色彩変換を適用"""
-        processed = image.copy()
-        
-        # HSV色空間での操作
-        cv_image = cv2.cvtColor(np.array(processed), cv2.COLOR_RGB2HSV)
-        
-        # 色相シフト
-        cv_image[:,:,0] = (cv_image[:,:,0] + int(brightness * 30)) % 180
-        
-        # 明度調整
-        cv_image[:,:,2] = np.clip(cv_image[:,:,2] * contrast, 0, 255)
-        
-        # 彩度調整
-        cv_image[:,:,1] = np.clip(cv_image[:,:,1] * saturation, 0, 255)
-        
-        processed = Image.fromarray(cv2.cvtColor(cv_image, cv2.COLOR_HSV2RGB))
-        return processed
+    def current_edit_settings(self):
+        """現在の処理タイプ・スライダー値・プラグイン設定（履歴の1ステップのパラメータ）"""
+        return {
+            "process_type": self.process_type.get(),
+            "brightness": self.brightness_slider.get() / 100.0,
+            "contrast": self.contrast_slider.get() / 100.0,
+            "saturation": self.saturation_slider.get() / 100.0,
+            "plugin_settings": copy.deepcopy(self.plugin_settings),
+        }
+    
+    def schedule_history_record(self):
+        """設定変更の記録をスケジュール（続けて変更された場合は最後の設定だけを記録）"""
+        if self.edit_history is None:
+            return
+        self.cancel_history_record()
+        self._history_record_id = self.after(HISTORY_RECORD_DELAY_MS, self.record_edit)
+    
+    def cancel_history_record(self):
+        if self._history_record_id is not None:
+            self.after_cancel(self._history_record_id)
+            self._history_record_id = None
+    
+    def record_edit(self):
+        """表示中の処理結果を履歴に記録（ノイズ除去のプレビュー表示中は最終結果が届くまで待つ）"""
+        self._history_record_id = None
+        if self._denoise_poll_id is not None:
+            self.schedule_history_record()
+            return
+        self.push_current_edit()
+    
+    def push_current_edit(self):
+        settings = self.current_edit_settings()
+        current = self.edit_history.params_at(self.edit_history.position) or DEFAULT_EDIT_SETTINGS
+        if self.processed_image is None or settings == current:
+            return
+        # 画像は元画像と設定から再計算できるため、パラメータだけのステップとして記録する
+        self.edit_history.push_edit(
+            settings["process_type"], settings,
+            functools.partial(self.render_edit, np.asarray(ImageUtils.ensure_rgb(self.original_image))),
+            result=np.asarray(self.processed_image)
+        )
+    
+    def render_edit(self, source, previous, process_type, brightness, contrast, saturation, plugin_settings):
+        """履歴のステップから画像を再計算（設定は元画像に対する絶対値のため直前の状態は使わない）"""
+        preset = ProcessingPreset("", process_type, {
+            "brightness": brightness,
+            "contrast": contrast,
+            "saturation": saturation,
+        }, plugin_settings)
+        return preset.compile(self.resolve_plugins(plugin_settings)).apply_array(source)
+    
+    def undo_edit(self, *args):
+        """1ステップ前の処理設定と画像に戻す（プラグインUIの「元に戻す」からも呼ばれる）"""
+        if self.edit_history is None:
+            return
+        # 記録待ちの変更があれば先に確定してから戻す（ノイズ除去の途中結果は記録しない）
+        if self._history_record_id is not None:
+            self.cancel_history_record()
+            if self._denoise_poll_id is None:
+                self.push_current_edit()
+        image = self.edit_history.undo()
+        if image is not None:
+            self.restore_edit(image)
+    
+    def redo_edit(self, *args):
+        """元に戻したステップをやり直す"""
+        if self.edit_history is None:
+            return
+        self.cancel_history_record()
+        image = self.edit_history.redo()
+        if image is not None:
+            self.restore_edit(image)
+    
+    def restore_edit(self, image):
+        """履歴の画像を表示し、その画像を生成した処理設定をスライダーに反映"""
+        self.denoiser.cancel()
+        settings = self.edit_history.params_at(self.edit_history.position) or DEFAULT_EDIT_SETTINGS
+        self.plugin_settings = copy.deepcopy(settings["plugin_settings"])
+        self.process_type.set(settings["process_type"])
+        self.brightness_slider.set(settings["brightness"] * 100)
+        self.contrast_slider.set(settings["contrast"] * 100)
+        self.saturation_slider.set(settings["saturation"] * 100)
+        self.brightness_value.configure(text=f"{settings['brightness']:.1f}")
+        self.contrast_value.configure(text=f"{settings['contrast']:.1f}")
+        self.saturation_value.configure(text=f"{settings['saturation']:.1f}")
+        # キーフレームは読み取り専用のためコピーして表示用画像にする
+        self.processed_image = Image.fromarray(np.array(image))
+        self.display_processed_image()
     
-    def apply_vintage_effects(self, image, brightness, contrast, saturation):
-        """ヴィンテージ効果を適用"""
-        processed = image.copy()
-        
-        # 古い写真風の色調整
-        cv_image = cv2.cvtColor(np.array(processed), cv2.COLOR_RGB2BGR)
-        
-        # 黄色っぽいヴィンテージ感
-        cv_image[:,:,0] = np.clip(cv_image[:,:,0] * (0.8 + brightness * 0.2), 0, 255)  # Blue減少
-        cv_image[:,:,1] = np.clip(cv_image[:,:,1] * (0.9 + contrast * 0.1), 0, 255)   # Green
-        cv_image[:,:,2] = np.clip(cv_image[:,:,2] * (1.0 + saturation * 0.2), 0, 255) # Red増加
-        
-        # ビネット効果（周辺減光）
-        h, w = cv_image.shape[:2]
-        center_x, center_y = w // 2, h // 2
-        
-        # 距離マップ作成
-        Y, X = np.ogrid[:h, :w]
-        dist_from_center = np.sqrt((X - center_x)**2 + (Y - center_y)**2)
-        max_dist = np.sqrt(center_x**2 + center_y**2)
-        
-        # ビネット強度
-        vignette_strength = 0.3 + (saturation - 1.0) * 0.2
-        vignette_mask = 1 - (dist_from_center / max_dist) * vignette_strength
-        vignette_mask = np.clip(vignette_mask, 0.3, 1.0)
-        
-        # 各チャンネルに適用
-        for i in range(3):
-            cv_image[:,:,i] = cv_image[:,:,i] * vignette_mask
-        
-        processed = Image.fromarray(cv2.cvtColor(cv_image.astype(np.uint8), cv2.COLOR_BGR2RGB))
-        return processed
-
-
 def main():
     """メイン関数"""
     app = ImageProcessorApp()
@@ -0,0 +1,295 @@
+"""
+画像解析エンジン
+シャープネス（ラプラシアン分散）、FFT振幅スペクトル、ノイズσ推定、ORB/FASTキーポイント、ヒストグラム統計を計算する。
+既定では縮小プロキシ上で計算し、グレースケール画像やスペクトル等の中間データは
+同じ画像バージョン内で全指標から共有する（指標ごとにフル解像度を走査しない）。
+"""
+
+import math
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Union
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from image_toolkit.core.memory_accountant import PRIORITY_CACHE, get_memory_accountant
+
+METRICS = ("histogram", "sharpness", "noise", "frequency", "features")
+
+# Immerkærのノイズ推定カーネル（画像の構造成分を打ち消す2次差分の差）
+_NOISE_KERNEL = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+
+
+class AnalysisContext:
+    """
+    1つの画像バージョンに対する中間データ
+    各中間データは最初に必要とされた時に1回だけ計算し、以降の指標で再利用する
+    """
+    def __init__(self, rgb: np.ndarray, max_side: Optional[int]):
+        height, width = rgb.shape[:2]
+        self.full_size = (width, height)
+        scale = 1.0
+        if max_side and max(height, width) > max_side:
+            scale = max_side / max(height, width)
+            proxy_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            rgb = cv2.resize(rgb, proxy_size, interpolation=cv2.INTER_AREA)
+        self.scale = scale
+        self.rgb = rgb
+        self._cache: Dict[str, Any] = {}
+        # nbytes() は別スレッド（メモリ管理）から呼ばれるため、中間データの登録と走査を保護する
+        self._cache_lock = threading.Lock()
+
+    @property
+    def is_proxy(self) -> bool:
+        return self.scale < 1.0
+
+    def _get(self, key: str, compute):
+        value = self._cache.get(key)
+        if value is None:
+            value = compute()
+            with self._cache_lock:
+                value = self._cache.setdefault(key, value)
+        return value
+
+    @property
+    def gray(self) -> np.ndarray:
+        return self._get("gray", lambda: cv2.cvtColor(self.rgb, cv2.COLOR_RGB2GRAY))
+
+    @property
+    def gray_float(self) -> np.ndarray:
+        return self._get("gray_float", lambda: self.gray.astype(np.float32))
+
+    @property
+    def laplacian(self) -> np.ndarray:
+        return self._get("laplacian", lambda: cv2.Laplacian(self.gray_float, cv2.CV_32F))
+
+    @property
+    def spectrum(self) -> np.ndarray:
+        """中心シフト済みのFFT振幅"""
+        return self._get("spectrum", lambda: np.abs(np.fft.fftshift(np.fft.fft2(self.gray_float))).astype(np.float32))
+
+    @property
+    def channel_histograms(self) -> np.ndarray:
+        """RGB各チャンネルの256ビンヒストグラム（3×256）"""
+        return self._get("channel_histograms", lambda: np.stack([
+            cv2.calcHist([self.rgb], [channel], None, [256], [0, 256]).ravel() for channel in range(3)
+        ]))
+
+    @property
+    def gray_histogram(self) -> np.ndarray:
+        return self._get("gray_histogram", lambda: cv2.calcHist([self.gray], [0], None, [256], [0, 256]).ravel())
+
+    def nbytes(self) -> int:
+        total = self.rgb.nbytes
+        with self._cache_lock:
+            values = list(self._cache.values())
+        for value in values:
+            if isinstance(value, np.ndarray):
+                total += value.nbytes
+        return total
+
+
+class AnalysisEngine:
+    """
+    画像解析エンジン
+
+    analyze() は指定した指標を1つの AnalysisContext 上でまとめて計算し、結果を画像バージョンごとにキャッシュする。
+    version を渡さない場合は形状と全画素のCRCからバージョンを判定する（画素を1つでも変えれば別バージョン）。
+    キャッシュの一覧と結果の登録はメモリ管理の total_bytes() / evict() が別スレッドから走査するためロックで保護する。
+    指標の計算自体はロックの外で、同じバージョンの計算はバージョンごとのロックで順に行う（同じ指標を二重に計算しない）。
+    """
+    def __init__(self, proxy_max_side: Optional[int] = 1024, orb_features: int = 500,
+                 fast_threshold: int = 20, spectrum_display_side: int = 256, max_entries: int = 4):
+        self.proxy_max_side = proxy_max_side
+        self.orb_features = orb_features
+        self.fast_threshold = fast_threshold
+        self.spectrum_display_side = spectrum_display_side
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        get_memory_accountant().register(self, "解析キャッシュ", PRIORITY_CACHE)
+
+    def analyze(self, image: Union[Image.Image, np.ndarray], metrics: Optional[Iterable[str]] = None,
+                version: Optional[Hashable] = None, full_resolution: bool = False) -> Dict[str, Any]:
+        """
+        指標をまとめて計算して {指標名: 結果} を返す（計算済みの指標はキャッシュから返す）
+        image はPIL画像またはRGB配列、metrics を省略すると全指標を計算する
+        """
+        metrics = list(metrics) if metrics is not None else list(METRICS)
+        for metric in metrics:
+            if metric not in METRICS:
+                raise ValueError(f"未知の解析指標です: {metric}")
+
+        rgb = self._as_rgb_array(image)
+        key = (version if version is not None else self._fingerprint(rgb), full_resolution)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            entry = {"context": AnalysisContext(rgb, None if full_resolution else self.proxy_max_side), "results": {},
+                     "lock": threading.Lock()}
+            with self._lock:
+                entry = self._entries.setdefault(key, entry)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        context = entry["context"]
+        results = entry["results"]
+        with entry["lock"]:
+            for metric in metrics:
+                if metric not in results:
+                    value = getattr(self, f"_compute_{metric}")(context)
+                    with self._lock:
+                        results[metric] = value
+            report = {metric: results[metric] for metric in metrics}
+        report["proxy_scale"] = context.scale
+        return report
+
+    # ---------- 個別指標 ----------
+
+    def sharpness(self, image, version: Optional[Hashable] = None) -> float:
+        return self.analyze(image, ["sharpness"], version)["sharpness"]["laplacian_variance"]
+
+    def noise_sigma(self, image, version: Optional[Hashable] = None) -> float:
+        return self.analyze(image, ["noise"], version)["noise"]["sigma"]
+
+    def _compute_sharpness(self, context: AnalysisContext) -> Dict[str, float]:
+        laplacian = context.laplacian
+        _, std = cv2.meanStdDev(laplacian)
+        return {
+            "laplacian_variance": float(std[0, 0] ** 2),
+            "laplacian_mean_abs": float(cv2.mean(np.abs(laplacian))[0]),
+        }
+
+    def _compute_noise(self, context: AnalysisContext) -> Dict[str, float]:
+        # Immerkær (1996) の高速推定: σ = sqrt(π/2) / (6(W-2)(H-2)) Σ|I * N|
+        height, width = context.gray.shape
+        if height < 3 or width < 3:
+            return {"sigma": 0.0}
+        response = cv2.filter2D(context.gray_float, cv2.CV_32F, _NOISE_KERNEL)[1:-1, 1:-1]
+        sigma = math.sqrt(math.pi / 2) * float(np.abs(response).sum()) / (6.0 * (width - 2) * (height - 2))
+        # 縮小プロキシでは画素平均によりノイズが約 1/縮小率 倍小さくなるため補正
+        return {"sigma": sigma / context.scale, "measured_sigma": sigma}
+
+    def _compute_frequency(self, context: AnalysisContext) -> Dict[str, Any]:
+        spectrum = context.spectrum
+        height, width = spectrum.shape
+        log_spectrum = np.log1p(spectrum)
+        display = cv2.normalize(log_spectrum, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+        if max(height, width) > self.spectrum_display_side:
+            scale = self.spectrum_display_side / max(height, width)
+            display = cv2.resize(display, (max(1, int(width * scale)), max(1, int(height * scale))),
+                                 interpolation=cv2.INTER_AREA)
+
+        # 中心からの正規化半径で低周波と高周波のエネルギー比を算出（DC成分は除外）
+        ys = (np.arange(height, dtype=np.float32) - height // 2) / max(1, height // 2)
+        xs = (np.arange(width, dtype=np.float32) - width // 2) / max(1, width // 2)
+        radius = np.sqrt(ys[:, np.newaxis] ** 2 + xs[np.newaxis, :] ** 2)
+        energy = spectrum ** 2
+        energy[height // 2, width // 2] = 0
+        total = float(energy.sum())
+        high = float(energy[radius > 0.5].sum())
+        return {
+            "magnitude_spectrum": display,
+            "high_frequency_ratio": high / total if total > 0 else 0.0,
+        }
+
+    def _compute_features(self, context: AnalysisContext) -> Dict[str, Any]:
+        gray = context.gray
+        orb = cv2.ORB_create(nfeatures=self.orb_features)
+        keypoints, descriptors = orb.detectAndCompute(gray, None)
+        fast = cv2.FastFeatureDetector_create(threshold=self.fast_threshold)
+        fast_count = len(fast.detect(gray, None))
+        # キーポイント座標・サイズは元画像の座標系に戻す
+        inverse = 1.0 / context.scale
+        points = np.array([(kp.pt[0] * inverse, kp.pt[1] * inverse, kp.size * inverse, kp.response)
+                           for kp in keypoints], dtype=np.float32).reshape(-1, 4)
+        return {
+            "orb_keypoints": points,
+            "orb_descriptors": descriptors,
+            "orb_count": len(keypoints),
+            "fast_count": fast_count,
+        }
+
+    def _compute_histogram(self, context: AnalysisContext) -> Dict[str, Any]:
+        histograms = context.channel_histograms
+        gray_histogram = context.gray_histogram
+        levels = np.arange(256, dtype=np.float64)
+        total = float(gray_histogram.sum())
+        mean = float((gray_histogram * levels).sum() / total)
+        std = float(math.sqrt((gray_histogram * (levels - mean) ** 2).sum() / total))
+        cumulative = np.cumsum(gray_histogram) / total
+        nonzero = np.flatnonzero(gray_histogram)
+        return {
+            "channels": histograms,
+            "gray": gray_histogram,
+            "mean": mean,
+            "std": std,
+            "min": int(nonzero[0]),
+            "max": int(nonzero[-1]),
+            "median": int(np.searchsorted(cumulative, 0.5)),
+            "percentile_1": int(np.searchsorted(cumulative, 0.01)),
+            "percentile_99": int(np.searchsorted(cumulative, 0.99)),
+            "clipped_shadows": float(gray_histogram[0] / total),
+            "clipped_highlights": float(gray_histogram[255] / total),
+        }
+
+    # ---------- キャッシュ管理 ----------
+
+    def invalidate(self, version: Optional[Hashable] = None) -> None:
+        """指定バージョン（省略時は全て）のキャッシュを破棄"""
+        with self._lock:
+            if version is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key[0] == version]:
+                del self._entries[key]
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._total_bytes()
+
+    def _total_bytes(self) -> int:
+        total = 0
+        for entry in self._entries.values():
+            total += entry["context"].nbytes()
+            for result in entry["results"].values():
+                for value in result.values():
+                    if isinstance(value, np.ndarray):
+                        total += value.nbytes
+        return total
+
+    def evict(self, target_bytes: int) -> int:
+        """合計が target_bytes 以下になるまで古いバージョンから破棄し、解放したバイト数を返す"""
+        with self._lock:
+            before = self._total_bytes()
+            while self._entries and self._total_bytes() > target_bytes:
+                self._entries.popitem(last=False)
+            return before - self._total_bytes()
+
+    # ---------- 内部処理 ----------
+
+    @staticmethod
+    def _as_rgb_array(image: Union[Image.Image, np.ndarray]) -> np.ndarray:
+        if isinstance(image, Image.Image):
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            return np.asarray(image)
+        if image.ndim == 2:
+            return cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+        if image.shape[2] == 4:
+            return cv2.cvtColor(image, cv2.COLOR_RGBA2RGB)
+        return image
+
+    @staticmethod
+    def _fingerprint(rgb: np.ndarray) -> Hashable:
+        """
+        形状と全画素のCRCからバージョンを作る
+        間引きサンプルでは細い線や小さなレタッチを見落として古い結果を返すため、バッファ全体を走査する
+        （コピーなしでバッファを直接読むため、24MPのRGB画像でも数十ms）
+        """
+        return (rgb.shape, str(rgb.dtype), zlib.crc32(np.ascontiguousarray(rgb)))
@@ -0,0 +1,204 @@
+"""
+半径に依存しない計算量のぼかしエンジン
+σに応じて 直接ガウシアン / 反復ボックスフィルタ / 縮小→ぼかし→拡大 を切り替える。
+ボックスフィルタは累積和で計算されるためカーネル幅に関係なく画素あたり一定のコストで、
+大きなσでは縮小画像上で処理するため、重い背景ぼかしも半径によらずほぼ同じ時間で終わる。
+
+精度: 既定の閾値では、厳密なガウシアン（cv2.GaussianBlur）との差が8bit階調で
+最大 max_error（既定 6）以内・平均 0.5 以内に収まる。最大誤差は強いステップエッジ上でのみ生じ、
+ボックス3回の合成カーネルとガウシアンの形状差によるもの（benchmark() で確認できる）。
+σが画像の短辺の1/6を超えるような場合は、平均誤差がやや大きくなる（最大誤差は上限内）。
+"""
+
+import argparse
+import math
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+METHODS = ("direct", "box", "downsample")
+
+
+def box_widths_for_gaussian(sigma: float, passes: int = 3) -> List[int]:
+    """
+    passes 回のボックスフィルタの分散合計が σ² に最も近くなる奇数幅の列
+    （幅 wl を m 回、wl+2 を残りの回数。W. Kovesi, "Fast Almost-Gaussian Filtering", 2010）
+    """
+    ideal = math.sqrt(12.0 * sigma * sigma / passes + 1.0)
+    lower = int(math.floor(ideal))
+    if lower % 2 == 0:
+        lower -= 1
+    lower = max(1, lower)
+    upper = lower + 2
+    m = (12.0 * sigma * sigma - passes * lower * lower - 4.0 * passes * lower - 3.0 * passes) / (-4.0 * lower - 4.0)
+    m = min(passes, max(0, int(round(m))))
+    return [lower] * m + [upper] * (passes - m)
+
+
+def kernel_size_to_sigma(kernel_size: int) -> float:
+    """cv2.GaussianBlur で σ=0 を指定した場合にカーネルサイズから決まるσ"""
+    return 0.3 * ((kernel_size - 1) * 0.5 - 1) + 0.8
+
+
+class BlurEngine:
+    """
+    σに応じてぼかしの実行方法を選ぶエンジン
+
+    - σ <= direct_max_sigma: cv2.GaussianBlur（厳密）
+    - σ <  downsample_min_sigma: box_passes 回の反復ボックスフィルタ（float32で計算、コストはσに依存しない）
+    - それ以上: 縮小画像上で反復ボックスフィルタを適用して拡大（縮小・拡大自体のぼかし分を差し引いたσを使用）
+    """
+    def __init__(self, direct_max_sigma: float = 6.0, downsample_min_sigma: float = 32.0,
+                 downsample_target_sigma: float = 8.0, box_passes: int = 3, max_error: float = 6.0):
+        self.direct_max_sigma = direct_max_sigma
+        self.downsample_min_sigma = downsample_min_sigma
+        self.downsample_target_sigma = downsample_target_sigma
+        self.box_passes = box_passes
+        self.max_error = max_error
+
+    def choose_method(self, sigma: float) -> str:
+        if sigma <= self.direct_max_sigma:
+            return "direct"
+        if sigma < self.downsample_min_sigma:
+            return "box"
+        return "downsample"
+
+    def blur(self, image: np.ndarray, sigma: float, method: Optional[str] = None) -> np.ndarray:
+        """σでぼかした配列を返す（入力と同じ型・形状、境界は cv2.GaussianBlur と同じ BORDER_REFLECT_101）"""
+        if sigma <= 0:
+            return image
+        method = method or self.choose_method(sigma)
+        if method == "direct":
+            return cv2.GaussianBlur(image, (0, 0), sigma)
+        if method == "box":
+            return self._box_blur(image, sigma)
+        if method == "downsample":
+            return self._downsample_blur(image, sigma)
+        raise ValueError(f"未知のぼかし方法です: {method}")
+
+    def blur_kernel_size(self, image: np.ndarray, kernel_size: int) -> np.ndarray:
+        """
+        カーネルサイズ指定のぼかし（cv2.GaussianBlur(image, (k, k), 0) 相当）
+        小さなカーネルは従来と同一の結果、大きなカーネルは同じσの定数時間ぼかしに切り替える
+        """
+        sigma = kernel_size_to_sigma(kernel_size)
+        if self.choose_method(sigma) == "direct":
+            return cv2.GaussianBlur(image, (kernel_size, kernel_size), 0)
+        return self.blur(image, sigma)
+
+    # ---------- 各経路 ----------
+
+    def _box_blur(self, image: np.ndarray, sigma: float) -> np.ndarray:
+        working = image.astype(np.float32)
+        for width in box_widths_for_gaussian(sigma, self.box_passes):
+            if width > 1:
+                cv2.blur(working, (width, width), dst=working, borderType=cv2.BORDER_REFLECT_101)
+        return self._to_dtype(working, image.dtype)
+
+    def _downsample_blur(self, image: np.ndarray, sigma: float) -> np.ndarray:
+        height, width = image.shape[:2]
+        factor = 2 ** max(0, int(math.floor(math.log2(sigma / self.downsample_target_sigma))))
+        factor = min(factor, max(1, min(height, width) // 4))
+        if factor <= 1:
+            return self._box_blur(image, sigma)
+        # 縮小画像の端で折り返すと、折り返しの軸が元画像の端から (factor-1)/2 画素ずれる。
+        # 元画像上で BORDER_REFLECT_101 の余白（カーネル半径 3σ 以上、factor の倍数）を付けてから縮小し、
+        # 縮小率がちょうど factor になるよう右下の余白で大きさを揃える
+        pad = factor * int(math.ceil(3.0 * sigma / factor))
+        pad_bottom = pad + (-(height + 2 * pad)) % factor
+        pad_right = pad + (-(width + 2 * pad)) % factor
+        padded = cv2.copyMakeBorder(image, pad, pad_bottom, pad, pad_right, cv2.BORDER_REFLECT_101)
+        padded_height, padded_width = padded.shape[:2]
+        small_size = (padded_width // factor, padded_height // factor)
+        # 整数倍の面積平均は入力の型のまま行う（丸め誤差は後段のぼかしで平均化され、全画素の型変換を省ける）
+        small = cv2.resize(padded, small_size, interpolation=cv2.INTER_AREA).astype(np.float32)
+        # 面積平均による縮小（幅 factor のボックス）と線形補間による拡大（三角カーネル）の分散を差し引く
+        residual = sigma * sigma - (factor * factor - 1) / 12.0 - factor * factor / 6.0
+        small_sigma = math.sqrt(max(residual, 0.0)) / factor
+        if small_sigma > 0:
+            if small_sigma <= self.direct_max_sigma:
+                small = cv2.GaussianBlur(small, (0, 0), small_sigma)
+            else:
+                small = self._box_blur(small, small_sigma)
+        # 拡大は出力範囲を覆う縮小画素（端の補間用に前後1画素ずつ含む）だけを対象にする
+        top, left = pad // factor - 1, pad // factor - 1
+        bottom = min(small.shape[0], -(-(pad + height) // factor) + 1)
+        right = min(small.shape[1], -(-(pad + width) // factor) + 1)
+        restored = cv2.resize(small[top:bottom, left:right], ((right - left) * factor, (bottom - top) * factor),
+                              interpolation=cv2.INTER_LINEAR)
+        return self._to_dtype(restored[factor:factor + height, factor:factor + width], image.dtype)
+
+    @staticmethod
+    def _to_dtype(working: np.ndarray, dtype: np.dtype) -> np.ndarray:
+        if np.issubdtype(dtype, np.integer):
+            info = np.iinfo(dtype)
+            return np.clip(np.rint(working), info.min, info.max).astype(dtype)
+        return working.astype(dtype, copy=False)
+
+    # ---------- 精度確認・ベンチマーク ----------
+
+    def benchmark(self, size: Tuple[int, int] = (2000, 3000),
+                  sigmas: Sequence[float] = (2, 6, 12, 24, 48, 96),
+                  reference: bool = True, seed: int = 0) -> List[Dict[str, Any]]:
+        """
+        各σで選択される方法の処理時間と、厳密なガウシアンとの差（8bit階調の最大・平均）を測定
+        テスト画像はぼかしたノイズに矩形のエッジを重ねたもの
+        """
+        image = self._test_image(size, seed)
+        rows = []
+        for sigma in sigmas:
+            method = self.choose_method(sigma)
+            start = time.perf_counter()
+            result = self.blur(image, sigma)
+            elapsed = time.perf_counter() - start
+            row = {"sigma": sigma, "method": method, "time_ms": elapsed * 1000}
+            if reference:
+                start = time.perf_counter()
+                exact = cv2.GaussianBlur(image, (0, 0), sigma)
+                row["reference_ms"] = (time.perf_counter() - start) * 1000
+                error = np.abs(result.astype(np.int16) - exact.astype(np.int16))
+                row["max_error"] = int(error.max())
+                row["mean_error"] = float(error.mean())
+                row["within_bound"] = row["max_error"] <= self.max_error
+            rows.append(row)
+        return rows
+
+    @staticmethod
+    def _test_image(size: Tuple[int, int], seed: int) -> np.ndarray:
+        height, width = size
+        rng = np.random.default_rng(seed)
+        image = cv2.GaussianBlur((rng.random((height, width, 3)) * 255).astype(np.uint8), (0, 0), 3)
+        for _ in range(20):
+            x0, y0 = int(rng.integers(0, width)), int(rng.integers(0, height))
+            x1, y1 = x0 + int(rng.integers(20, width // 3)), y0 + int(rng.integers(20, height // 3))
+            color = tuple(int(c) for c in rng.integers(0, 256, 3))
+            cv2.rectangle(image, (x0, y0), (x1, y1), color, -1)
+        return image
+
+
+# プロセス共通の既定エンジン
+DEFAULT_ENGINE = BlurEngine()
+
+
+def main():
+    """コマンドライン: ぼかし方法ごとの処理時間と精度を表示"""
+    parser = argparse.ArgumentParser(description="ぼかしエンジンのベンチマーク")
+    parser.add_argument("--width", type=int, default=3000)
+    parser.add_argument("--height", type=int, default=2000)
+    parser.add_argument("--sigmas", type=float, nargs="+", default=[2, 6, 12, 24, 48, 96])
+    parser.add_argument("--no-reference", action="store_true", help="厳密なガウシアンとの比較を省略")
+    args = parser.parse_args()
+
+    for row in DEFAULT_ENGINE.benchmark((args.height, args.width), args.sigmas, not args.no_reference):
+        line = f"σ={row['sigma']:>6.1f}  {row['method']:<10} {row['time_ms']:8.1f} ms"
+        if "max_error" in row:
+            mark = "✅" if row["within_bound"] else "⚠️"
+            line += (f"  (厳密 {row['reference_ms']:8.1f} ms, 最大誤差 {row['max_error']},"
+                     f" 平均誤差 {row['mean_error']:.3f}) {mark}")
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""
+知覚ハッシュによる重複・類似画像の検出
+縮小デコードした画像から64bitの dHash / pHash をプロセスプールで並列に算出して uint64 配列に詰め、
+ハミング距離が閾値以下の画像をグループにまとめる。
+少数の画像は全ペアのハミング距離をベクトル演算で求め、大量の画像はハッシュをブロックに分割した
+マルチインデックス探索（いずれかのブロックが近いペアだけを候補にする）で比較回数を抑える。
+"""
+
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.context import BaseContext
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from image_toolkit.core.quality_scoring import list_image_files, load_reduced_gray
+
+HASH_KINDS = ("dhash", "phash")
+
+# マルチインデックスで件数表（2^bits 要素）を使うキー長の上限
+_DENSE_KEY_BITS = 24
+
+_POPCOUNT_TABLE = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def dhash(gray: np.ndarray) -> int:
+    """差分ハッシュ: 9x8 に縮小し、横に隣り合う画素の大小関係を64bitにする"""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    return _pack_bits(small[:, 1:] > small[:, :-1])
+
+
+def phash(gray: np.ndarray) -> int:
+    """知覚ハッシュ: 32x32 のDCTの低周波 8x8 成分を、直流成分を除いた中央値と比較して64bitにする"""
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8]
+    return _pack_bits(low > np.median(low.ravel()[1:]))
+
+
+def _pack_bits(bits: np.ndarray) -> int:
+    return int(np.packbits(bits.ravel()).view(">u8")[0])
+
+
+def popcount(values: np.ndarray) -> np.ndarray:
+    """uint64 配列の各要素の立っているビット数"""
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return _POPCOUNT_TABLE[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+
+def hamming_distance(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """uint64 ハッシュ同士のハミング距離（ブロードキャスト可）"""
+    return popcount(np.bitwise_xor(a, b))
+
+
+class ImageHashes:
+    """
+    画像パスと知覚ハッシュ（uint64 配列）の組
+    valid が False の行は読み込みに失敗した画像（ハッシュは0、理由は errors）
+    """
+    def __init__(self, paths: Sequence[str], dhashes: np.ndarray, phashes: np.ndarray,
+                 errors: Optional[Dict[str, str]] = None):
+        self.paths = list(paths)
+        self.dhash = np.asarray(dhashes, dtype=np.uint64)
+        self.phash = np.asarray(phashes, dtype=np.uint64)
+        self.errors = errors or {}
+        self.valid = np.array([path not in self.errors for path in self.paths], dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def get(self, kind: str = "phash") -> np.ndarray:
+        if kind not in HASH_KINDS:
+            raise ValueError(f"未知のハッシュ種別です: {kind}")
+        return self.dhash if kind == "dhash" else self.phash
+
+    def save(self, path: Union[str, Path]) -> None:
+        """ハッシュを .npz に保存（再計算せずに閾値を変えて再グループ化するため）"""
+        np.savez(path, paths=np.array(self.paths, dtype=str), dhash=self.dhash, phash=self.phash,
+                 error_paths=np.array(list(self.errors), dtype=str),
+                 error_messages=np.array(list(self.errors.values()), dtype=str))
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "ImageHashes":
+        with np.load(path) as data:
+            errors = dict(zip(data["error_paths"].tolist(), data["error_messages"].tolist()))
+            return cls(data["paths"].tolist(), data["dhash"], data["phash"], errors)
+
+    def select(self, paths: Iterable[str]) -> "ImageHashes":
+        """指定したパスの行だけを取り出す（順序は元のまま）"""
+        targets = set(paths)
+        keep = np.array([path in targets for path in self.paths], dtype=bool)
+        return ImageHashes([path for path, kept in zip(self.paths, keep) if kept], self.dhash[keep],
+                           self.phash[keep], {path: message for path, message in self.errors.items() if path in targets})
+
+    def merge(self, other: "ImageHashes") -> "ImageHashes":
+        """別のハッシュ集合と連結（同じパスは other を優先）"""
+        replaced = set(other.paths)
+        keep = np.array([path not in replaced for path in self.paths], dtype=bool)
+        errors = {path: message for path, message in self.errors.items() if path not in replaced}
+        errors.update(other.errors)
+        return ImageHashes([path for path, kept in zip(self.paths, keep) if kept] + other.paths,
+                           np.concatenate([self.dhash[keep], other.dhash]),
+                           np.concatenate([self.phash[keep], other.phash]), errors)
+
+
+def hash_file(path: str, max_side: int = 64) -> Tuple[int, int]:
+    """1枚の画像の (dHash, pHash) を返す（JPEGはDCT段階で縮小デコード）"""
+    gray, _ = load_reduced_gray(path, max_side)
+    return dhash(gray), phash(gray)
+
+
+def _hash_file_task(args) -> Tuple[int, int, Optional[str]]:
+    path, max_side = args
+    try:
+        return hash_file(path, max_side) + (None,)
+    except Exception as e:
+        return 0, 0, str(e)
+
+
+def compute_hashes(paths: Iterable[str], max_side: int = 64, max_workers: Optional[int] = None,
+                   chunksize: int = 64, mp_context: Optional[BaseContext] = None) -> ImageHashes:
+    """
+    画像パス一覧のハッシュをプロセスプールで並列に算出
+    スレッドを持つプロセス（GUI等）から呼ぶ場合は mp_context に spawn / forkserver のコンテキストを渡すこと
+    """
+    paths = [str(path) for path in paths]
+    tasks = [(path, max_side) for path in paths]
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or len(tasks) <= 1:
+        results = [_hash_file_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context) as executor:
+            results = list(executor.map(_hash_file_task, tasks, chunksize=chunksize))
+    dhashes = np.fromiter((result[0] for result in results), dtype=np.uint64, count=len(results))
+    phashes = np.fromiter((result[1] for result in results), dtype=np.uint64, count=len(results))
+    errors = {path: result[2] for path, result in zip(paths, results) if result[2] is not None}
+    return ImageHashes(paths, dhashes, phashes, errors)
+
+
+# ---------- 近いペアの探索 ----------
+
+def _brute_force_pairs(hashes: np.ndarray, threshold: int, batch_rows: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+    """全ペアのハミング距離を行ブロックごとに計算"""
+    count = len(hashes)
+    firsts, seconds = [], []
+    for start in range(0, count, batch_rows):
+        block = hashes[start:start + batch_rows]
+        distances = hamming_distance(block[:, None], hashes[None, start:])
+        rows, columns = np.nonzero(distances <= threshold)
+        columns += start
+        rows += start
+        upper = rows < columns
+        firsts.append(rows[upper])
+        seconds.append(columns[upper])
+    return np.concatenate(firsts), np.concatenate(seconds)
+
+
+def _plan_blocks(count: int, threshold: int) -> Tuple[int, int]:
+    """
+    マルチインデックスのブロック数と、ブロックごとに許す距離を決める
+    ハミング距離 <= threshold のペアは、m ブロックのいずれかで距離 <= threshold // m になる（鳩の巣原理）。
+    各ブロックについて (探索するキー数) × (1キーあたりの期待件数) が最小になる m を選ぶ
+    """
+    best = None
+    for blocks in range(1, threshold + 2):
+        bits = 64 // blocks
+        radius = threshold // blocks
+        probes = sum(_combinations(bits, flips) for flips in range(radius + 1))
+        cost = blocks * probes * (1.0 + count / 2.0 ** bits)
+        if best is None or cost < best[0]:
+            best = (cost, blocks, radius)
+    return best[1], best[2]
+
+
+def _combinations(n: int, k: int) -> int:
+    result = 1
+    for i in range(k):
+        result = result * (n - i) // (i + 1)
+    return result
+
+
+def _multi_index_pairs(hashes: np.ndarray, threshold: int,
+                       batch_size: int = 1 << 18) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ブロックごとにキーを並べ替えて索引を作り、近いキーの範囲を引いて候補ペアだけ距離を確認
+    キーが dense_key_bits 以下のブロックは全キーの件数表（計数ソート）で、それより長いキーは二分探索で引く
+    """
+    count = len(hashes)
+    blocks, radius = _plan_blocks(count, threshold)
+    firsts, seconds = [], []
+    bit_edges = np.linspace(0, 64, blocks + 1).astype(int)
+    for low_bit, high_bit in zip(bit_edges[:-1], bit_edges[1:]):
+        bits = int(high_bit - low_bit)
+        mask = np.uint64((1 << bits) - 1)
+        keys = (hashes >> np.uint64(low_bit)) & mask
+        order = np.argsort(keys, kind="stable")
+        if bits <= _DENSE_KEY_BITS:
+            keys = keys.astype(np.int64)
+            key_counts = np.bincount(keys, minlength=1 << bits)
+            key_starts = np.cumsum(key_counts) - key_counts
+
+            def lookup(probe):
+                return key_starts[probe], key_counts[probe]
+        else:
+            sorted_keys = keys[order]
+
+            def lookup(probe):
+                left = np.searchsorted(sorted_keys, probe, side="left")
+                return left, np.searchsorted(sorted_keys, probe, side="right") - left
+        flips = [sum(1 << bit for bit in combination)
+                 for flips in range(radius + 1) for combination in itertools.combinations(range(bits), flips)]
+        flips = np.array(flips, dtype=keys.dtype)
+        for start in range(0, count, batch_size):
+            indices = np.arange(start, min(count, start + batch_size))
+            for flip in flips:
+                left, matches = lookup(keys[indices] ^ flip)
+                if not matches.any():
+                    continue
+                # 各要素と一致したキーの範囲 order[left:left+matches] を1次元に展開
+                first = np.repeat(indices, matches)
+                offsets = np.arange(len(first)) - np.repeat(np.cumsum(matches) - matches, matches)
+                second = order[np.repeat(left, matches) + offsets]
+                keep = first < second
+                first, second = first[keep], second[keep]
+                close = hamming_distance(hashes[first], hashes[second]) <= threshold
+                firsts.append(first[close])
+                seconds.append(second[close])
+    if not firsts:
+        empty = np.zeros(0, np.int64)
+        return empty, empty
+    # 複数のブロックで見つかったペアの重複を除く
+    pairs = np.unique(np.stack([np.concatenate(firsts), np.concatenate(seconds)], axis=1), axis=0)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def similar_pairs(hashes: np.ndarray, threshold: int = 4,
+                  brute_force_max: int = 20000) -> Tuple[np.ndarray, np.ndarray]:
+    """ハミング距離が threshold 以下の添字ペア (i < j) を返す"""
+    hashes = np.ascontiguousarray(hashes, dtype=np.uint64)
+    if len(hashes) < 2:
+        empty = np.zeros(0, np.int64)
+        return empty, empty
+    if len(hashes) <= brute_force_max:
+        return _brute_force_pairs(hashes, threshold)
+    return _multi_index_pairs(hashes, threshold)
+
+
+def connected_components(count: int, firsts: np.ndarray, seconds: np.ndarray) -> np.ndarray:
+    """
+    ペアで結ばれた要素の連結成分ラベル（成分内で最小の添字）を返す
+    全ペアに対して根の付け替え（大きい根 → 小さい根）とパス圧縮を収束まで繰り返すベクトル版 Union-Find
+    """
+    parent = np.arange(count)
+    while len(firsts):
+        root_first, root_second = parent[firsts], parent[seconds]
+        low = np.minimum(root_first, root_second)
+        high = np.maximum(root_first, root_second)
+        differ = low != high
+        if not differ.any():
+            break
+        np.minimum.at(parent, high[differ], low[differ])
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+    return parent
+
+
+def find_duplicate_groups(image_hashes: ImageHashes, kind: str = "phash", threshold: int = 4,
+                          brute_force_max: int = 20000) -> List[List[str]]:
+    """
+    ハミング距離 threshold 以下で連結される画像のグループ（2枚以上）を返す
+    グループ内は入力順、グループは先頭画像の入力順に並ぶ
+    """
+    valid_indices = np.flatnonzero(image_hashes.valid)
+    hashes = image_hashes.get(kind)[valid_indices]
+    firsts, seconds = similar_pairs(hashes, threshold, brute_force_max)
+    labels = connected_components(len(hashes), firsts, seconds)
+    sizes = np.bincount(labels, minlength=len(hashes))
+    grouped = np.flatnonzero(sizes[labels] > 1)
+    groups: Dict[int, List[str]] = {}
+    for index in grouped:
+        groups.setdefault(int(labels[index]), []).append(image_hashes.paths[valid_indices[index]])
+    return [groups[label] for label in sorted(groups)]
+
+
+def duplicates_to_hide(groups: Iterable[Sequence[str]], scores: Optional[Dict[str, float]] = None) -> List[str]:
+    """
+    各グループで1枚だけ残し、残りのパスを返す
+    scores（パス → スコア、例: 画質スコア）があれば最高スコアの画像、無ければグループの先頭を残す
+    """
+    hidden = []
+    for group in groups:
+        keep = group[0]
+        if scores:
+            keep = max(group, key=lambda path: (scores.get(path) is not None, scores.get(path) or 0.0))
+        hidden.extend(path for path in group if path != keep)
+    return hidden
+
+
+def groups_table(groups: Sequence[Sequence[str]], hidden: Iterable[str] = ()) -> pd.DataFrame:
+    """グループ一覧を表（group, path, keep）にする"""
+    hidden = set(hidden)
+    rows = [{"group": number, "path": path, "keep": path not in hidden}
+            for number, group in enumerate(groups) for path in group]
+    return pd.DataFrame(rows, columns=["group", "path", "keep"])
+
+
+def dedupe_paths(paths: Sequence[str], kind: str = "phash", threshold: int = 4, max_side: int = 64,
+                 max_workers: Optional[int] = None) -> Tuple[List[str], List[List[str]]]:
+    """パス一覧から重複を除いた一覧（入力順）と重複グループを返す"""
+    groups = find_duplicate_groups(compute_hashes(paths, max_side, max_workers), kind, threshold)
+    hidden = set(duplicates_to_hide(groups))
+    return [path for path in paths if path not in hidden], groups
+
+
+def main():
+    """コマンドライン: ディレクトリ内の重複・類似画像をグループ化して表示・CSV出力"""
+    parser = argparse.ArgumentParser(description="知覚ハッシュによる重複・類似画像の検出")
+    parser.add_argument("directory")
+    parser.add_argument("--recursive", action="store_true")
+    parser.add_argument("--kind", default="phash", choices=HASH_KINDS)
+    parser.add_argument("--threshold", type=int, default=4, help="同一とみなすハミング距離の上限（64bit中）")
+    parser.add_argument("--max-side", type=int, default=64, help="ハッシュ算出時の縮小長辺")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--hashes", default=None,
+                        help="ハッシュの保存先 .npz（既にあれば、未計算の画像だけ追加で算出する）")
+    parser.add_argument("--csv", default=None, help="グループ一覧をCSVに書き出すパス")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    paths = list_image_files(args.directory, args.recursive)
+    image_hashes = None
+    if args.hashes and os.path.exists(args.hashes):
+        image_hashes = ImageHashes.load(args.hashes)
+        known = set(image_hashes.paths)
+        missing = [path for path in paths if path not in known]
+        if missing:
+            image_hashes = image_hashes.merge(compute_hashes(missing, args.max_side, args.workers))
+        print(f"📂 保存済みハッシュを使用（新規算出 {len(missing)} 枚）")
+    else:
+        image_hashes = compute_hashes(paths, args.max_side, args.workers)
+    if args.hashes:
+        image_hashes.save(args.hashes)
+    hashed = time.perf_counter()
+
+    # 保存済みハッシュのうち、今回の一覧に無い画像は対象外にする
+    image_hashes = image_hashes.select(paths)
+
+    groups = find_duplicate_groups(image_hashes, args.kind, args.threshold)
+    table = groups_table(groups, duplicates_to_hide(groups))
+    elapsed = time.perf_counter() - start
+    if args.csv:
+        table.to_csv(args.csv, index=False)
+        print(f"💾 グループ一覧を書き出しました: {args.csv}")
+    with pd.option_context("display.max_rows", None, "display.width", 200, "display.max_colwidth", 80):
+        if len(table):
+            print(table.to_string(index=False))
+    failed = len(image_hashes.errors)
+    print(f"✅ {len(image_hashes)} 枚中 {len(groups)} グループ・重複 {int((~table['keep']).sum())} 枚"
+          f"（ハッシュ {hashed - start:.1f} 秒, 合計 {elapsed:.1f} 秒）"
+          + (f"（読み込み失敗 {failed} 枚）" if failed else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+エッジを保つ平滑化（ガイデッドフィルタ）
+cv2.bilateralFilter の代わりに、ボックスフィルタだけで構成されるガイデッドフィルタ
+（K. He et al., "Guided Image Filtering", 2010）で平滑化する。ボックスフィルタは半径に依存しない計算量で、
+係数 a, b を縮小画像上で求めて拡大する高速版（"Fast Guided Filter", 2015）により
+縮小率（quality）で速度と精度を切り替えられる。
+
+バイラテラルフィルタとの対応: 窓の一辺 = diameter、正則化 ε = (eps_scale × sigma_color)²（8bit階調）。
+sigma_space は使わない（アプリの設定 sigmaSpace=80 では窓内の空間重みがほぼ一様なため、箱型の窓と同等）。
+"""
+
+import argparse
+import math
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from image_toolkit.core.memory_accountant import get_memory_accountant
+
+# quality: "exact" は従来の cv2.bilateralFilter、それ以外は係数を求める画像の縮小率
+QUALITY_SUBSAMPLE = {
+    "high": 1,
+    "balanced": 2,
+    "fast": 4,
+}
+QUALITY_LEVELS = ("auto", "exact") + tuple(QUALITY_SUBSAMPLE)
+
+
+def guided_filter(image: np.ndarray, radius: int, eps: float, subsample: int = 1) -> np.ndarray:
+    """
+    チャンネルごとに自身をガイドとするガイデッドフィルタ（入力と同じ型・形状を返す）
+    eps は8bit階調の分散の単位、subsample > 1 では係数を 1/subsample の画像上で計算する
+    """
+    height, width = image.shape[:2]
+    source = image.astype(np.float32)
+    subsample = max(1, min(int(subsample), radius, height, width))
+    if subsample > 1:
+        # 縮小率がちょうど subsample になるよう右下を折り返しで埋める
+        # （画素の格子が揃うため、subsample の倍数の行から始まる帯ごとの処理でも結果が一致する）
+        padded = cv2.copyMakeBorder(source, 0, (-height) % subsample, 0, (-width) % subsample,
+                                    cv2.BORDER_REFLECT_101)
+        padded_size = (padded.shape[1], padded.shape[0])
+        small = cv2.resize(padded, (padded_size[0] // subsample, padded_size[1] // subsample),
+                           interpolation=cv2.INTER_AREA)
+        small_radius = max(1, int(round(radius / subsample)))
+    else:
+        small, small_radius = source, radius
+    window = (2 * small_radius + 1, 2 * small_radius + 1)
+
+    # 窓ごとの平均・分散から線形係数 q = a·I + b を求める（分散が ε より十分小さい平坦部ほど a → 0）
+    mean = cv2.blur(small, window)
+    variance = cv2.blur(cv2.multiply(small, small), window)
+    variance -= cv2.multiply(mean, mean)
+    np.maximum(variance, 0, out=variance)
+    coefficient_a = variance / (variance + np.float32(eps))
+    coefficient_b = mean - coefficient_a * mean
+    coefficient_a = cv2.blur(coefficient_a, window)
+    coefficient_b = cv2.blur(coefficient_b, window)
+
+    if subsample > 1:
+        coefficient_a = cv2.resize(coefficient_a, padded_size, interpolation=cv2.INTER_LINEAR)[:height, :width]
+        coefficient_b = cv2.resize(coefficient_b, padded_size, interpolation=cv2.INTER_LINEAR)[:height, :width]
+    result = cv2.multiply(coefficient_a, source)
+    result += coefficient_b
+    return _to_dtype(result, image.dtype)
+
+
+def _to_dtype(working: np.ndarray, dtype: np.dtype) -> np.ndarray:
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        return np.clip(np.rint(working), info.min, info.max).astype(dtype)
+    return working.astype(dtype, copy=False)
+
+
+class EdgePreservingSmoother:
+    """
+    バイラテラルフィルタ互換の引数でエッジ保存平滑化を行うクラス
+
+    quality="auto" では、窓の一辺が exact_max_diameter 以下なら従来のバイラテラルフィルタ（小さな窓ではこちらが速い）、
+    それより大きければ係数を求める画像が interactive_megapixels 以下になるよう縮小率を選ぶ
+    （ただし縮小率は窓の半径以下に抑え、窓が1画素未満にならないようにする）。
+    """
+    def __init__(self, quality: str = "auto", interactive_megapixels: float = 4.0, eps_scale: float = 0.5,
+                 exact_max_diameter: int = 5):
+        if quality not in QUALITY_LEVELS:
+            raise ValueError(f"未知の品質設定です: {quality}")
+        self.quality = quality
+        self.interactive_megapixels = interactive_megapixels
+        self.eps_scale = eps_scale
+        self.exact_max_diameter = exact_max_diameter
+
+    def subsample_factor(self, shape: Tuple[int, ...], radius: int, quality: Optional[str] = None) -> int:
+        """品質設定と画像サイズから係数計算の縮小率を決める（バイラテラルフィルタを使う場合は 0）"""
+        quality = quality or self.quality
+        if quality == "exact" or (quality == "auto" and 2 * radius + 1 <= self.exact_max_diameter):
+            return 0
+        if quality != "auto":
+            return max(1, min(QUALITY_SUBSAMPLE[quality], radius))
+        megapixels = shape[0] * shape[1] / 1e6
+        factor = 2 ** max(0, int(math.ceil(math.log2(math.sqrt(megapixels / self.interactive_megapixels)))))
+        return max(1, min(factor, radius))
+
+    def smooth(self, image: np.ndarray, diameter: int, sigma_color: float,
+               quality: Optional[str] = None) -> np.ndarray:
+        """cv2.bilateralFilter(image, diameter, sigma_color, ...) に近い平滑化結果を返す"""
+        radius = max(1, diameter // 2)
+        subsample = self.subsample_factor(image.shape, radius, quality)
+        if subsample == 0:
+            return cv2.bilateralFilter(image, diameter, sigma_color, sigma_color)
+        eps = (self.eps_scale * sigma_color) ** 2
+        # 作業用の float32 配列（入力・平均・分散・係数2つ）が予算を超える場合は帯に分割する
+        # 帯の境界を縮小率の倍数に揃え、帯に分割しても一括処理と同じ結果にする
+        return get_memory_accountant().run(
+            lambda array: guided_filter(array, radius, eps, subsample), image,
+            halo=2 * radius + 2 * subsample, working_copies=5, itemsize=4, row_align=subsample)
+
+    # ---------- 精度確認・ベンチマーク ----------
+
+    def benchmark(self, size: Tuple[int, int] = (2000, 3000), diameters: Sequence[int] = (5, 11, 15),
+                  sigma_color: float = 80, reference: bool = True, seed: int = 0) -> List[Dict[str, Any]]:
+        """
+        品質設定ごとの処理時間と、cv2.bilateralFilter との差（8bit階調の平均・99パーセンタイル）を測定
+        テスト画像は矩形のエッジにノイズを重ねたもの
+        """
+        image = self._test_image(size, seed)
+        rows = []
+        for diameter in diameters:
+            exact = None
+            exact_ms = None
+            if reference:
+                start = time.perf_counter()
+                exact = cv2.bilateralFilter(image, diameter, sigma_color, sigma_color)
+                exact_ms = (time.perf_counter() - start) * 1000
+            for quality in QUALITY_SUBSAMPLE:
+                start = time.perf_counter()
+                result = self.smooth(image, diameter, sigma_color, quality)
+                row = {"diameter": diameter, "quality": quality, "time_ms": (time.perf_counter() - start) * 1000}
+                if exact is not None:
+                    error = np.abs(result.astype(np.int16) - exact.astype(np.int16))
+                    row["reference_ms"] = exact_ms
+                    row["mean_error"] = float(error.mean())
+                    row["p99_error"] = float(np.percentile(error, 99))
+                rows.append(row)
+        return rows
+
+    @staticmethod
+    def _test_image(size: Tuple[int, int], seed: int) -> np.ndarray:
+        height, width = size
+        rng = np.random.default_rng(seed)
+        image = np.full((height, width, 3), 128, np.uint8)
+        for _ in range(20):
+            x0, y0 = int(rng.integers(0, width)), int(rng.integers(0, height))
+            x1, y1 = x0 + int(rng.integers(20, width // 3)), y0 + int(rng.integers(20, height // 3))
+            color = tuple(int(c) for c in rng.integers(0, 256, 3))
+            cv2.rectangle(image, (x0, y0), (x1, y1), color, -1)
+        noise = rng.normal(0, 12, image.shape)
+        return np.clip(image + noise, 0, 255).astype(np.uint8)
+
+
+# プロセス共通の既定エンジン
+DEFAULT_ENGINE = EdgePreservingSmoother()
+
+
+def main():
+    """コマンドライン: 品質設定ごとの処理時間とバイラテラルフィルタとの差を表示"""
+    parser = argparse.ArgumentParser(description="エッジ保存平滑化のベンチマーク")
+    parser.add_argument("--width", type=int, default=3000)
+    parser.add_argument("--height", type=int, default=2000)
+    parser.add_argument("--diameters", type=int, nargs="+", default=[5, 11, 15])
+    parser.add_argument("--no-reference", action="store_true", help="バイラテラルフィルタとの比較を省略")
+    args = parser.parse_args()
+
+    for row in DEFAULT_ENGINE.benchmark((args.height, args.width), args.diameters,
+                                        reference=not args.no_reference):
+        line = f"d={row['diameter']:>3}  {row['quality']:<9} {row['time_ms']:8.1f} ms"
+        if "mean_error" in row:
+            line += (f"  (バイラテラル {row['reference_ms']:8.1f} ms, 平均誤差 {row['mean_error']:.2f},"
+                     f" 99%誤差 {row['p99_error']:.0f})")
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
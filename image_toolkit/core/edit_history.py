@@ -0,0 +1,264 @@
+"""
+編集履歴（元に戻す/やり直し）
+画像そのものではなく編集パラメータを記録し、キャッシュ済みのキーフレームから画像を再生成する
+（画像処理アプリの元に戻す/やり直し、プラグインUIの「元に戻す」コールバックから使用）
+
+使用例:
+    history = EditHistory(base_image=np.array(image))
+    history.push_edit("blur", {"radius": 3}, apply_blur, result=blurred)
+    previous = history.undo()
+"""
+
+import copy
+import threading
+import zlib
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from image_toolkit.core.memory_accountant import PRIORITY_HISTORY, get_memory_accountant
+
+
+class HistoryStep:
+    """
+    履歴の1ステップ
+    再計算可能な編集は apply_fn とパラメータのみ、破壊的な編集は直前状態との圧縮差分を保持する
+    """
+    def __init__(self, name: str, params: Dict[str, Any],
+                 apply_fn: Optional[Callable[..., np.ndarray]] = None,
+                 diff: Optional[bytes] = None, diff_is_xor: bool = False,
+                 shape: Optional[tuple] = None, dtype: Optional[np.dtype] = None):
+        self.name = name
+        self.params = params
+        self.apply_fn = apply_fn
+        self.diff = diff
+        self.diff_is_xor = diff_is_xor
+        self.shape = shape
+        self.dtype = dtype
+
+    @property
+    def is_destructive(self) -> bool:
+        return self.apply_fn is None
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.diff) if self.diff is not None else 0
+
+    def apply(self, previous: np.ndarray) -> np.ndarray:
+        """直前の状態からこのステップ適用後の画像を再生成"""
+        if self.apply_fn is not None:
+            return self.apply_fn(previous, **self.params)
+        raw = np.frombuffer(zlib.decompress(self.diff), dtype=self.dtype).reshape(self.shape)
+        if self.diff_is_xor:
+            return np.bitwise_xor(previous, raw)
+        return raw.copy()
+
+
+class EditHistory:
+    """
+    メモリ予算付きの編集履歴
+
+    - 状態0（元画像）は常にキーフレームとして保持
+    - keyframe_interval ステップごとの結果画像と最新の結果画像をキーフレームとしてキャッシュ
+    - 画像は最も近い手前のキーフレームからステップを再適用して再生成
+    - 合計バイト数が max_bytes を超えると古いキーフレームから破棄し、
+      それでも足りない場合は先頭に並ぶ破壊的な編集の差分を元画像に焼き込んで解放する
+    - パラメータだけのステップはメモリ不足では破棄しない（履歴から外れるのは max_steps を超えた分のみ）
+    - メモリ管理の relieve() が別スレッドから evict() を呼ぶため、状態の参照・変更はロックで保護する
+    """
+    def __init__(self, base_image: np.ndarray, max_bytes: int = 512 * 1024 * 1024,
+                 keyframe_interval: int = 4, max_steps: int = 100, compress_level: int = 1):
+        self.max_bytes = max_bytes
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.max_steps = max_steps
+        self.compress_level = compress_level
+        self._steps: List[HistoryStep] = []
+        self._keyframes: Dict[int, np.ndarray] = {0: _frozen(base_image)}
+        self._cursor = 0
+        # 焼き込みで履歴から外したステップ数（キーフレームの間隔を最初の記録からの通し番号で数えるため）
+        self._dropped = 0
+        # 最後に焼き込んだステップのパラメータ（状態0がどの編集の結果かを呼び出し側が復元するため）
+        self._base_params: Optional[Dict[str, Any]] = None
+        # evict() から total_bytes() 等を呼ぶため再入可能なロック
+        self._lock = threading.RLock()
+        get_memory_accountant().register(self, "編集履歴", PRIORITY_HISTORY)
+
+    # ---------- 記録 ----------
+
+    def push_edit(self, name: str, params: Dict[str, Any],
+                  apply_fn: Callable[..., np.ndarray],
+                  result: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        パラメータから再計算できる編集を記録
+        apply_fn(previous, **params) は純粋関数であること。result を渡すと再計算を省略する
+        （result は履歴がキーフレームとして保持するため、渡した後に書き換えないこと）
+        """
+        params = copy.deepcopy(params)
+        if result is None:
+            result = apply_fn(self.current(), **params)
+        self._append(HistoryStep(name, params, apply_fn=apply_fn), result)
+        return result
+
+    def push_destructive(self, name: str, result: np.ndarray,
+                         params: Optional[Dict[str, Any]] = None) -> np.ndarray:
+        """パラメータから再計算できない編集を、直前状態との圧縮差分として記録"""
+        previous = self.current()
+        if previous.shape == result.shape and previous.dtype == result.dtype:
+            # 変化のない画素は0になるため高い圧縮率が得られる
+            raw = np.bitwise_xor(previous, result)
+            diff_is_xor = True
+        else:
+            raw = result
+            diff_is_xor = False
+        step = HistoryStep(
+            name, copy.deepcopy(params or {}),
+            diff=zlib.compress(np.ascontiguousarray(raw).tobytes(), self.compress_level),
+            diff_is_xor=diff_is_xor, shape=result.shape, dtype=result.dtype
+        )
+        self._append(step, result)
+        return result
+
+    # ---------- 参照・移動 ----------
+
+    def current(self) -> np.ndarray:
+        with self._lock:
+            return self.image_at(self._cursor)
+
+    def undo(self) -> Optional[np.ndarray]:
+        """1ステップ戻した画像を返す。戻せない場合はNone"""
+        with self._lock:
+            if not self.can_undo():
+                return None
+            self._cursor -= 1
+            return self.current()
+
+    def redo(self) -> Optional[np.ndarray]:
+        """1ステップ進めた画像を返す。進められない場合はNone"""
+        with self._lock:
+            if not self.can_redo():
+                return None
+            self._cursor += 1
+            return self.current()
+
+    @property
+    def position(self) -> int:
+        """現在位置（適用済みのステップ数。0 は状態0）"""
+        return self._cursor
+
+    def can_undo(self) -> bool:
+        return self._cursor > 0
+
+    def can_redo(self) -> bool:
+        return self._cursor < len(self._steps)
+
+    def image_at(self, index: int) -> np.ndarray:
+        """
+        指定ステップ時点の画像を最寄りのキーフレームから再生成
+        キーフレームをそのまま返す場合は読み取り専用のビューになる（書き換える場合はコピーすること）
+        """
+        with self._lock:
+            keyframe_index = max(k for k in self._keyframes if k <= index)
+            image = self._keyframes[keyframe_index]
+            steps = self._steps[keyframe_index:index]
+        # 再適用はロックの外で行う（ステップ自体は変更されない）
+        for step in steps:
+            image = step.apply(image)
+        return image
+
+    def get_step_names(self) -> List[str]:
+        with self._lock:
+            return [step.name for step in self._steps]
+
+    def get_step_params(self, index: int) -> Dict[str, Any]:
+        with self._lock:
+            return copy.deepcopy(self._steps[index].params)
+
+    def params_at(self, position: int) -> Optional[Dict[str, Any]]:
+        """
+        指定位置の画像を生成した編集のパラメータ
+        状態0は焼き込んだ最後のステップのパラメータ（焼き込み前の元画像なら None）
+        """
+        with self._lock:
+            if position == 0:
+                return copy.deepcopy(self._base_params)
+            return copy.deepcopy(self._steps[position - 1].params)
+
+    # ---------- メモリ管理 ----------
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            keyframe_bytes = sum(image.nbytes for image in self._keyframes.values())
+            return keyframe_bytes + sum(step.nbytes for step in self._steps)
+
+    def evict(self, target_bytes: int) -> int:
+        """
+        合計が target_bytes 以下になるまで解放し、解放したバイト数を返す
+        解放できるのはキーフレームと破壊的な編集の差分まで。パラメータだけのステップは再計算で
+        画像を戻せるため残す（target_bytes に届かなくても元に戻す履歴は消さない）
+        """
+        with self._lock:
+            before = self.total_bytes()
+            # 古いキーフレームから破棄（元画像と現在位置のキーフレームは最後まで残す）
+            for index in sorted(self._keyframes):
+                if self.total_bytes() <= target_bytes:
+                    break
+                if index not in (0, self._cursor):
+                    del self._keyframes[index]
+            # 先頭に並ぶ破壊的な編集だけを元画像に焼き込んで差分を解放
+            # （それより後の差分は、手前のパラメータのステップを残したまま焼き込めないため保持する）
+            while (self.total_bytes() > target_bytes and self._cursor > 0
+                   and self._steps[0].is_destructive):
+                self._drop_oldest_step()
+            return before - self.total_bytes()
+
+    def clear(self, base_image: Optional[np.ndarray] = None) -> None:
+        with self._lock:
+            if base_image is None:
+                base_image = self.current()
+            self._steps = []
+            self._keyframes = {0: _frozen(base_image)}
+            self._cursor = 0
+            self._dropped = 0
+            self._base_params = None
+
+    # ---------- 内部処理 ----------
+
+    def _append(self, step: HistoryStep, result: np.ndarray) -> None:
+        with self._lock:
+            # やり直し用のステップとキーフレームを破棄
+            del self._steps[self._cursor:]
+            for index in [k for k in self._keyframes if k > self._cursor]:
+                del self._keyframes[index]
+
+            # 直前の「現在位置」キーフレームが間隔外なら破棄し、最新結果を現在位置のキーフレームにする
+            previous = self._cursor
+            if previous != 0 and (previous + self._dropped) % self.keyframe_interval != 0:
+                self._keyframes.pop(previous, None)
+            self._steps.append(step)
+            self._cursor += 1
+            self._keyframes[self._cursor] = _frozen(result)
+
+            while len(self._steps) > self.max_steps:
+                self._drop_oldest_step()
+            if self.total_bytes() > self.max_bytes:
+                self.evict(self.max_bytes)
+        # プロセス全体の予算を超えていれば他のキャッシュも含めて解放
+        # （relieve() はメモリ管理のロックを取ってから各キャッシュのロックを取るため、ロックを解放してから呼ぶ）
+        get_memory_accountant().relieve()
+
+    def _drop_oldest_step(self) -> None:
+        new_base = self._keyframes.get(1)
+        if new_base is None:
+            new_base = self._steps[0].apply(self._keyframes[0])
+        self._base_params = self._steps.pop(0).params
+        self._keyframes = {index - 1: image for index, image in self._keyframes.items() if index > 1}
+        self._keyframes[0] = _frozen(new_base)
+        self._cursor -= 1
+        self._dropped += 1
+
+
+def _frozen(image: np.ndarray) -> np.ndarray:
+    """キーフレームとして保持する読み取り専用ビュー（呼び出し側が参照を書き換えて履歴を壊さないため）"""
+    view = image.view()
+    view.flags.writeable = False
+    return view
@@ -0,0 +1,183 @@
+"""
+画像エクスポートキュー
+エンコーダ設定付きの画像保存をバックグラウンドスレッドで並列実行する
+"""
+
+import io
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image
+
+
+class EncoderSettings:
+    """
+    フォーマット別のエンコーダ設定
+    JPEG: 品質・クロマサブサンプリング、PNG: 圧縮レベル、TIFF: 圧縮方式
+    """
+    def __init__(self,
+                 jpeg_quality: int = 95,
+                 jpeg_subsampling: str = "4:2:0",
+                 jpeg_optimize: bool = False,
+                 jpeg_progressive: bool = False,
+                 png_compress_level: int = 6,
+                 png_optimize: bool = False,
+                 tiff_compression: Optional[str] = "tiff_lzw",
+                 webp_quality: int = 90,
+                 webp_method: int = 4):
+        self.jpeg_quality = jpeg_quality
+        self.jpeg_subsampling = jpeg_subsampling
+        self.jpeg_optimize = jpeg_optimize
+        self.jpeg_progressive = jpeg_progressive
+        self.png_compress_level = png_compress_level
+        self.png_optimize = png_optimize
+        self.tiff_compression = tiff_compression
+        self.webp_quality = webp_quality
+        self.webp_method = webp_method
+
+    def save_kwargs(self, image_format: str) -> Dict[str, Any]:
+        """Image.save() に渡すキーワード引数を返す"""
+        image_format = image_format.upper()
+        if image_format == "JPEG":
+            return {
+                "quality": self.jpeg_quality,
+                "subsampling": self.jpeg_subsampling,
+                "optimize": self.jpeg_optimize,
+                "progressive": self.jpeg_progressive,
+            }
+        if image_format == "PNG":
+            # optimize=True は圧縮レベル9を強制するため、指定時のみ渡す
+            if self.png_optimize:
+                return {"optimize": True}
+            return {"compress_level": self.png_compress_level}
+        if image_format == "TIFF":
+            return {"compression": self.tiff_compression} if self.tiff_compression else {}
+        if image_format == "WEBP":
+            return {"quality": self.webp_quality, "method": self.webp_method}
+        return {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "EncoderSettings":
+        return cls(**data)
+
+
+def detect_format(file_path: str) -> str:
+    """拡張子からPILのフォーマット名を判定（不明な場合はPNG）"""
+    extension = os.path.splitext(file_path)[1].lower()
+    return Image.registered_extensions().get(extension, "PNG")
+
+
+def prepare_for_format(image: Image.Image, image_format: str) -> Image.Image:
+    """保存先フォーマットが扱えないモードを変換"""
+    if image_format.upper() == "JPEG" and image.mode not in ("RGB", "L", "CMYK"):
+        return image.convert("RGB")
+    return image
+
+
+def encode_image(image: Image.Image, file_path: str,
+                 settings: Optional[EncoderSettings] = None,
+                 image_format: Optional[str] = None) -> Dict[str, Any]:
+    """画像を同期的に保存し、エンコード時間と出力サイズを返す"""
+    settings = settings or EncoderSettings()
+    image_format = image_format or detect_format(file_path)
+    start = time.perf_counter()
+    prepare_for_format(image, image_format).save(file_path, format=image_format, **settings.save_kwargs(image_format))
+    encode_time = time.perf_counter() - start
+    return {
+        "path": file_path,
+        "format": image_format,
+        "encode_time": encode_time,
+        "size_bytes": os.path.getsize(file_path),
+    }
+
+
+def benchmark_encoder_settings(image: Image.Image, image_format: str,
+                               candidates: Iterable[EncoderSettings]) -> List[Dict[str, Any]]:
+    """
+    メモリ上でエンコードして各設定の速度とサイズを比較
+    速度とファイルサイズのバランスが良い設定を選ぶために使用する
+    """
+    prepared = prepare_for_format(image, image_format)
+    results = []
+    for settings in candidates:
+        buffer = io.BytesIO()
+        start = time.perf_counter()
+        prepared.save(buffer, format=image_format, **settings.save_kwargs(image_format))
+        results.append({
+            "format": image_format,
+            "settings": settings.save_kwargs(image_format),
+            "encode_time": time.perf_counter() - start,
+            "size_bytes": buffer.tell(),
+        })
+    return results
+
+
+class ExportQueue:
+    """
+    バックグラウンド画像エクスポートキュー
+    submit() で保存ジョブを投入し、poll_results() で完了したジョブの結果を取り出す。
+    PILのエンコーダは処理中にGILを解放するため、複数ジョブをスレッドで並列に保存できる。
+    投入した画像は保存完了まで変更しないこと。
+    """
+    def __init__(self, max_workers: int = 2, settings: Optional[EncoderSettings] = None):
+        self.settings = settings or EncoderSettings()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ExportQueue")
+        self._results = queue.Queue()
+        self._lock = threading.Lock()
+        self._next_job_id = 0
+        self._pending = 0
+
+    def submit(self, image: Image.Image, file_path: str,
+               settings: Optional[EncoderSettings] = None,
+               image_format: Optional[str] = None) -> int:
+        """保存ジョブを投入し、ジョブIDを返す"""
+        # Image.open直後の遅延読み込み画像をワーカー間で共有しないよう、ここで読み込んでおく
+        image.load()
+        with self._lock:
+            self._next_job_id += 1
+            job_id = self._next_job_id
+            self._pending += 1
+        self._executor.submit(self._run_job, job_id, image, file_path, settings or self.settings, image_format)
+        return job_id
+
+    def submit_many(self, jobs: Iterable[Tuple[Image.Image, str]],
+                    settings: Optional[EncoderSettings] = None) -> List[int]:
+        """複数の (画像, 保存先) を一括投入"""
+        return [self.submit(image, file_path, settings) for image, file_path in jobs]
+
+    def poll_results(self) -> List[Dict[str, Any]]:
+        """完了したジョブの結果を全て取り出す（ブロックしない）"""
+        results = []
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._pending
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+    def _run_job(self, job_id: int, image: Image.Image, file_path: str,
+                 settings: EncoderSettings, image_format: Optional[str]) -> None:
+        try:
+            result = encode_image(image, file_path, settings, image_format)
+            result["error"] = None
+        except Exception as e:
+            result = {"path": file_path, "format": image_format, "encode_time": None,
+                      "size_bytes": None, "error": str(e)}
+        result["job_id"] = job_id
+        # 結果を積んでから未完了数を減らす（pending_count()==0 なら結果は必ず取得できる）
+        self._results.put(result)
+        with self._lock:
+            self._pending -= 1
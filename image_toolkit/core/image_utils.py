@@ -4,9 +4,14 @@
 画像変換、フォーマット処理などのヘルパー関数
 """
 
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
 import cv2
 import numpy as np
-from PIL import Image
+from PIL import Image, ImageMode
+
+from image_toolkit.core.blur_engine import DEFAULT_ENGINE as BLUR_ENGINE
 
 class ImageUtils:
     """
@@ -46,19 +51,43 @@ class ImageUtils:
             return image.resize((new_width, new_height), Image.Resampling.LANCZOS)
         return image
 
+    @staticmethod
+    def build_hsv_lut(hue_shift: int = 0, saturation_scale: float = 1.0, value_scale: float = 1.0) -> np.ndarray:
+        """
+        HSV各チャンネル用のLUT（256×1×3）を作成
+        H: (h + hue_shift) mod 180、S/V: cv2.multiply と同じ丸め・飽和で倍率を適用
+        """
+        levels = np.arange(256, dtype=np.uint8).reshape(256, 1)
+        hue = ((np.arange(256) + hue_shift) % 180).astype(np.uint8).reshape(256, 1)
+        saturation = cv2.multiply(levels, saturation_scale)
+        value = cv2.multiply(levels, value_scale)
+        return np.dstack([hue, saturation, value])
+
+    @staticmethod
+    def adjust_hsv_array(rgb: np.ndarray, hue_shift: int = 0, saturation_scale: float = 1.0,
+                         value_scale: float = 1.0) -> np.ndarray:
+        """RGB配列の色相・彩度・明度を1回の色空間変換往復とLUT1回で調整"""
+        if hue_shift % 180 == 0 and saturation_scale == 1.0 and value_scale == 1.0:
+            return rgb
+        lut = ImageUtils.build_hsv_lut(hue_shift, saturation_scale, value_scale)
+        hsv = cv2.cvtColor(rgb, cv2.COLOR_RGB2HSV)
+        cv2.LUT(hsv, lut, dst=hsv)
+        return cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB)
+
+    @staticmethod
+    def apply_hsv_adjustment(image: Image.Image, hue_shift: int = 0, saturation_scale: float = 1.0,
+                             value_scale: float = 1.0) -> Image.Image:
+        """色相シフト・彩度倍率・明度倍率をまとめて適用"""
+        if hue_shift % 180 == 0 and saturation_scale == 1.0 and value_scale == 1.0:
+            return image
+        rgb = np.asarray(ImageUtils.ensure_rgb(image))
+        return Image.fromarray(ImageUtils.adjust_hsv_array(rgb, hue_shift, saturation_scale, value_scale))
+
     @staticmethod
     def apply_brightness(image: Image.Image, brightness: int) -> Image.Image:
         if brightness == 0:
             return image
-        cv_image = ImageUtils.pil_to_cv2(image)
-        hsv = cv2.cvtColor(cv_image, cv2.COLOR_BGR2HSV)
-        h, s, v = cv2.split(hsv)
-        brightness_factor = 1.0 + (brightness / 100.0)
-        v = cv2.multiply(v, brightness_factor)
-        v = np.clip(v, 0, 255).astype(np.uint8)
-        hsv = cv2.merge([h, s, v])
-        adjusted = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
-        return ImageUtils.cv2_to_pil(adjusted)
+        return ImageUtils.apply_hsv_adjustment(image, value_scale=1.0 + (brightness / 100.0))
 
     @staticmethod
     def apply_contrast(image: Image.Image, contrast: int) -> Image.Image:
@@ -73,15 +102,7 @@ class ImageUtils:
     def apply_saturation(image: Image.Image, saturation: int) -> Image.Image:
         if saturation == 0:
             return image
-        cv_image = ImageUtils.pil_to_cv2(image)
-        hsv = cv2.cvtColor(cv_image, cv2.COLOR_BGR2HSV)
-        h, s, v = cv2.split(hsv)
-        saturation_factor = 1.0 + (saturation / 100.0)
-        s = cv2.multiply(s, saturation_factor)
-        s = np.clip(s, 0, 255).astype(np.uint8)
-        hsv = cv2.merge([h, s, v])
-        adjusted = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
-        return ImageUtils.cv2_to_pil(adjusted)
+        return ImageUtils.apply_hsv_adjustment(image, saturation_scale=1.0 + (saturation / 100.0))
 
     @staticmethod
     def apply_gamma_correction(image: Image.Image, gamma: float) -> Image.Image:
@@ -107,11 +128,117 @@ class ImageUtils:
             return image
         cv_image = ImageUtils.pil_to_cv2(image)
         kernel_size = blur_strength * 2 + 1
-        blurred = cv2.GaussianBlur(cv_image, (kernel_size, kernel_size), 0)
+        # 大きなカーネルは半径に依存しない計算量のぼかしに切り替える
+        blurred = BLUR_ENGINE.blur_kernel_size(cv_image, kernel_size)
         return ImageUtils.cv2_to_pil(blurred)
 
+    # ========== バッチ処理（N×H×W×C uint8, RGB順） ==========
+    # 画素単位の処理はフレームを縦に連結した1枚の画像として1回のOpenCV呼び出しで処理し、
+    # 近傍を参照する処理（ぼかし等）のみフレームごとに処理する
+
+    @staticmethod
+    def stack_images(images: Sequence[Image.Image]) -> np.ndarray:
+        """同じサイズのPIL画像列をN×H×W×3のuint8配列にまとめる"""
+        first = ImageUtils.ensure_rgb(images[0])
+        batch = np.empty((len(images), first.height, first.width, 3), dtype=np.uint8)
+        for index, image in enumerate(images):
+            batch[index] = np.asarray(ImageUtils.ensure_rgb(image))
+        return batch
+
     @staticmethod
-    def get_image_info(image: Image.Image) -> dict:
+    def unstack_images(batch: np.ndarray) -> List[Image.Image]:
+        return [Image.fromarray(frame) for frame in batch]
+
+    @staticmethod
+    def _as_tall_image(batch: np.ndarray) -> np.ndarray:
+        """N×H×W×C を (N*H)×W×C のビューに変換"""
+        if batch.ndim != 4 or batch.dtype != np.uint8:
+            raise ValueError(f"N×H×W×C の uint8 配列が必要です: shape={batch.shape}, dtype={batch.dtype}")
+        batch = np.ascontiguousarray(batch)
+        n, h, w, c = batch.shape
+        return batch.reshape(n * h, w, c)
+
+    @staticmethod
+    def apply_brightness_batch(batch: np.ndarray, brightness: int) -> np.ndarray:
+        if brightness == 0:
+            return batch
+        tall = ImageUtils._as_tall_image(batch)
+        return ImageUtils.adjust_hsv_array(tall, value_scale=1.0 + (brightness / 100.0)).reshape(batch.shape)
+
+    @staticmethod
+    def apply_contrast_batch(batch: np.ndarray, contrast: int) -> np.ndarray:
+        if contrast == 0:
+            return batch
+        tall = ImageUtils._as_tall_image(batch)
+        adjusted = cv2.convertScaleAbs(tall, alpha=1.0 + (contrast / 100.0), beta=0)
+        return adjusted.reshape(batch.shape)
+
+    @staticmethod
+    def apply_saturation_batch(batch: np.ndarray, saturation: int) -> np.ndarray:
+        if saturation == 0:
+            return batch
+        tall = ImageUtils._as_tall_image(batch)
+        return ImageUtils.adjust_hsv_array(tall, saturation_scale=1.0 + (saturation / 100.0)).reshape(batch.shape)
+
+    @staticmethod
+    def apply_hsv_adjustment_batch(batch: np.ndarray, hue_shift: int = 0, saturation_scale: float = 1.0,
+                                   value_scale: float = 1.0) -> np.ndarray:
+        tall = ImageUtils._as_tall_image(batch)
+        return ImageUtils.adjust_hsv_array(tall, hue_shift, saturation_scale, value_scale).reshape(batch.shape)
+
+    @staticmethod
+    def apply_gamma_correction_batch(batch: np.ndarray, gamma: float) -> np.ndarray:
+        if gamma == 1.0:
+            return batch
+        tall = ImageUtils._as_tall_image(batch)
+        inv_gamma = 1.0 / gamma
+        table = np.array([((i / 255.0) ** inv_gamma) * 255 for i in np.arange(0, 256)]).astype("uint8")
+        return cv2.LUT(tall, table).reshape(batch.shape)
+
+    @staticmethod
+    def apply_histogram_equalization_batch(batch: np.ndarray) -> np.ndarray:
+        tall = ImageUtils._as_tall_image(batch)
+        yuv = cv2.cvtColor(tall, cv2.COLOR_RGB2YUV)
+        height = batch.shape[1]
+        # 輝度ヒストグラムはフレームごとに均等化
+        for index in range(batch.shape[0]):
+            rows = slice(index * height, (index + 1) * height)
+            yuv[rows, :, 0] = cv2.equalizeHist(yuv[rows, :, 0])
+        return cv2.cvtColor(yuv, cv2.COLOR_YUV2RGB).reshape(batch.shape)
+
+    @staticmethod
+    def apply_gaussian_blur_batch(batch: np.ndarray, blur_strength: int) -> np.ndarray:
+        if blur_strength == 0:
+            return batch
+        kernel_size = blur_strength * 2 + 1
+        output = np.empty_like(batch)
+        # フレーム境界をまたいでぼかさないよう、フレームごとに処理して出力先へ書き込む
+        for index in range(batch.shape[0]):
+            output[index] = BLUR_ENGINE.blur_kernel_size(batch[index], kernel_size)
+        return output
+
+    @staticmethod
+    def open_handle(path: str) -> "ImageHandle":
+        """ヘッダーだけを読んだ遅延ハンドルを返す（画素は使うときにデコード）"""
+        return ImageHandle(path)
+
+    @staticmethod
+    def read_image_info(path: str) -> dict:
+        """画素をデコードせずに get_image_info と同じ情報 + EXIF/ICC の有無を返す"""
+        handle = ImageHandle(path)
+        info = ImageUtils.get_image_info(handle)
+        info.update({
+            'path': handle.path,
+            'frames': handle.n_frames,
+            'orientation': handle.orientation,
+            'has_exif': len(handle.exif) > 0,
+            'has_icc_profile': handle.icc_profile is not None,
+        })
+        return info
+
+    @staticmethod
+    def get_image_info(image) -> dict:
+        """PIL画像または ImageHandle のサイズ・モード・形式（ImageHandle ならデコードしない）"""
         if not image:
             return {}
         return {
@@ -121,3 +248,204 @@ class ImageUtils:
             'format': image.format,
             'size_mb': (image.width * image.height * len(image.getbands())) / (1024 * 1024)
         }
+
+
+# 無圧縮の行データを直接読める (モード, rawmode) と、1画素のバイト数・チャンネルの並べ替え
+_RAW_LAYOUTS = {
+    ("L", "L"): (1, None),
+    ("RGB", "RGB"): (3, None),
+    ("RGB", "BGR"): (3, [2, 1, 0]),
+    ("RGB", "BGRX"): (4, [2, 1, 0]),
+    ("RGBA", "RGBA"): (4, None),
+    ("RGBA", "BGRA"): (4, [2, 1, 0, 3]),
+}
+
+
+class ImageHandle:
+    """
+    画像ファイルへの遅延ハンドル
+
+    生成時はヘッダーだけを読んでサイズ・モード・形式・EXIF・ICCプロファイルを保持し、ファイルは閉じる
+    （大量のファイルを一覧・検証しても画素のデコードやファイル記述子の保持が発生しない）。
+    画素は image / to_array() の初回アクセスでデコードしてキャッシュする。
+    reduced() はJPEGならDCT段階で縮小デコードし、region() は無圧縮形式（BMP・無圧縮TIFF等）なら
+    必要な行だけをメモリマップで読む。対応しない形式はデコード後に縮小・切り出す。
+    """
+    def __init__(self, path: str):
+        self.path = str(path)
+        with Image.open(self.path) as image:
+            self.size: Tuple[int, int] = image.size
+            self.mode: str = image.mode
+            self.format: Optional[str] = image.format
+            self.info: Dict[str, Any] = dict(image.info)
+            self.n_frames: int = getattr(image, "n_frames", 1)
+            self._tile = list(image.tile)
+            # PNGの getexif() はIDAT後のEXIFを探すために全体をデコードするため、ヘッダー内のEXIFだけを読む
+            if self.format == "PNG":
+                self._exif = Image.Exif()
+                if "exif" in self.info:
+                    self._exif.load(self.info["exif"])
+            else:
+                self._exif = image.getexif()
+        self._image: Optional[Image.Image] = None
+
+    # ---------- ヘッダー情報 ----------
+
+    @property
+    def width(self) -> int:
+        return self.size[0]
+
+    @property
+    def height(self) -> int:
+        return self.size[1]
+
+    def getbands(self) -> Tuple[str, ...]:
+        return ImageMode.getmode(self.mode).bands
+
+    @property
+    def exif(self) -> Image.Exif:
+        return self._exif
+
+    @property
+    def orientation(self) -> int:
+        """EXIFの向き（1 = 回転なし）"""
+        return int(self._exif.get(0x0112, 1) or 1)
+
+    @property
+    def icc_profile(self) -> Optional[bytes]:
+        return self.info.get("icc_profile")
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._image is not None
+
+    def verify(self) -> Optional[str]:
+        """ファイルの整合性を検査し、問題があれば理由を返す（画素はデコードしない）"""
+        try:
+            with Image.open(self.path) as image:
+                image.verify()
+        except Exception as e:
+            return str(e)
+        return None
+
+    # ---------- 画素へのアクセス ----------
+
+    def open(self, draft_size: Optional[Tuple[int, int]] = None, mode: Optional[str] = None) -> Image.Image:
+        """
+        ファイルを開き直して未デコードのPIL画像を返す（呼び出し側で閉じること）
+        draft_size を指定すると、JPEGでは draft_size 以上で最小の 1/2^n 縮小デコードを設定する
+        """
+        image = Image.open(self.path)
+        if draft_size is not None or mode is not None:
+            image.draft(mode, draft_size)
+        return image
+
+    @property
+    def image(self) -> Image.Image:
+        """フル解像度の画像（初回アクセス時にデコード）"""
+        if self._image is None:
+            image = Image.open(self.path)
+            image.load()
+            self._image = image
+        return self._image
+
+    def to_array(self, mode: Optional[str] = None) -> np.ndarray:
+        image = self.image
+        if mode is not None and image.mode != mode:
+            image = image.convert(mode)
+        return np.asarray(image)
+
+    def reduced(self, max_side: int, mode: Optional[str] = None) -> Image.Image:
+        """長辺 max_side 以下に縮小した画像（JPEGは縮小デコード、デコード済みならキャッシュから縮小）"""
+        if self._image is not None:
+            image = self._image.convert(mode) if mode is not None and self._image.mode != mode else self._image.copy()
+        else:
+            with self.open((max_side, max_side), mode) as source:
+                image = source.convert(mode) if mode is not None and source.mode != mode else source.copy()
+        if max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.Resampling.BILINEAR)
+        return image
+
+    def region(self, box: Tuple[int, int, int, int], scale: float = 1.0) -> Image.Image:
+        """
+        元画像座標の矩形 box=(left, top, right, bottom) を切り出す（scale < 1 で縮小して返す）
+        無圧縮形式は該当行だけを読み、JPEGの縮小指定では縮小デコードしてから切り出す
+        """
+        left, top, right, bottom = self._clip_box(box)
+        target = (max(1, int(round((right - left) * scale))), max(1, int(round((bottom - top) * scale))))
+        if self._image is not None:
+            region = self._image.crop((left, top, right, bottom))
+        elif scale >= 1.0 and self._raw_layout() is not None:
+            region = self._read_raw_region(left, top, right, bottom)
+        else:
+            draft_size = None
+            if scale < 1.0:
+                draft_size = (max(1, int(self.width * scale)), max(1, int(self.height * scale)))
+            with self.open(draft_size) as source:
+                factor_x = self.width / source.width
+                factor_y = self.height / source.height
+                region = source.crop((int(left / factor_x), int(top / factor_y),
+                                      int(math.ceil(right / factor_x)), int(math.ceil(bottom / factor_y))))
+        if region.size != target:
+            region = region.resize(target, Image.Resampling.BILINEAR)
+        return region
+
+    def close(self) -> None:
+        """デコード済みの画素を解放（ヘッダー情報は残る）"""
+        if self._image is not None:
+            self._image.close()
+            self._image = None
+
+    def __enter__(self) -> "ImageHandle":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._image is not None else "header"
+        return f"<ImageHandle {self.path} {self.format} {self.mode} {self.width}x{self.height} ({state})>"
+
+    # ---------- 内部処理 ----------
+
+    def _clip_box(self, box: Tuple[int, int, int, int]) -> Tuple[int, int, int, int]:
+        left, top, right, bottom = (int(value) for value in box)
+        left, top = max(0, left), max(0, top)
+        right, bottom = min(self.width, right), min(self.height, bottom)
+        if right <= left or bottom <= top:
+            raise ValueError(f"切り出し範囲が画像外です: {box}")
+        return left, top, right, bottom
+
+    def _raw_layout(self):
+        if len(self._tile) != 1 or self._tile[0][0] != "raw":
+            return None
+        args = self._tile[0][3]
+        if not isinstance(args, tuple) or len(args) < 3:
+            return None
+        rawmode, stride, orientation = args[:3]
+        layout = _RAW_LAYOUTS.get((self.mode, rawmode))
+        if layout is None or orientation not in (1, -1):
+            return None
+        pixel_bytes, channels = layout
+        return self._tile[0][2], stride or self.width * pixel_bytes, orientation, pixel_bytes, channels
+
+    def _read_raw_region(self, left: int, top: int, right: int, bottom: int) -> Image.Image:
+        offset, stride, orientation, pixel_bytes, channels = self._raw_layout()
+        data = np.memmap(self.path, dtype=np.uint8, mode="r", offset=offset, shape=(self.height, stride))
+        try:
+            if orientation == 1:
+                rows = slice(top, bottom)
+            else:
+                # 下から上へ格納された形式（BMP）は行の位置を反転する
+                stop = self.height - bottom - 1
+                rows = slice(self.height - top - 1, stop if stop >= 0 else None, -1)
+            block = np.array(data[rows, left * pixel_bytes:right * pixel_bytes])
+        finally:
+            del data
+        block = block.reshape(bottom - top, right - left, pixel_bytes)
+        if channels is not None:
+            block = block[:, :, channels]
+        if block.shape[2] == 1:
+            block = block[:, :, 0]
+        return Image.fromarray(np.ascontiguousarray(block))
+
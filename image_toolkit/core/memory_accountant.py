@@ -0,0 +1,213 @@
+"""
+プロセス全体のメモリ管理
+デコード済み画像・解析キャッシュ・編集履歴・共有メモリプール等のキャッシュを登録し、
+合計が予算を超えたら優先度の低いものから解放する。
+処理の作業メモリ見積もり（ImageUtils.get_image_info の size_mb を使用）が予算を超える場合は、
+帯（タイル）に分割した実行に切り替える。
+"""
+
+import math
+import os
+import threading
+import weakref
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from image_toolkit.core.image_utils import ImageHandle, ImageUtils
+
+_MIB = 1024 * 1024
+
+# 登録時の解放優先度（小さいほど先に解放される）
+PRIORITY_CACHE = 0      # 再計算できる解析結果・プロキシ
+PRIORITY_POOL = 1       # 再確保できる作業バッファ
+PRIORITY_HISTORY = 2    # 失うと元に戻せない編集履歴
+
+
+def physical_memory_bytes() -> int:
+    """搭載メモリ量（取得できない環境では4GBとみなす）"""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return 4 * 1024 * _MIB
+
+
+class MemoryAccountant:
+    """
+    キャッシュ類のメモリ使用量を集計し、予算超過時に解放を指示するクラス
+
+    登録するオブジェクトは total_bytes() と evict(target_bytes) -> 解放バイト数 を実装すること
+    （EditHistory, AnalysisEngine, SharedFramePool が対応）。登録は弱参照で保持する。
+    relieve() は任意のスレッドから呼ばれ、自身のロックを保持したまま各オブジェクトの total_bytes() / evict() を呼ぶため、
+    登録するオブジェクトはこれらを自身のロックで保護し、そのロックを保持したまま relieve() を呼ばないこと。
+    """
+    def __init__(self, budget_bytes: Optional[int] = None, budget_fraction: float = 0.5):
+        self.budget_bytes = budget_bytes or int(physical_memory_bytes() * budget_fraction)
+        self._consumers: Dict[int, Tuple[weakref.ref, str, int]] = {}
+        self._lock = threading.RLock()
+
+    # ---------- 登録 ----------
+
+    def register(self, consumer: Any, name: str = "", priority: int = PRIORITY_CACHE) -> None:
+        with self._lock:
+            key = id(consumer)
+            self._consumers[key] = (weakref.ref(consumer, lambda _, key=key: self._forget(key)),
+                                    name or type(consumer).__name__, priority)
+
+    def unregister(self, consumer: Any) -> None:
+        self._forget(id(consumer))
+
+    def _forget(self, key: int) -> None:
+        with self._lock:
+            self._consumers.pop(key, None)
+
+    # ---------- 集計・解放 ----------
+
+    def usage(self) -> Dict[str, int]:
+        """登録名ごとの使用バイト数"""
+        usage: Dict[str, int] = {}
+        for consumer, name, _ in self._live_consumers():
+            usage[name] = usage.get(name, 0) + consumer.total_bytes()
+        return usage
+
+    def used_bytes(self) -> int:
+        return sum(consumer.total_bytes() for consumer, _, _ in self._live_consumers())
+
+    def available_bytes(self) -> int:
+        return max(0, self.budget_bytes - self.used_bytes())
+
+    def relieve(self, target_bytes: Optional[int] = None) -> int:
+        """
+        登録済みキャッシュの合計が target_bytes（省略時は予算）以下になるまで優先度の低い順に解放し、
+        解放したバイト数を返す
+        """
+        if target_bytes is None:
+            target_bytes = self.budget_bytes
+        with self._lock:
+            consumers = sorted(self._live_consumers(), key=lambda item: item[2])
+            used = sum(consumer.total_bytes() for consumer, _, _ in consumers)
+            released = 0
+            for consumer, name, _ in consumers:
+                excess = used - released - target_bytes
+                if excess <= 0:
+                    break
+                own = consumer.total_bytes()
+                freed = consumer.evict(max(0, own - excess))
+                if freed:
+                    print(f"🧹 メモリ解放: {name} から {freed / _MIB:.1f} MB")
+                released += freed
+            return released
+
+    def reserve(self, nbytes: int) -> bool:
+        """nbytes の新規確保に備えてキャッシュを解放し、予算内に収まるかを返す"""
+        if self.used_bytes() + nbytes > self.budget_bytes:
+            self.relieve(max(0, self.budget_bytes - nbytes))
+        return self.used_bytes() + nbytes <= self.budget_bytes
+
+    def _live_consumers(self):
+        with self._lock:
+            items = list(self._consumers.values())
+        live = []
+        for reference, name, priority in items:
+            consumer = reference()
+            if consumer is not None:
+                live.append((consumer, name, priority))
+        return live
+
+    # ---------- 見積もりと実行方法の選択 ----------
+
+    @staticmethod
+    def estimate_bytes(image: Any, working_copies: int = 3, itemsize: int = 1) -> int:
+        """
+        処理の作業メモリを見積もる
+        PIL画像・ImageHandle は get_image_info の size_mb（画素数×バンド数）、配列はそのバイト数を基準にする
+        """
+        if isinstance(image, (Image.Image, ImageHandle)):
+            base = ImageUtils.get_image_info(image)["size_mb"] * _MIB
+        else:
+            base = image.size
+        return int(base * itemsize * working_copies)
+
+    def fits(self, image: Any, working_copies: int = 3, itemsize: int = 1) -> bool:
+        return self.reserve(self.estimate_bytes(image, working_copies, itemsize))
+
+    def tile_rows(self, array: np.ndarray, working_copies: int = 3, itemsize: int = 1, halo: int = 0,
+                  row_align: int = 1) -> int:
+        """予算の空きに収まる帯の行数（最低でも16行、row_align の倍数に切り下げ）"""
+        row_bytes = max(1, array[:1].size) * itemsize * working_copies
+        rows = int(max(16, min(array.shape[0], self.available_bytes() // row_bytes - 2 * halo)))
+        return max(row_align, rows - rows % row_align)
+
+    def run(self, function: Callable[[np.ndarray], np.ndarray], array: np.ndarray, halo: int = 0,
+            working_copies: int = 3, itemsize: int = 1, row_align: int = 1) -> np.ndarray:
+        """
+        見積もりが予算内なら function(array) をそのまま実行し、超える場合は上下に halo 行の余白を付けた帯ごとに実行する
+        function は入力と同じ行数の配列を返す近傍処理であること（halo が近傍半径以上なら結果は一括実行と一致）
+        縮小を伴う処理では row_align に縮小率を渡すと、帯の開始行（余白を含む）が縮小率の倍数に揃う
+        """
+        if self.reserve(self.estimate_bytes(array, working_copies, itemsize)):
+            return function(array)
+        halo += -halo % row_align
+        return self.run_tiled(function, array, halo, self.tile_rows(array, working_copies, itemsize, halo, row_align))
+
+    @staticmethod
+    def run_tiled(function: Callable[[np.ndarray], np.ndarray], array: np.ndarray,
+                  halo: int, tile_rows: int) -> np.ndarray:
+        """帯ごとに function を適用して結果を1つの配列にまとめる"""
+        height = array.shape[0]
+        print(f"🧩 メモリ予算超過のため {int(math.ceil(height / tile_rows))} 帯に分割して処理します")
+        output = None
+        for y0 in range(0, height, tile_rows):
+            y1 = min(height, y0 + tile_rows)
+            top = max(0, y0 - halo)
+            bottom = min(height, y1 + halo)
+            result = function(np.ascontiguousarray(array[top:bottom]))
+            if output is None:
+                output = np.empty((height,) + result.shape[1:], dtype=result.dtype)
+            output[y0:y1] = result[y0 - top:y1 - top]
+        return output
+
+    def open_image(self, path: str, working_copies: int = 2) -> Image.Image:
+        """
+        画像を予算内で開く
+        デコード前にヘッダーのサイズから見積もり、予算を超える場合はJPEGなら縮小デコードし、
+        縮小デコードできない形式は MemoryError を送出する（スワップを起こさないため）
+        """
+        handle = ImageUtils.open_handle(path)
+        needed = self.estimate_bytes(handle, working_copies)
+        if self.reserve(needed):
+            return handle.image
+        # draft() は要求サイズ以上で最小の 1/2^n 縮小を選ぶため、要求を半分にして予算内に収まる縮小率を選ばせる
+        scale = math.sqrt(max(1, self.available_bytes()) / needed) / 2
+        requested = (max(1, int(handle.width * scale)), max(1, int(handle.height * scale)))
+        image = handle.open(requested if handle.format == "JPEG" else None)
+        if self.estimate_bytes(image, working_copies) > self.available_bytes():
+            image.close()
+            raise MemoryError(
+                f"画像が大きすぎます（{handle.width}x{handle.height}、"
+                f"見積もり {needed / _MIB:.0f} MB / 空き {self.available_bytes() / _MIB:.0f} MB）"
+            )
+        print(f"📉 メモリ予算に合わせて縮小デコード: {handle.size} → {image.size}")
+        image.load()
+        return image
+
+
+_accountant: Optional[MemoryAccountant] = None
+_accountant_lock = threading.Lock()
+
+
+def get_memory_accountant() -> MemoryAccountant:
+    """プロセス共通のメモリ管理オブジェクト"""
+    global _accountant
+    with _accountant_lock:
+        if _accountant is None:
+            _accountant = MemoryAccountant()
+        return _accountant
+
+
+def set_memory_budget(budget_bytes: int) -> None:
+    """プロセス共通のメモリ予算を変更し、超過分を解放"""
+    accountant = get_memory_accountant()
+    accountant.budget_bytes = budget_bytes
+    accountant.relieve()
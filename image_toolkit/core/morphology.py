@@ -0,0 +1,248 @@
+"""
+モルフォロジー演算と輪郭統計
+構造要素はキャッシュし、大きな矩形カーネルは2点カーネルの合成（対数回のパス）に分解して実行する。
+輪郭統計（面積・周囲長・外接矩形・重心）は全輪郭の点列を連結した配列上で np.*.reduceat により一括計算する。
+"""
+
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+
+OPERATIONS = ("erode", "dilate", "open", "close", "tophat", "blackhat", "gradient")
+
+_SHAPES = {
+    "rect": cv2.MORPH_RECT,
+    "ellipse": cv2.MORPH_ELLIPSE,
+    "cross": cv2.MORPH_CROSS,
+}
+
+Size = Union[int, Tuple[int, int]]
+
+
+@lru_cache(maxsize=64)
+def structuring_element(shape: str = "rect", width: int = 3, height: int = 3) -> np.ndarray:
+    """構造要素を取得（同じ形状・サイズは再生成しない。戻り値は書き換えないこと）"""
+    if shape not in _SHAPES:
+        raise ValueError(f"未知の構造要素です: {shape}")
+    kernel = cv2.getStructuringElement(_SHAPES[shape], (width, height))
+    kernel.setflags(write=False)
+    return kernel
+
+
+@lru_cache(maxsize=64)
+def _two_tap_passes(length: int, anchor: int) -> Tuple[Tuple[np.ndarray, int], ...]:
+    """
+    長さ length の1次元矩形を、間隔 1, 2, 4, ... の2点カーネルの合成に分解
+    各パスの (カーネル, アンカー) を返す。アンカーの合計を anchor にすることで元の矩形と同じ位置基準の結果にする
+    """
+    passes = []
+    remaining = length - 1
+    remaining_anchor = anchor
+    distance = 1
+    while remaining > 0:
+        step = min(distance, remaining)
+        anchor = min(step, remaining_anchor)
+        kernel = np.zeros((1, step + 1), np.uint8)
+        kernel[0, 0] = kernel[0, step] = 1
+        passes.append((kernel, anchor))
+        remaining -= step
+        remaining_anchor -= anchor
+        distance *= 2
+    return tuple(passes)
+
+
+class MorphologyEngine:
+    """
+    モルフォロジー演算エンジン
+
+    矩形カーネルは OpenCV 内部で行・列に分離して処理されるが、計算量はカーネル長に比例する。
+    一辺が decompose_threshold 以上の矩形は2点カーネルの合成に分解し、パス数をカーネル長の対数に抑える
+    （結果は cv2.morphologyEx と同一）。分解はパスごとの固定費が大きく、3000×4000 のRGB画像では
+    一辺200〜300付近でようやく直接実行より速くなるため、既定の閾値は 301（環境ごとの分岐点は benchmark() で確認）。
+    """
+    def __init__(self, decompose_threshold: int = 301):
+        self.decompose_threshold = decompose_threshold
+
+    def apply(self, image: np.ndarray, operation: str, shape: str = "rect",
+              size: Size = 3, iterations: int = 1) -> np.ndarray:
+        """operation（erode, dilate, open, close, tophat, blackhat, gradient）を適用"""
+        if operation not in OPERATIONS:
+            raise ValueError(f"未知のモルフォロジー演算です: {operation}")
+        width, height = (size, size) if isinstance(size, int) else size
+
+        if operation == "erode":
+            return self.erode(image, shape, (width, height), iterations)
+        if operation == "dilate":
+            return self.dilate(image, shape, (width, height), iterations)
+        if operation in ("open", "tophat"):
+            opened = self.dilate(self.erode(image, shape, (width, height), iterations), shape, (width, height), iterations)
+            return opened if operation == "open" else cv2.subtract(image, opened)
+        if operation in ("close", "blackhat"):
+            closed = self.erode(self.dilate(image, shape, (width, height), iterations), shape, (width, height), iterations)
+            return closed if operation == "close" else cv2.subtract(closed, image)
+        return cv2.subtract(self.dilate(image, shape, (width, height), iterations),
+                            self.erode(image, shape, (width, height), iterations))
+
+    def erode(self, image: np.ndarray, shape: str = "rect", size: Size = 3, iterations: int = 1) -> np.ndarray:
+        return self._basic(cv2.erode, image, shape, size, iterations)
+
+    def dilate(self, image: np.ndarray, shape: str = "rect", size: Size = 3, iterations: int = 1) -> np.ndarray:
+        return self._basic(cv2.dilate, image, shape, size, iterations)
+
+    def _basic(self, function, image: np.ndarray, shape: str, size: Size, iterations: int) -> np.ndarray:
+        width, height = (size, size) if isinstance(size, int) else size
+        if shape == "rect":
+            # 矩形の n 回適用は一辺 n(k-1)+1 の矩形1回と等価。アンカーは各回の中心 k // 2 の n 倍になる
+            # （偶数辺では合成後の矩形の中心と一致しないため明示する。OpenCV 内部の畳み込みと同じ規則）
+            anchor = (iterations * (width // 2), iterations * (height // 2))
+            width, height = iterations * (width - 1) + 1, iterations * (height - 1) + 1
+            if max(width, height) >= self.decompose_threshold:
+                return self._decomposed_rect(function, image, width, height, anchor)
+            return function(image, structuring_element(shape, width, height), anchor=anchor)
+        return function(image, structuring_element(shape, width, height), iterations=iterations)
+
+    @staticmethod
+    def _decomposed_rect(function, image: np.ndarray, width: int, height: int,
+                         anchor: Optional[Tuple[int, int]] = None) -> np.ndarray:
+        # 途中結果の画像外を定数で埋めると合成が崩れるため、端の複製で延長する
+        # （最小・最大値フィルタでは、画像内に切り詰めた窓で一括処理した既定の結果と一致する）
+        anchor_x, anchor_y = anchor if anchor is not None else (width // 2, height // 2)
+        result = image
+        for kernel, tap_anchor in _two_tap_passes(width, anchor_x):
+            result = function(result, kernel, anchor=(tap_anchor, 0), borderType=cv2.BORDER_REPLICATE)
+        for kernel, tap_anchor in _two_tap_passes(height, anchor_y):
+            result = function(result, kernel.T, anchor=(0, tap_anchor), borderType=cv2.BORDER_REPLICATE)
+        return result
+
+    # ---------- ベンチマーク ----------
+
+    def benchmark(self, size: Tuple[int, int] = (3000, 4000), lengths: Sequence[int] = (51, 101, 201, 301, 401, 601),
+                  seed: int = 0) -> List[Dict[str, Any]]:
+        """
+        矩形の一辺ごとに、cv2.erode の直接実行と2点カーネル分解の処理時間を測定
+        decompose が direct を下回る最小の一辺が decompose_threshold の目安
+        """
+        height, width = size
+        image = (np.random.default_rng(seed).random((height, width, 3)) * 255).astype(np.uint8)
+        rows = []
+        for length in lengths:
+            start = time.perf_counter()
+            cv2.erode(image, structuring_element("rect", length, length))
+            direct = time.perf_counter() - start
+            start = time.perf_counter()
+            self._decomposed_rect(cv2.erode, image, length, length)
+            decomposed = time.perf_counter() - start
+            rows.append({"length": length, "direct_ms": direct * 1000, "decompose_ms": decomposed * 1000})
+        return rows
+
+
+class ContourStats:
+    """
+    輪郭ごとの統計（各属性は長さ = 輪郭数の配列）
+    area / perimeter / centroid は cv2.contourArea / cv2.arcLength(closed=True) / cv2.moments と同じ定義
+    """
+    def __init__(self, contours: Sequence[np.ndarray], area: np.ndarray, perimeter: np.ndarray,
+                 bbox: np.ndarray, centroid: np.ndarray, point_count: np.ndarray):
+        self.contours = contours
+        self.area = area
+        self.perimeter = perimeter
+        self.bbox = bbox            # (N, 4): x, y, width, height
+        self.centroid = centroid    # (N, 2): cx, cy
+        self.point_count = point_count
+
+    def __len__(self) -> int:
+        return len(self.area)
+
+    def select(self, mask: np.ndarray) -> "ContourStats":
+        """真偽値配列（例: stats.area > 100）で輪郭を絞り込む"""
+        indices = np.flatnonzero(mask)
+        return ContourStats([self.contours[i] for i in indices], self.area[indices], self.perimeter[indices],
+                            self.bbox[indices], self.centroid[indices], self.point_count[indices])
+
+    def to_dict(self) -> Dict[str, np.ndarray]:
+        return {
+            "area": self.area,
+            "perimeter": self.perimeter,
+            "x": self.bbox[:, 0],
+            "y": self.bbox[:, 1],
+            "width": self.bbox[:, 2],
+            "height": self.bbox[:, 3],
+            "cx": self.centroid[:, 0],
+            "cy": self.centroid[:, 1],
+            "point_count": self.point_count,
+        }
+
+
+def contour_stats(contours: Sequence[np.ndarray]) -> ContourStats:
+    """輪郭リストの統計を、全点を連結した配列上で一括計算"""
+    count = len(contours)
+    if count == 0:
+        empty = np.zeros(0, np.float64)
+        return ContourStats([], empty, empty, np.zeros((0, 4), np.int32), np.zeros((0, 2), np.float64),
+                            np.zeros(0, np.int64))
+
+    lengths = np.fromiter((len(contour) for contour in contours), dtype=np.int64, count=count)
+    points = np.concatenate(contours).reshape(-1, 2).astype(np.float64)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+    # 各点の「次の点」（輪郭の最後の点は先頭へ戻る）
+    next_index = np.arange(len(points)) + 1
+    next_index[starts + lengths - 1] = starts
+    x, y = points[:, 0], points[:, 1]
+    next_x, next_y = x[next_index], y[next_index]
+
+    # 靴ひも公式による符号付き面積と重心（Greenの定理、cv2.moments と同じ）
+    cross = x * next_y - next_x * y
+    signed_area = np.add.reduceat(cross, starts) / 2.0
+    moment_x = np.add.reduceat((x + next_x) * cross, starts) / 6.0
+    moment_y = np.add.reduceat((y + next_y) * cross, starts) / 6.0
+    perimeter = np.add.reduceat(np.hypot(next_x - x, next_y - y), starts)
+
+    # 面積0の輪郭（線・点）は点の平均を重心とする
+    with np.errstate(divide="ignore", invalid="ignore"):
+        centroid = np.stack([moment_x / signed_area, moment_y / signed_area], axis=1)
+    degenerate = signed_area == 0
+    if degenerate.any():
+        mean_x = np.add.reduceat(x, starts) / lengths
+        mean_y = np.add.reduceat(y, starts) / lengths
+        centroid[degenerate] = np.stack([mean_x, mean_y], axis=1)[degenerate]
+
+    min_x = np.minimum.reduceat(x, starts)
+    min_y = np.minimum.reduceat(y, starts)
+    max_x = np.maximum.reduceat(x, starts)
+    max_y = np.maximum.reduceat(y, starts)
+    bbox = np.stack([min_x, min_y, max_x - min_x + 1, max_y - min_y + 1], axis=1).astype(np.int32)
+
+    return ContourStats(contours, np.abs(signed_area), perimeter, bbox, centroid, lengths)
+
+
+def find_contours(image: np.ndarray, threshold: Optional[int] = None, external_only: bool = True,
+                  min_area: float = 0.0) -> ContourStats:
+    """
+    二値化して輪郭を抽出し、統計を返す
+    threshold を省略すると大津の二値化、external_only=False で穴の輪郭も含める
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    if threshold is None:
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    else:
+        _, binary = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY)
+    mode = cv2.RETR_EXTERNAL if external_only else cv2.RETR_LIST
+    contours, _ = cv2.findContours(binary, mode, cv2.CHAIN_APPROX_SIMPLE)
+    stats = contour_stats(contours)
+    return stats.select(stats.area >= min_area) if min_area > 0 else stats
+
+
+def draw_contours(image: np.ndarray, stats: ContourStats, color: Tuple[int, int, int] = (0, 255, 0),
+                  thickness: int = 1) -> np.ndarray:
+    """輪郭を描画した画像のコピーを返す"""
+    output = image.copy() if image.ndim == 3 else cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+    cv2.drawContours(output, list(stats.contours), -1, color, thickness)
+    return output
+
+
+# プロセス共通の既定エンジン
+DEFAULT_ENGINE = MorphologyEngine()
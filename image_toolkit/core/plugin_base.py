@@ -1,7 +1,111 @@
-# PluginManagerダミー実装
+from abc import ABC, abstractmethod
+from typing import Dict, Any, Optional, Callable, List, Tuple, Union
+import importlib
+import json
+import os
+import time
+import numpy as np
+from PIL import Image
+import customtkinter as ctk
+
+try:
+    from importlib.metadata import entry_points
+    ENTRY_POINTS_AVAILABLE = True
+except ImportError:
+    ENTRY_POINTS_AVAILABLE = False
+
+# 組み込みプラグインのマニフェストと、外部パッケージがプラグインを登録するエントリポイントのグループ
+BUILTIN_MANIFEST = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "plugins", "plugins.json")
+ENTRY_POINT_GROUP = "image_toolkit.plugins"
+
+
+class PluginSpec:
+    """
+    読み込み前のプラグイン情報（名前・表示名・説明・配置するタブと "モジュール:クラス" の参照のみ）
+    モジュールは PluginManager.get_plugin() で初めて必要になった時点でインポートする
+    """
+    def __init__(self, name: str, target: str, display_name: str = "", description: str = "",
+                 tab: str = "", source: str = "manifest"):
+        self.name = name
+        self.target = target
+        self.display_name = display_name or name
+        self.description = description
+        self.tab = tab
+        self.source = source
+
+    @property
+    def module_name(self) -> str:
+        return self.target.split(":", 1)[0]
+
+    def __repr__(self) -> str:
+        return f"PluginSpec({self.name!r}, {self.target!r})"
+
+
 class PluginManager:
-    def __init__(self):
+    """
+    プラグインの検出と遅延読み込み
+
+    discover() はマニフェスト（JSON）と importlib.metadata のエントリポイントから名前とメタデータだけを読み、
+    プラグインのモジュールはタブを開いた時や処理を要求された時（get_plugin()）に初めてインポートする。
+    起動時間はプラグイン数によらずほぼ一定になる。register_plugin() による手動登録も引き続き使える。
+    """
+    def __init__(self, manifest_paths: Optional[List[str]] = None,
+                 entry_point_group: Optional[str] = ENTRY_POINT_GROUP):
+        self.manifest_paths = [BUILTIN_MANIFEST] if manifest_paths is None else list(manifest_paths)
+        self.entry_point_group = entry_point_group
+        self.specs: Dict[str, PluginSpec] = {}
         self.plugins = {}
+        self.load_errors: Dict[str, str] = {}
+
+    # ---------- 検出（インポートなし） ----------
+
+    def discover(self) -> List[PluginSpec]:
+        """マニフェストとエントリポイントからプラグイン情報を集める（同名は先に見つかった方を優先）"""
+        for path in self.manifest_paths:
+            for spec in self._read_manifest(path):
+                self.specs.setdefault(spec.name, spec)
+        if self.entry_point_group:
+            for spec in self._read_entry_points(self.entry_point_group):
+                self.specs.setdefault(spec.name, spec)
+        return self.get_specs()
+
+    @staticmethod
+    def _read_manifest(path: str) -> List[PluginSpec]:
+        """
+        マニフェストを読む（{"plugins": [{"name", "entry", "display_name", "description", "tab"}, ...]}）
+        """
+        if not os.path.exists(path):
+            return []
+        try:
+            with open(path, encoding="utf-8") as f:
+                entries = json.load(f).get("plugins", [])
+        except (OSError, ValueError) as e:
+            print(f"⚠️ プラグインマニフェスト読み込みエラー: {path}: {e}")
+            return []
+        return [PluginSpec(entry["name"], entry["entry"], entry.get("display_name", ""),
+                           entry.get("description", ""), entry.get("tab", ""), "manifest")
+                for entry in entries]
+
+    @staticmethod
+    def _read_entry_points(group: str) -> List[PluginSpec]:
+        """インストール済みパッケージのエントリポイント（名前と "モジュール:クラス" のみでインポートしない）"""
+        if not ENTRY_POINTS_AVAILABLE:
+            return []
+        found = entry_points()
+        if hasattr(found, "select"):
+            found = found.select(group=group)
+        else:
+            found = found.get(group, [])
+        return [PluginSpec(point.name, point.value, source="entry_point") for point in found]
+
+    def get_specs(self) -> List[PluginSpec]:
+        return list(self.specs.values())
+
+    def get_spec(self, name: str) -> Optional[PluginSpec]:
+        return self.specs.get(name)
+
+    # ---------- 読み込み ----------
 
     def register_plugin(self, plugin):
         # プラグインID（name属性）で登録（全プラグインで統一）
@@ -9,21 +113,77 @@ class PluginManager:
         self.plugins[plugin_id] = plugin
 
     def get_plugin(self, name):
-        return self.plugins.get(name)
+        """プラグインを取得（未読み込みならここでモジュールをインポートして生成、失敗時は None）"""
+        plugin = self.plugins.get(name)
+        if plugin is None and name in self.specs and name not in self.load_errors:
+            plugin = self._load(self.specs[name])
+        return plugin
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self.plugins
+
+    def _load(self, spec: PluginSpec):
+        start = time.perf_counter()
+        module_name, _, class_name = spec.target.partition(":")
+        try:
+            plugin_class = getattr(importlib.import_module(module_name), class_name)
+            plugin = plugin_class()
+        except Exception as e:
+            self.load_errors[spec.name] = str(e)
+            print(f"❌ プラグイン読み込みエラー: {spec.name}: {e}")
+            return None
+        # マニフェストの名前で登録する（name 属性を持たないプラグインにも付与）
+        if not hasattr(plugin, 'name'):
+            plugin.name = spec.name
+        self.plugins[spec.name] = plugin
+        print(f"🔌 プラグイン読み込み: {spec.display_name} ({(time.perf_counter() - start) * 1000:.0f} ms)")
+        return plugin
+
+    def load_all_plugins(self, app=None) -> List[PluginSpec]:
+        """起動時の読み込み（プラグイン情報の検出のみ。モジュールは get_plugin() で読み込む）"""
+        return self.discover()
+
+    def get_loaded_plugins(self):
+        """読み込み済みのプラグイン（未使用のプラグインはインポートしない）"""
+        return list(self.plugins.values())
 
     def get_all_plugins(self):
+        """検出済みの全プラグイン（未読み込みのものはここで読み込む）"""
+        for name in self.specs:
+            self.get_plugin(name)
         return list(self.plugins.values())
 
     def get_enabled_plugins(self):
         # 必要に応じて有効なプラグインのみ返す（ここでは全て返す）
-        return list(self.plugins.values())
+        return self.get_all_plugins()
+
+
+def write_to_out(result: np.ndarray, out: Optional[np.ndarray]) -> np.ndarray:
+    """処理結果を呼び出し側の出力バッファへ書き込む（out=Noneなら結果をそのまま返す）"""
+    if out is None or out is result:
+        return result
+    if out.shape != result.shape:
+        raise ValueError(f"出力バッファの形状が一致しません: out={out.shape}, result={result.shape}")
+    np.copyto(out, result, casting='unsafe')
+    return out
 
-from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, Callable, List, Tuple, Union
-from PIL import Image
-import customtkinter as ctk
 
 class ImageProcessorPlugin(ABC):
+    # process_float() を実装し、float作業バッファ上で処理できるか
+    supports_float = False
+
+    # ---------- 実行方法の選択に使う能力情報（PluginScheduler が参照） ----------
+    # 処理の大部分がGILを保持したPythonコードか（NumPy/OpenCV中心ならFalse、スレッドで並列化できる）
+    gil_bound = False
+    # 上下に tile_halo 行の余白を付けた帯ごとに処理しても一括処理と同じ結果になるか
+    tileable = False
+    tile_halo = 0
+    # 出力が入力配列と process_array() の params だけで決まるか
+    # （True ならワーカープロセスで引数なしのコンストラクタから作り直したインスタンスで処理できる）
+    pure = False
+    # 1メガピクセルあたりのおおよその処理時間（秒）
+    cost_per_megapixel = 0.05
+
     def __init__(self, name: str, version: str = "1.0.0"):
         self.name = name
         self.version = version
@@ -43,6 +203,34 @@ class ImageProcessorPlugin(ABC):
     @abstractmethod
     def process_image(self, image: Image.Image, **params) -> Image.Image:
         pass
+    def process_array(self, array: np.ndarray, out: Optional[np.ndarray] = None, **params) -> np.ndarray:
+        """
+        配列版の処理エントリポイント（H×W×C uint8 RGB）
+        out を渡すと結果をそこへ書き込んで返す。既定の実装は process_image() を経由するため、
+        PIL変換を避けたいプラグインはこのメソッドをオーバーライドする
+        """
+        result = np.asarray(self.process_image(Image.fromarray(array), **params))
+        if out is None:
+            return np.array(result)
+        return write_to_out(result, out)
+    def process_float(self, array: np.ndarray, out: Optional[np.ndarray] = None, **params) -> np.ndarray:
+        """
+        float作業バッファ（0〜255スケールのfloat32/float16）上の処理エントリポイント
+        値は0〜255にクリップするが量子化はしない。supports_float = True のプラグインがオーバーライドする
+        既定の実装は uint8 へ量子化して process_array() を通し、作業バッファの型へ戻す（精度は uint8 相当）
+        """
+        quantized = np.rint(np.clip(array, 0, 255)).astype(np.uint8)
+        result = self.process_array(quantized, **params)
+        return write_to_out(result.astype(array.dtype), out)
+    def get_capabilities(self) -> Dict[str, Any]:
+        """実行方法の選択に使う能力情報"""
+        return {
+            "gil_bound": self.gil_bound,
+            "tileable": self.tileable,
+            "tile_halo": self.tile_halo,
+            "pure": self.pure,
+            "cost_per_megapixel": self.cost_per_megapixel,
+        }
     def apply_special_filter(self, image: Image.Image, filter_type: str) -> Image.Image:
         return image
     def get_parameters(self) -> Dict[str, Any]:
@@ -71,6 +259,74 @@ class ImageProcessorPlugin(ABC):
     def is_enabled(self) -> bool:
         return self.enabled
 
+class PluginChain:
+    """
+    複数プラグインを配列のまま連続適用するチェーン
+    2つの作業バッファを交互に入出力として使い回し、呼び出しごとの出力確保を避ける
+
+    float_dtype（np.float32 / np.float16）を指定すると、supports_float のプラグインが連続する区間は
+    1つのfloat作業バッファ上で処理し、区間の最後で1回だけuint8へ量子化する。
+    段ごとの uint8⇔float 変換と、量子化の繰り返しによるバンディングを避けられる。
+    """
+    def __init__(self, plugins: List[ImageProcessorPlugin], float_dtype: Optional[np.dtype] = None):
+        self.plugins = plugins
+        self.float_dtype = float_dtype
+        self._buffers: List[np.ndarray] = []
+        self._float_buffers: List[np.ndarray] = []
+
+    def run(self, array: np.ndarray, **params) -> np.ndarray:
+        """
+        有効なプラグインを順に適用して結果を返す
+        戻り値はチェーン内部のバッファなので、次の run() 呼び出し前に必要ならコピーすること
+        """
+        plugins = [plugin for plugin in self.plugins if plugin.is_enabled()]
+        if not plugins:
+            return array
+        self._ensure_buffers(array.shape, array.dtype)
+        source = array
+        index = 0
+        while index < len(plugins):
+            if self.float_dtype is not None and plugins[index].supports_float:
+                end = index
+                while end < len(plugins) and plugins[end].supports_float:
+                    end += 1
+                source = self._run_float_group(plugins[index:end], source, params)
+                index = end
+            else:
+                target = self._other_buffer(source, self._buffers)
+                plugins[index].process_array(source, out=target, **params)
+                source = target
+                index += 1
+        return source
+
+    def _run_float_group(self, plugins: List[ImageProcessorPlugin], source: np.ndarray,
+                         params: Dict[str, Any]) -> np.ndarray:
+        """連続するfloat対応プラグインを1つのfloat作業バッファ上で処理し、最後に1回だけ量子化"""
+        self._ensure_float_buffers(source.shape)
+        float_source = self._float_buffers[0]
+        np.copyto(float_source, source, casting='unsafe')
+        for plugin in plugins:
+            float_target = self._other_buffer(float_source, self._float_buffers)
+            plugin.process_float(float_source, out=float_target, **params)
+            float_source = float_target
+        target = self._other_buffer(source, self._buffers)
+        np.clip(float_source, 0, 255, out=float_source)
+        np.copyto(target, float_source, casting='unsafe')
+        return target
+
+    @staticmethod
+    def _other_buffer(current: np.ndarray, buffers: List[np.ndarray]) -> np.ndarray:
+        return buffers[1] if current is buffers[0] else buffers[0]
+
+    def _ensure_buffers(self, shape: Tuple[int, ...], dtype: np.dtype) -> None:
+        if not self._buffers or self._buffers[0].shape != shape or self._buffers[0].dtype != dtype:
+            self._buffers = [np.empty(shape, dtype), np.empty(shape, dtype)]
+
+    def _ensure_float_buffers(self, shape: Tuple[int, ...]) -> None:
+        if not self._float_buffers or self._float_buffers[0].shape != shape \
+                or self._float_buffers[0].dtype != np.dtype(self.float_dtype):
+            self._float_buffers = [np.empty(shape, self.float_dtype), np.empty(shape, self.float_dtype)]
+
 class PluginUIHelper:
     @staticmethod
     def create_slider_with_label(
@@ -0,0 +1,226 @@
+"""
+プラグイン処理の実行方法の選択
+ImageProcessorPlugin の能力情報（gil_bound, tileable, tile_halo, pure, cost_per_megapixel）から、
+段ごとに インライン / スレッドプール / プロセスプール のどれで実行するかを決める。
+
+- inline: 見積もり時間が短い段。スレッドやプロセスへ渡すコストの方が大きいため呼び出し側でそのまま実行
+- thread: GILを解放する段（NumPy/OpenCV中心）。帯に分割できればスレッドプールで並列に処理
+- process: GILを保持するPythonコード中心で、出力が params だけで決まる段。
+  SharedMemoryExecutor で共有メモリ上のフレームをワーカープロセスに処理させる
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing.context import BaseContext
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+EXECUTION_MODES = ("inline", "thread", "process")
+
+# 能力情報を宣言していないプラグイン（ImageProcessorPlugin を継承しないもの）の既定値
+_DEFAULT_CAPABILITIES = {
+    "gil_bound": False,
+    "tileable": False,
+    "tile_halo": 0,
+    "pure": False,
+    "cost_per_megapixel": 0.05,
+}
+
+
+def plugin_capabilities(plugin: Any) -> Dict[str, Any]:
+    """プラグインの能力情報（未宣言の項目は既定値）"""
+    if hasattr(plugin, "get_capabilities"):
+        return {**_DEFAULT_CAPABILITIES, **plugin.get_capabilities()}
+    return {key: getattr(plugin, key, value) for key, value in _DEFAULT_CAPABILITIES.items()}
+
+
+# ========== ワーカープロセス側 ==========
+
+# ワーカープロセス内で作り直したプラグイン（クラスごとに1つ）
+_worker_plugins: Dict[type, Any] = {}
+
+
+def _plugin_band_task(band: np.ndarray, plugin_class: type = None,
+                      plugin_params: Optional[Dict[str, Any]] = None) -> np.ndarray:
+    """SharedMemoryExecutor のタスク: 引数なしで作ったプラグインで帯を処理"""
+    plugin = _worker_plugins.get(plugin_class)
+    if plugin is None:
+        plugin = _worker_plugins[plugin_class] = plugin_class()
+    return plugin.process_array(band, **(plugin_params or {}))
+
+
+# ========== スケジューラ ==========
+
+class PluginScheduler:
+    """
+    プラグイン列を段ごとに適した実行方法で処理するスケジューラ
+
+    params はプラグイン名 → process_array() の引数の辞書（プリセットの plugin_settings と同じ形）。
+    プロセスで実行する段に params がない場合は、呼び出し側のスレッドで get_parameters() を読んで渡す
+    （ワーカー側のインスタンスにはUIの状態がないため）。
+    Tkのイベントループから使う場合は submit() で Future を受け取り、after() で完了を確認する。
+    ワーカープロセスは既定で spawn で起動する（GUIのスレッドやスレッドプールが動いている状態で fork すると、
+    保持中のロックごと複製されてワーカーが停止することがあるため）。
+    """
+    def __init__(self, max_threads: Optional[int] = None, max_processes: Optional[int] = None,
+                 inline_max_seconds: float = 0.02, process_min_seconds: float = 0.2,
+                 min_band_rows: int = 64, mp_context: Optional[BaseContext] = None):
+        self.max_threads = max_threads or os.cpu_count() or 1
+        self.max_processes = (os.cpu_count() or 1) if max_processes is None else max_processes
+        self.inline_max_seconds = inline_max_seconds
+        # プロセスへの受け渡し（共有メモリへのコピー・ワーカーでのプラグイン生成）に見合う最小の見積もり時間
+        self.process_min_seconds = process_min_seconds
+        self.min_band_rows = min_band_rows
+        self.mp_context = mp_context or multiprocessing.get_context("spawn")
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_executor = None
+        self._coordinator: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    # ---------- 実行方法の選択 ----------
+
+    def choose_mode(self, plugin: Any, shape: Tuple[int, ...]) -> str:
+        """画像サイズと能力情報から段の実行方法を決める"""
+        capabilities = plugin_capabilities(plugin)
+        estimated = capabilities["cost_per_megapixel"] * shape[0] * shape[1] / 1e6
+        if estimated <= self.inline_max_seconds:
+            return "inline"
+        if capabilities["gil_bound"]:
+            # GILを保持する処理はスレッドでは並列にならない。作り直せる場合だけプロセスへ渡す
+            if capabilities["pure"] and self.max_processes > 0 and estimated >= self.process_min_seconds:
+                return "process"
+            return "inline"
+        if capabilities["tileable"] and self.max_threads > 1 and shape[0] >= 2 * self.min_band_rows:
+            return "thread"
+        return "inline"
+
+    def plan(self, plugins: Sequence[Any], shape: Tuple[int, ...]) -> List[Tuple[Any, str]]:
+        """プラグインと実行方法の組の列"""
+        return [(plugin, self.choose_mode(plugin, shape)) for plugin in plugins]
+
+    # ---------- 実行 ----------
+
+    def run(self, plugins: Sequence[Any], array: np.ndarray,
+            params: Optional[Dict[str, Dict[str, Any]]] = None) -> np.ndarray:
+        """プラグインを順に適用した結果を返す（呼び出し側のスレッドで完了まで待つ）"""
+        return self._run_stages(self._prepare(plugins, array.shape, params), array)
+
+    def submit(self, plugins: Sequence[Any], array: np.ndarray,
+               params: Optional[Dict[str, Dict[str, Any]]] = None) -> Future:
+        """
+        プラグイン列の処理を調整用スレッドで開始して Future を返す
+        段の計画と params の解決（UIの読み取り）は呼び出し側のスレッドで行う
+        """
+        stages = self._prepare(plugins, array.shape, params)
+        with self._lock:
+            if self._coordinator is None:
+                self._coordinator = ThreadPoolExecutor(max_workers=1)
+            coordinator = self._coordinator
+        return coordinator.submit(self._run_stages, stages, array)
+
+    def _prepare(self, plugins: Sequence[Any], shape: Tuple[int, ...],
+                 params: Optional[Dict[str, Dict[str, Any]]]) -> List[Tuple[Any, str, Dict[str, Any]]]:
+        params = params or {}
+        stages = []
+        for plugin, mode in self.plan(plugins, shape):
+            name = getattr(plugin, "name", type(plugin).__name__)
+            if name in params:
+                stage_params = dict(params[name])
+            elif mode == "process":
+                stage_params = plugin.get_parameters()
+            else:
+                stage_params = {}
+            stages.append((plugin, mode, stage_params))
+        return stages
+
+    def _run_stages(self, stages: List[Tuple[Any, str, Dict[str, Any]]], array: np.ndarray) -> np.ndarray:
+        for plugin, mode, stage_params in stages:
+            start = time.perf_counter()
+            if mode == "process":
+                array = self._run_process(plugin, array, stage_params)
+            elif mode == "thread":
+                array = self._run_threaded(plugin, array, stage_params)
+            else:
+                array = plugin.process_array(array, **stage_params)
+            elapsed = time.perf_counter() - start
+            if elapsed > self.inline_max_seconds:
+                print(f"⏱️ {getattr(plugin, 'name', type(plugin).__name__)} ({mode}): {elapsed * 1000:.0f} ms")
+        return array
+
+    def _run_threaded(self, plugin: Any, array: np.ndarray, params: Dict[str, Any]) -> np.ndarray:
+        """上下に tile_halo 行の余白を付けた帯をスレッドプールで並列に処理"""
+        halo = plugin_capabilities(plugin)["tile_halo"]
+        height = array.shape[0]
+        band_count = max(1, min(self.max_threads, height // self.min_band_rows))
+        band_height = -(-height // band_count)
+        ranges = [(y0, min(height, y0 + band_height)) for y0 in range(0, height, band_height)]
+
+        def process_band(rows: Tuple[int, int]) -> Tuple[int, int, int, np.ndarray]:
+            y0, y1 = rows
+            top, bottom = max(0, y0 - halo), min(height, y1 + halo)
+            return y0, y1, top, plugin.process_array(np.ascontiguousarray(array[top:bottom]), **params)
+
+        output = None
+        for y0, y1, top, result in self._get_thread_pool().map(process_band, ranges):
+            if output is None:
+                output = np.empty((height,) + result.shape[1:], dtype=result.dtype)
+            output[y0:y1] = result[y0 - top:y1 - top]
+        return output
+
+    def _run_process(self, plugin: Any, array: np.ndarray, params: Dict[str, Any]) -> np.ndarray:
+        """ワーカープロセスで作り直したプラグインで処理（帯に分割できない段は1つの帯として渡す）"""
+        capabilities = plugin_capabilities(plugin)
+        return self._get_process_executor().run(
+            _plugin_band_task, array, {"plugin_class": type(plugin), "plugin_params": params},
+            halo=capabilities["tile_halo"], bands=None if capabilities["tileable"] else 1)
+
+    # ---------- プール ----------
+
+    def _get_thread_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(max_workers=self.max_threads)
+            return self._thread_pool
+
+    def _get_process_executor(self):
+        # 使うまでワーカープロセスを起動しない
+        from image_toolkit.core.shared_memory_engine import SharedMemoryExecutor
+        with self._lock:
+            if self._process_executor is None:
+                self._process_executor = SharedMemoryExecutor(max_workers=self.max_processes,
+                                                              mp_context=self.mp_context)
+            return self._process_executor
+
+    def close(self) -> None:
+        with self._lock:
+            pools = [self._coordinator, self._thread_pool]
+            executor = self._process_executor
+            self._coordinator = self._thread_pool = self._process_executor = None
+        for pool in pools:
+            if pool is not None:
+                pool.shutdown(wait=True)
+        if executor is not None:
+            executor.close()
+
+    def __enter__(self) -> "PluginScheduler":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+_scheduler: Optional[PluginScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_plugin_scheduler() -> PluginScheduler:
+    """プロセス共通のスケジューラ（プールは最初に必要になった時点で作る）"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = PluginScheduler()
+        return _scheduler
@@ -0,0 +1,374 @@
+"""
+処理プリセット
+処理タイプ・パラメータ・プラグイン設定に名前を付けてJSONに保存し、
+読み込み時に一度だけコンパイルして（LUT・マスク・カーネルを事前生成）大量の画像へ再利用する
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import cv2
+import numpy as np
+from PIL import Image, ImageEnhance, ImageFilter, ImageStat
+
+from image_toolkit.core.blur_engine import DEFAULT_ENGINE as BLUR_ENGINE
+from image_toolkit.core.edge_preserving import DEFAULT_ENGINE as EDGE_PRESERVING_ENGINE
+from image_toolkit.core.image_utils import ImageUtils
+from image_toolkit.core.morphology import DEFAULT_ENGINE as MORPHOLOGY_ENGINE
+from image_toolkit.core.plugin_scheduler import get_plugin_scheduler
+
+PROCESS_TYPES = [
+    "基本調整",
+    "芸術的効果",
+    "プロ補正",
+    "フィルター効果",
+    "エッジ・輪郭",
+    "ノイズ処理",
+    "色彩変換",
+    "ヴィンテージ",
+]
+
+DEFAULT_PRESET_PATH = Path.home() / ".image_toolkit" / "presets.json"
+
+# 0〜255の階調ランプ（PILの点演算からLUTを生成するために使用）
+_RAMP = Image.fromarray(np.repeat(np.arange(256, dtype=np.uint8)[np.newaxis, :, np.newaxis], 3, axis=2))
+
+
+def _lut_from_pil(image: Image.Image) -> np.ndarray:
+    """ランプ画像に適用したPIL点演算の結果をLUTとして取り出す"""
+    return np.ascontiguousarray(np.asarray(image)[0, :, 0])
+
+
+class ProcessingPreset:
+    """名前付き処理プリセット（処理タイプ + パラメータ + プラグイン設定）"""
+    def __init__(self, name: str, process_type: str = "基本調整",
+                 params: Optional[Dict[str, float]] = None,
+                 plugin_settings: Optional[Dict[str, Dict[str, Any]]] = None):
+        if process_type not in PROCESS_TYPES:
+            raise ValueError(f"未知の処理タイプです: {process_type}")
+        self.name = name
+        self.process_type = process_type
+        self.params = {"brightness": 1.0, "contrast": 1.0, "saturation": 1.0}
+        self.params.update(params or {})
+        self.plugin_settings = plugin_settings or {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "process_type": self.process_type,
+            "params": dict(self.params),
+            "plugin_settings": {name: dict(settings) for name, settings in self.plugin_settings.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ProcessingPreset":
+        return cls(data["name"], data.get("process_type", "基本調整"),
+                   data.get("params"), data.get("plugin_settings"))
+
+    def compile(self, plugins: Optional[List[Any]] = None, plugin_manager: Any = None) -> "CompiledPreset":
+        """
+        再利用可能な変換オブジェクトにコンパイル
+        plugins を省略すると plugin_settings に記録されたプラグインを PluginManager の検出結果から読み込む
+        （GUIと一括適用が同じ方法でプラグインを解決するため）
+        """
+        if plugins is None and self.plugin_settings:
+            plugins = resolve_plugins(self.plugin_settings, plugin_manager)
+        return CompiledPreset(self, plugins)
+
+
+def resolve_plugins(names: Iterable[str], plugin_manager: Any = None) -> List[Any]:
+    """
+    プラグイン名の順にプラグインを読み込んで返す（見つからない・読み込めないものは含めない）
+    plugin_manager を省略すると、組み込みマニフェストとエントリポイントから検出する
+    """
+    if plugin_manager is None:
+        # プラグイン基盤（UI部品を含む）はプラグインを使うプリセットでのみ読み込む
+        from image_toolkit.core.plugin_base import PluginManager
+        plugin_manager = PluginManager()
+        plugin_manager.discover()
+    plugins = []
+    for name in names:
+        plugin = plugin_manager.get_plugin(name)
+        if plugin is not None:
+            plugins.append(plugin)
+    return plugins
+
+
+class PresetStore:
+    """プリセットのJSONファイル保存・読み込み"""
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path) if path else DEFAULT_PRESET_PATH
+        self.presets: Dict[str, ProcessingPreset] = {}
+        if self.path.exists():
+            try:
+                self.load()
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ プリセット読み込み警告: {e}")
+
+    def load(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.presets = {item["name"]: ProcessingPreset.from_dict(item) for item in data.get("presets", [])}
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"presets": [preset.to_dict() for preset in self.presets.values()]}
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+    def add(self, preset: ProcessingPreset, save: bool = True) -> None:
+        self.presets[preset.name] = preset
+        if save:
+            self.save()
+
+    def remove(self, name: str, save: bool = True) -> None:
+        self.presets.pop(name, None)
+        if save:
+            self.save()
+
+    def get(self, name: str) -> Optional[ProcessingPreset]:
+        return self.presets.get(name)
+
+    def list_names(self) -> List[str]:
+        return list(self.presets.keys())
+
+
+class CompiledPreset:
+    """
+    コンパイル済みプリセット
+    パラメータのみに依存するテーブル類はコンパイル時に生成し、
+    画像サイズに依存するマスクはサイズごとにキャッシュする。
+    ImageProcessorApp の処理も このクラスを使うため、GUIのプレビューと一括適用の結果は常に一致する。
+    """
+    def __init__(self, preset: ProcessingPreset, plugins: Optional[List[Any]] = None):
+        self.preset = preset
+        self.plugins = [plugin for plugin in (plugins or []) if getattr(plugin, 'name', None) in preset.plugin_settings]
+        # 設定が保存されているのに渡されなかったプラグイン（黙って結果が変わらないよう警告する）
+        supplied = {plugin.name for plugin in self.plugins}
+        self.missing_plugins = [name for name in preset.plugin_settings if name not in supplied]
+        if self.missing_plugins:
+            print(f"⚠️ プリセット「{preset.name}」のプラグインが見つからないため適用しません: "
+                  f"{', '.join(self.missing_plugins)}")
+        self._mask_cache: Dict[tuple, np.ndarray] = {}
+        self._contrast_luts: Dict[int, np.ndarray] = {}
+        # ノイズ除去の段（GUIは縮小プレビュー・バックグラウンド計算に置き換えるため、skip_denoise で外せるようにする）
+        self.denoise_stage: Optional[Callable[[np.ndarray], np.ndarray]] = None
+        brightness = preset.params["brightness"]
+        contrast = preset.params["contrast"]
+        saturation = preset.params["saturation"]
+        builder = {
+            "基本調整": self._compile_basic,
+            "芸術的効果": self._compile_artistic,
+            "プロ補正": self._compile_professional,
+            "フィルター効果": self._compile_filter,
+            "エッジ・輪郭": self._compile_edge,
+            "ノイズ処理": self._compile_noise,
+            "色彩変換": self._compile_color,
+            "ヴィンテージ": self._compile_vintage,
+        }[preset.process_type]
+        self._stages: List[Callable[[np.ndarray], np.ndarray]] = builder(brightness, contrast, saturation)
+
+    def apply(self, image: Image.Image) -> Image.Image:
+        return Image.fromarray(self.apply_array(np.asarray(ImageUtils.ensure_rgb(image))))
+
+    def apply_array(self, rgb: np.ndarray, skip_denoise: bool = False) -> np.ndarray:
+        """RGB uint8配列に変換を適用（skip_denoise=True ではノイズ除去済みの配列に残りの段だけを適用）"""
+        for stage in self._stages:
+            if skip_denoise and stage is self.denoise_stage:
+                continue
+            rgb = stage(rgb)
+        if self.plugins:
+            # 段ごとに能力情報に応じた実行方法（インライン・スレッド・プロセス）で処理
+            rgb = get_plugin_scheduler().run(self.plugins, rgb, self.preset.plugin_settings)
+        return rgb
+
+    # ---------- 処理タイプ別コンパイル ----------
+
+    def _compile_basic(self, brightness, contrast, saturation):
+        brightness_lut = _lut_from_pil(ImageEnhance.Brightness(_RAMP).enhance(brightness))
+
+        def basic(rgb):
+            rgb = cv2.LUT(rgb, brightness_lut)
+            # コントラストの基準値は画像の平均輝度に依存するため、平均値ごとにLUTをキャッシュ
+            mean = int(ImageStat.Stat(Image.fromarray(rgb).convert("L")).mean[0] + 0.5)
+            lut = self._contrast_luts.get(mean)
+            if lut is None:
+                degenerate = Image.new("RGB", _RAMP.size, (mean, mean, mean))
+                lut = self._contrast_luts[mean] = _lut_from_pil(Image.blend(degenerate, _RAMP, contrast))
+            rgb = cv2.LUT(rgb, lut)
+            return np.asarray(ImageEnhance.Color(Image.fromarray(rgb)).enhance(saturation))
+        return [basic]
+
+    def _compile_artistic(self, brightness, contrast, saturation):
+        stages = []
+        if brightness > 1.0:
+            sepia_matrix = (
+                0.393 + 0.607 * (2 - brightness), 0.769 - 0.769 * (brightness - 1), 0.189 - 0.189 * (brightness - 1), 0,
+                0.349 - 0.349 * (brightness - 1), 0.686 + 0.314 * (2 - brightness), 0.168 - 0.168 * (brightness - 1), 0,
+                0.272 - 0.272 * (brightness - 1), 0.534 - 0.534 * (brightness - 1), 0.131 + 0.869 * (2 - brightness), 0
+            )
+            stages.append(lambda rgb: np.asarray(Image.fromarray(rgb).convert('RGB', sepia_matrix)))
+        if contrast > 1.0:
+            kernel_size = int(contrast * 5)
+            if kernel_size % 2 == 0:
+                kernel_size += 1
+            # エッジ保存平滑化はチャンネル順に依存しないためRGBのまま適用
+            stages.append(lambda rgb: EDGE_PRESERVING_ENGINE.smooth(rgb, kernel_size, 80))
+        if saturation != 1.0:
+            color_levels = max(2, int(8 * saturation))
+            factor = 255.0 / (color_levels - 1)
+            posterize_lut = (np.floor(np.arange(256) / factor) * factor).astype(np.uint8)
+            stages.append(lambda rgb: cv2.LUT(rgb, posterize_lut))
+        return stages
+
+    def _compile_professional(self, brightness, contrast, saturation):
+        stages = []
+        if brightness > 1.2:
+            def equalize(rgb):
+                return cv2.merge([cv2.equalizeHist(channel) for channel in cv2.split(rgb)])
+            stages.append(equalize)
+        if contrast != 1.0:
+            gamma = 1.0 / contrast
+            gamma_lut = (np.power(np.arange(256, dtype=np.float32) / 255.0, gamma) * 255).astype(np.uint8)
+            stages.append(lambda rgb: cv2.LUT(rgb, gamma_lut))
+        if saturation > 1.0:
+            def unsharp(rgb):
+                blurred = cv2.GaussianBlur(rgb, (0, 0), 2.0)
+                return cv2.addWeighted(rgb, 1.0 + saturation, blurred, -saturation, 0)
+            stages.append(unsharp)
+        return stages
+
+    def _compile_filter(self, brightness, contrast, saturation):
+        filters: List[Callable[[Image.Image], Image.Image]] = []
+        if brightness < 1.0:
+            blur_radius = (1.0 - brightness) * 5
+            filters.append(lambda image: Image.fromarray(BLUR_ENGINE.blur(np.asarray(image), blur_radius)))
+        elif brightness > 1.0:
+            filters.append(lambda image: ImageEnhance.Sharpness(image).enhance(brightness))
+        if contrast > 1.5:
+            filters.append(lambda image: image.filter(ImageFilter.EMBOSS))
+        if saturation > 1.5:
+            filters.append(lambda image: image.filter(ImageFilter.EDGE_ENHANCE_MORE))
+        if not filters:
+            return []
+
+        def apply_filters(rgb):
+            image = Image.fromarray(rgb)
+            for image_filter in filters:
+                image = image_filter(image)
+            return np.asarray(image)
+        return [apply_filters]
+
+    def _compile_edge(self, brightness, contrast, saturation):
+        low_threshold = int(50 * brightness)
+        high_threshold = int(150 * contrast)
+        alpha = min(saturation, 1.0)
+
+        def edges(rgb):
+            gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+            edges_colored = cv2.cvtColor(cv2.Canny(gray, low_threshold, high_threshold), cv2.COLOR_GRAY2RGB)
+            if saturation > 0.5:
+                return cv2.addWeighted(rgb, 1 - alpha, edges_colored, alpha, 0)
+            return edges_colored
+        return [edges]
+
+    def _compile_noise(self, brightness, contrast, saturation):
+        stages = []
+        if brightness > 1.0:
+            def denoise(rgb):
+                bgr = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+                return cv2.cvtColor(cv2.fastNlMeansDenoisingColored(bgr, None, 10, 10, 7, 21), cv2.COLOR_BGR2RGB)
+            stages.append(denoise)
+            self.denoise_stage = denoise
+        if contrast > 1.0:
+            stages.append(lambda rgb: MORPHOLOGY_ENGINE.apply(rgb, "close", "rect", 3))
+        return stages
+
+    def _compile_color(self, brightness, contrast, saturation):
+        hsv_lut = ImageUtils.build_hsv_lut(int(brightness * 30), saturation, contrast)
+
+        def color(rgb):
+            hsv = cv2.cvtColor(rgb, cv2.COLOR_RGB2HSV)
+            cv2.LUT(hsv, hsv_lut, dst=hsv)
+            return cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB)
+        return [color]
+
+    def _compile_vintage(self, brightness, contrast, saturation):
+        levels = np.arange(256, dtype=np.float64)
+        # RGB順のチャンネル別LUT（R増加・G・B減少）
+        channel_lut = np.dstack([
+            np.clip(levels * (1.0 + saturation * 0.2), 0, 255).astype(np.uint8).reshape(256, 1),
+            np.clip(levels * (0.9 + contrast * 0.1), 0, 255).astype(np.uint8).reshape(256, 1),
+            np.clip(levels * (0.8 + brightness * 0.2), 0, 255).astype(np.uint8).reshape(256, 1),
+        ])
+        vignette_strength = 0.3 + (saturation - 1.0) * 0.2
+
+        def vintage(rgb):
+            rgb = cv2.LUT(rgb, channel_lut)
+            mask = self._vignette_mask(rgb.shape[:2], vignette_strength)
+            return (rgb * mask).astype(np.uint8)
+        return [vintage]
+
+    def _vignette_mask(self, size: tuple, strength: float) -> np.ndarray:
+        """ビネットマスク（画像サイズごとにキャッシュ）"""
+        mask = self._mask_cache.get(size)
+        if mask is None:
+            h, w = size
+            center_x, center_y = w // 2, h // 2
+            Y, X = np.ogrid[:h, :w]
+            dist_from_center = np.sqrt((X - center_x)**2 + (Y - center_y)**2)
+            max_dist = np.sqrt(center_x**2 + center_y**2)
+            mask = np.clip(1 - (dist_from_center / max_dist) * strength, 0.3, 1.0)[:, :, np.newaxis]
+            self._mask_cache[size] = mask
+        return mask
+
+
+def apply_preset_to_directory(compiled: CompiledPreset, input_dir: str, output_dir: str,
+                              extensions=('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif')) -> int:
+    """ディレクトリ内の全画像にコンパイル済みプリセットを適用し、処理枚数を返す"""
+    from image_toolkit.core.export_queue import ExportQueue
+    os.makedirs(output_dir, exist_ok=True)
+    export_queue = ExportQueue()
+    count = 0
+    try:
+        for file_path in sorted(Path(input_dir).iterdir()):
+            if file_path.suffix.lower() not in extensions:
+                continue
+            with Image.open(file_path) as image:
+                result = compiled.apply(image)
+            export_queue.submit(result, str(Path(output_dir) / file_path.name))
+            count += 1
+    finally:
+        export_queue.shutdown(wait=True)
+    for result in export_queue.poll_results():
+        if result["error"]:
+            print(f"❌ 保存エラー: {result['path']}: {result['error']}")
+    return count
+
+
+def main():
+    """コマンドライン: 保存済みプリセットをディレクトリ内の画像に一括適用"""
+    parser = argparse.ArgumentParser(description="処理プリセットの一括適用")
+    parser.add_argument("preset", help="プリセット名")
+    parser.add_argument("input_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--preset-file", default=None, help=f"プリセットJSON（既定: {DEFAULT_PRESET_PATH}）")
+    parser.add_argument("--allow-missing-plugins", action="store_true",
+                        help="プリセットのプラグインが見つからない場合もそれらを除いて適用する")
+    args = parser.parse_args()
+
+    preset = PresetStore(args.preset_file).get(args.preset)
+    if preset is None:
+        parser.error(f"プリセットが見つかりません: {args.preset}")
+    compiled = preset.compile()
+    if compiled.missing_plugins and not args.allow_missing_plugins:
+        parser.error(f"プリセットのプラグインを読み込めません: {', '.join(compiled.missing_plugins)}")
+    count = apply_preset_to_directory(compiled, args.input_dir, args.output_dir)
+    print(f"✅ {count} 枚の画像にプリセット「{preset.name}」を適用しました")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+プログレッシブ・ノイズ除去
+縮小プロキシで高速な近似結果を返し、フル解像度の正確な結果をバックグラウンドで計算する
+"""
+
+import threading
+from typing import Callable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from image_toolkit.core.memory_accountant import get_memory_accountant
+
+
+class ProgressiveDenoiser:
+    """
+    Non-local Meansノイズ除去のプログレッシブ実行クラス
+
+    preview() は縮小画像上の近似処理で即座に結果を返し、submit() は
+    cv2.fastNlMeansDenoisingColored と同一の結果をワーカースレッドで計算する。
+    フル解像度処理は帯状に分割して実行し、帯の間でキャンセルを確認する。
+    新しい submit() / cancel() が呼ばれると古いジョブの結果は破棄される。
+    """
+    def __init__(self, h: float = 10, h_color: float = 10,
+                 template_window_size: int = 7, search_window_size: int = 21,
+                 preview_max_side: int = 512, preview_method: str = "bilateral",
+                 strip_height: int = 256):
+        self.h = h
+        self.h_color = h_color
+        self.template_window_size = template_window_size
+        self.search_window_size = search_window_size
+        self.preview_max_side = preview_max_side
+        self.preview_method = preview_method
+        self.strip_height = strip_height
+        # 帯の境界で結果が変わらないよう、探索窓とテンプレート窓の半径分だけ重ねる
+        self._overlap = template_window_size // 2 + search_window_size // 2
+
+        self._condition = threading.Condition()
+        self._job_id = 0
+        self._pending = None
+        self._result = None
+        self._running_job = None
+        self._thread = None
+        self._closed = False
+
+    def denoise(self, cv_image: np.ndarray) -> np.ndarray:
+        """
+        フル解像度で同期的にノイズ除去（従来と同一の結果）
+        作業メモリがプロセスのメモリ予算を超える場合は帯に分割して実行する（結果は同一）
+        """
+        return get_memory_accountant().run(self._denoise_array, cv_image, halo=self._overlap,
+                                           working_copies=4, itemsize=4)
+
+    def _denoise_array(self, cv_image: np.ndarray) -> np.ndarray:
+        return cv2.fastNlMeansDenoisingColored(
+            cv_image, None, self.h, self.h_color,
+            self.template_window_size, self.search_window_size
+        )
+
+    def preview(self, cv_image: np.ndarray) -> np.ndarray:
+        """縮小プロキシ上で近似的にノイズ除去し、元サイズに戻して返す"""
+        height, width = cv_image.shape[:2]
+        scale = self.preview_max_side / max(height, width)
+        if scale >= 1.0:
+            proxy = cv_image
+        else:
+            proxy_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            proxy = cv2.resize(cv_image, proxy_size, interpolation=cv2.INTER_AREA)
+
+        if self.preview_method == "nlmeans":
+            # 探索窓を縮めたNL-means（プロキシ上でも品質重視の場合）
+            denoised = cv2.fastNlMeansDenoisingColored(
+                proxy, None, self.h, self.h_color, self.template_window_size, 11
+            )
+        else:
+            # バイラテラルフィルタ（最速の近似）
+            denoised = cv2.bilateralFilter(proxy, 5, self.h_color * 2.5, 5)
+
+        if denoised.shape[:2] != (height, width):
+            denoised = cv2.resize(denoised, (width, height), interpolation=cv2.INTER_LINEAR)
+        return denoised
+
+    def submit(self, cv_image: np.ndarray,
+               finalize: Optional[Callable[[np.ndarray], object]] = None) -> int:
+        """
+        フル解像度処理をバックグラウンドに投入し、ジョブIDを返す
+        finalize はノイズ除去後の配列に対してワーカースレッド上で適用される後処理
+        """
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("ProgressiveDenoiser は既に終了しています")
+            self._job_id += 1
+            self._pending = (self._job_id, cv_image, finalize)
+            self._result = None
+            self._ensure_worker()
+            self._condition.notify()
+            return self._job_id
+
+    def cancel(self) -> None:
+        """実行中・待機中のジョブを破棄"""
+        with self._condition:
+            self._job_id += 1
+            self._pending = None
+            self._result = None
+
+    def poll(self) -> Optional[Tuple[int, object]]:
+        """完了した最新ジョブの (ジョブID, 結果) を取り出す。未完了ならNone"""
+        with self._condition:
+            result = self._result
+            self._result = None
+            return result
+
+    def is_busy(self) -> bool:
+        with self._condition:
+            return self._pending is not None or self._running_job is not None
+
+    def close(self) -> None:
+        """ワーカースレッドを停止"""
+        with self._condition:
+            self._closed = True
+            self._job_id += 1
+            self._pending = None
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+    # ---------- 内部処理 ----------
+
+    def _ensure_worker(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._worker_loop, name="ProgressiveDenoiser", daemon=True)
+            self._thread.start()
+
+    def _is_current(self, job_id: int) -> bool:
+        return job_id == self._job_id and not self._closed
+
+    def _worker_loop(self) -> None:
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                job_id, cv_image, finalize = self._pending
+                self._pending = None
+                self._running_job = job_id
+
+            try:
+                denoised = self._denoise_strips(cv_image, job_id)
+                result = None
+                if denoised is not None:
+                    result = finalize(denoised) if finalize else denoised
+            except Exception as e:
+                print(f"❌ バックグラウンドノイズ除去エラー: {e}")
+                result = None
+
+            with self._condition:
+                self._running_job = None
+                if result is not None and self._is_current(job_id):
+                    self._result = (job_id, result)
+
+    def _denoise_strips(self, cv_image: np.ndarray, job_id: int) -> Optional[np.ndarray]:
+        """帯ごとにノイズ除去。キャンセルされた場合はNoneを返す"""
+        height = cv_image.shape[0]
+        if height <= self.strip_height + 2 * self._overlap:
+            return self._denoise_array(cv_image)
+
+        output = np.empty_like(cv_image)
+        for y0 in range(0, height, self.strip_height):
+            if not self._is_current(job_id):
+                return None
+            y1 = min(height, y0 + self.strip_height)
+            top = max(0, y0 - self._overlap)
+            bottom = min(height, y1 + self._overlap)
+            strip = self._denoise_array(np.ascontiguousarray(cv_image[top:bottom]))
+            output[y0:y1] = strip[y0 - top:y1 - top]
+        return output
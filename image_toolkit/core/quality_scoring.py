@@ -0,0 +1,166 @@
+"""
+ディレクトリ単位の画質スコアリング（撮影画像の選別用）
+縮小デコードした画像からシャープネス（ラプラシアン分散）・白飛び/黒つぶれ率・平均輝度を
+プロセスプールで並列に算出し、並べ替え可能な表（pandas.DataFrame）として返す。
+"""
+
+import argparse
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.context import BaseContext
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from image_toolkit.core.results_store import ResultsStore
+
+SUPPORTED_FORMATS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif'}
+
+SCORE_COLUMNS = ["path", "width", "height", "sharpness", "clipped_shadows", "clipped_highlights",
+                 "mean_luminance", "quality", "error"]
+
+
+def list_image_files(directory: Union[str, Path], recursive: bool = False) -> List[str]:
+    """ディレクトリ内の対応形式の画像パスを名前順で返す"""
+    pattern = "**/*" if recursive else "*"
+    return sorted(str(path) for path in Path(directory).glob(pattern)
+                  if path.is_file() and path.suffix.lower() in SUPPORTED_FORMATS)
+
+
+def load_reduced_gray(path: str, max_side: int = 512) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """
+    長辺 max_side 程度に縮小したグレースケール画像と元画像サイズを返す
+    JPEGはdraft()によりDCT段階で縮小・輝度のみデコードするため、フルデコードより大幅に速い
+    """
+    with Image.open(path) as image:
+        original_size = image.size
+        image.draft("L", (max_side, max_side))
+        image = image.convert("L")
+        if max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.Resampling.BILINEAR)
+        return np.asarray(image), original_size
+
+
+def score_image(path: str, max_side: int = 512, clip_low: int = 2, clip_high: int = 253) -> Dict[str, Any]:
+    """
+    1枚の画像のスコアを算出
+    clipped_* は clip_low 以下 / clip_high 以上の画素の割合（縮小時の平均化を考慮して端から少し余裕を持たせる）
+    """
+    row: Dict[str, Any] = {column: None for column in SCORE_COLUMNS}
+    row["path"] = str(path)
+    try:
+        gray, (width, height) = load_reduced_gray(path, max_side)
+        histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+        total = histogram.sum()
+        _, std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_32F))
+        row.update({
+            "width": width,
+            "height": height,
+            "sharpness": float(std[0, 0] ** 2),
+            "clipped_shadows": float(histogram[:clip_low + 1].sum() / total),
+            "clipped_highlights": float(histogram[clip_high:].sum() / total),
+            "mean_luminance": float((histogram * np.arange(256)).sum() / total),
+        })
+        row["quality"] = quality_score(row)
+    except Exception as e:
+        row["error"] = str(e)
+    return row
+
+
+def quality_score(row: Dict[str, Any]) -> float:
+    """
+    選別用の総合スコア: log(1+シャープネス) を露出の問題（白飛び・黒つぶれ、極端な平均輝度）で減点
+    """
+    exposure = 1.0 - min(1.0, row["clipped_shadows"] + row["clipped_highlights"])
+    # 平均輝度が中間調(128)から離れるほど緩やかに減点（0または255で半分）
+    exposure *= 1.0 - 0.5 * (abs(row["mean_luminance"] - 128.0) / 128.0) ** 2
+    return math.log1p(row["sharpness"]) * exposure
+
+
+def _score_image_task(args) -> Dict[str, Any]:
+    path, max_side = args
+    return score_image(path, max_side)
+
+
+def iter_scores(paths: Iterable[str], max_side: int = 512,
+                max_workers: Optional[int] = None, chunksize: int = 8,
+                mp_context: Optional[BaseContext] = None) -> Iterator[Dict[str, Any]]:
+    """
+    画像パス一覧をプロセスプールでスコアリングし、入力順に1行ずつ返す
+    スレッドを持つプロセス（GUI等）から呼ぶ場合は mp_context に spawn / forkserver のコンテキストを渡すこと
+    （既定の fork では他スレッドが保持中のロックごと複製され、ワーカーが停止することがある）
+    """
+    paths = [str(path) for path in paths]
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or len(paths) <= 1:
+        for path in paths:
+            yield score_image(path, max_side)
+        return
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context) as executor:
+        yield from executor.map(_score_image_task, [(path, max_side) for path in paths], chunksize=chunksize)
+
+
+def score_images(paths: Iterable[str], max_side: int = 512,
+                 max_workers: Optional[int] = None, chunksize: int = 8,
+                 mp_context: Optional[BaseContext] = None) -> pd.DataFrame:
+    """画像パス一覧をスコアリングして表を返す（読み込めない画像は error 列に理由を記録）"""
+    rows = list(iter_scores(paths, max_side, max_workers, chunksize, mp_context))
+    return pd.DataFrame(rows, columns=SCORE_COLUMNS)
+
+
+def score_directory(directory: Union[str, Path], recursive: bool = False, max_side: int = 512,
+                    max_workers: Optional[int] = None) -> pd.DataFrame:
+    """ディレクトリ内の全画像をスコアリング"""
+    return score_images(list_image_files(directory, recursive), max_side, max_workers)
+
+
+def rank_images(table: pd.DataFrame, by: str = "quality", ascending: bool = False) -> pd.DataFrame:
+    """スコア表を指定列で並べ替え（読み込みに失敗した画像は末尾）"""
+    if by not in table.columns:
+        raise ValueError(f"未知の列です: {by}")
+    ranked = table.sort_values(by, ascending=ascending, na_position="last", kind="stable")
+    return ranked.reset_index(drop=True)
+
+
+def main():
+    """コマンドライン: ディレクトリ内の画像を画質スコアで並べて表示・CSV出力"""
+    parser = argparse.ArgumentParser(description="ディレクトリ内画像の画質スコアリング")
+    parser.add_argument("directory")
+    parser.add_argument("--sort", default="quality",
+                        choices=["quality", "sharpness", "clipped_shadows", "clipped_highlights", "mean_luminance"])
+    parser.add_argument("--ascending", action="store_true", help="昇順に並べる（既定は降順）")
+    parser.add_argument("--recursive", action="store_true")
+    parser.add_argument("--max-side", type=int, default=512, help="スコア算出時の縮小長辺")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--top", type=int, default=None, help="表示する件数")
+    parser.add_argument("--csv", default=None, help="全件をCSVに書き出すパス")
+    parser.add_argument("--store", default=None, help="結果を追記する結果ストアのディレクトリ（表は表示しない）")
+    args = parser.parse_args()
+
+    if args.store:
+        # 大量の画像でも行をメモリに溜めず、チャンク単位でストアへ書き出す
+        with ResultsStore(args.store) as store:
+            count = store.extend(iter_scores(list_image_files(args.directory, args.recursive),
+                                             args.max_side, args.workers))
+        print(f"💾 {count} 行を結果ストアに追記しました: {args.store}")
+        return
+
+    table = rank_images(score_directory(args.directory, args.recursive, args.max_side, args.workers),
+                        args.sort, args.ascending)
+    if args.csv:
+        table.to_csv(args.csv, index=False)
+        print(f"💾 スコア表を書き出しました: {args.csv}")
+    shown = table if args.top is None else table.head(args.top)
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(shown.drop(columns=["error"]).to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+    failed = int(table["error"].notna().sum())
+    print(f"✅ {len(table) - failed} 枚をスコアリングしました" + (f"（読み込み失敗 {failed} 枚）" if failed else ""))
+
+
+if __name__ == "__main__":
+    main()
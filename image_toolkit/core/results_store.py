@@ -0,0 +1,220 @@
+"""
+バッチ処理結果の追記専用カラムナストア
+行は列ごとのバッファに最大 chunk_rows 行だけ保持し、溜まるたびにDataFrameのチャンクとしてディスクへ書き出す。
+チャンクはParquet（pyarrowが必要: pip install image_toolkit[store]）で保存し、チャンク形式と
+チャンクごとの数値列の最小・最大値をマニフェストに記録するため、条件に合わないチャンクは読み込まずに問い合わせできる。
+共有ディレクトリに置かれたストアを読み込んでも任意コードが実行されないよう、pickle形式は扱わない。
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+
+# pyarrowのインポート（Parquet保存に使用、extras_require の "store" で導入）
+try:
+    import pyarrow  # noqa: F401
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+MANIFEST_NAME = "manifest.json"
+
+# マニフェストに記録するチャンク形式
+CHUNK_FORMAT = "parquet"
+
+Range = Tuple[Optional[float], Optional[float]]
+
+
+class ResultsStore:
+    """
+    追記専用の結果ストア（ディレクトリ1つ = ストア1つ）
+
+    使用例:
+        with ResultsStore("results/scores") as store:
+            store.extend(iter_scores(paths))
+        sharp = ResultsStore("results/scores").query("sharpness > 100", columns=["path", "sharpness"])
+    """
+    def __init__(self, directory: Union[str, Path], chunk_rows: int = 50000):
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("結果ストアにはpyarrowが必要です（pip install image_toolkit[store]）")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.chunk_rows = chunk_rows
+        self._manifest = self._load_manifest()
+        stored_format = self._manifest.get("format")
+        if stored_format not in (None, CHUNK_FORMAT):
+            raise ValueError(f"未対応のチャンク形式です: {stored_format}（{self.directory}）")
+        self.file_format = CHUNK_FORMAT
+        self._manifest["format"] = CHUNK_FORMAT
+        self._columns: Dict[str, List[Any]] = {}
+        self._buffered_rows = 0
+
+    # ---------- 追記 ----------
+
+    def append(self, row: Dict[str, Any]) -> None:
+        """1行を追記（バッファが chunk_rows に達したら書き出す）"""
+        for name in row:
+            if name not in self._columns:
+                # 途中から現れた列は、それまでの行を欠損値で埋める
+                self._columns[name] = [None] * self._buffered_rows
+        for name, values in self._columns.items():
+            values.append(row.get(name))
+        self._buffered_rows += 1
+        if self._buffered_rows >= self.chunk_rows:
+            self.flush()
+
+    def extend(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """行のイテラブルを順に追記し、追記した行数を返す（ジェネレータを渡せば全件をメモリに載せない）"""
+        count = 0
+        for row in rows:
+            self.append(row)
+            count += 1
+        return count
+
+    def append_frame(self, frame: pd.DataFrame) -> None:
+        """DataFrameをそのままチャンクとして追記"""
+        self.flush()
+        for start in range(0, len(frame), self.chunk_rows):
+            self._write_chunk(frame.iloc[start:start + self.chunk_rows].reset_index(drop=True))
+
+    def flush(self) -> None:
+        """バッファ中の行をチャンクとして書き出す"""
+        if not self._buffered_rows:
+            return
+        frame = pd.DataFrame(self._columns)
+        self._columns = {}
+        self._buffered_rows = 0
+        self._write_chunk(frame)
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> "ResultsStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    # ---------- 問い合わせ ----------
+
+    def row_count(self) -> int:
+        return sum(chunk["rows"] for chunk in self._manifest["chunks"]) + self._buffered_rows
+
+    def column_names(self) -> List[str]:
+        names: List[str] = []
+        for chunk in self._manifest["chunks"]:
+            names.extend(name for name in chunk["columns"] if name not in names)
+        return names
+
+    def iter_chunks(self, columns: Optional[List[str]] = None,
+                    ranges: Optional[Dict[str, Range]] = None) -> Iterator[pd.DataFrame]:
+        """
+        書き出し済みのチャンクを1つずつ読み込んで返す
+        ranges={"列名": (下限, 上限)} を指定すると、マニフェストの最小・最大値で範囲外のチャンクを読み飛ばす
+        """
+        for chunk in self._manifest["chunks"]:
+            if ranges and not self._chunk_may_match(chunk, ranges):
+                continue
+            yield self._read_chunk(chunk, columns)
+
+    def query(self, expr: Optional[str] = None, columns: Optional[List[str]] = None,
+              ranges: Optional[Dict[str, Range]] = None) -> pd.DataFrame:
+        """
+        チャンクごとに条件を適用し、該当行だけを連結して返す
+        expr は DataFrame.query() の条件式、ranges は列ごとの閉区間（チャンクの読み飛ばしにも使用）
+        """
+        read_columns = None
+        if columns is not None:
+            # 条件に使う列も読み込む（結果からは除く）
+            read_columns = list(columns) + [name for name in (ranges or {}) if name not in columns]
+            if expr is not None:
+                read_columns += [name for name in self.column_names() if name in expr and name not in read_columns]
+        parts = []
+        for frame in self.iter_chunks(read_columns, ranges):
+            for name, (low, high) in (ranges or {}).items():
+                if low is not None:
+                    frame = frame[frame[name] >= low]
+                if high is not None:
+                    frame = frame[frame[name] <= high]
+            if expr is not None:
+                frame = frame.query(expr)
+            if columns is not None:
+                frame = frame[list(columns)]
+            if len(frame):
+                parts.append(frame)
+        if not parts:
+            return pd.DataFrame(columns=columns if columns is not None else self.column_names())
+        return pd.concat(parts, ignore_index=True)
+
+    def load(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """全チャンクを読み込んで1つのDataFrameにする（小さなストア向け）"""
+        return self.query(columns=columns)
+
+    # ---------- 内部処理 ----------
+
+    def _write_chunk(self, frame: pd.DataFrame) -> None:
+        index = len(self._manifest["chunks"])
+        filename = f"chunk_{index:06d}.parquet"
+        frame.to_parquet(self.directory / filename, index=False, compression="zstd")
+        self._manifest["chunks"].append({
+            "file": filename,
+            "rows": len(frame),
+            "columns": list(frame.columns),
+            "stats": self._column_stats(frame),
+        })
+        self._save_manifest()
+
+    def _read_chunk(self, chunk: Dict[str, Any], columns: Optional[List[str]]) -> pd.DataFrame:
+        path = self.directory / chunk["file"]
+        available = [name for name in columns if name in chunk["columns"]] if columns is not None else None
+        frame = pd.read_parquet(path, columns=available)
+        if columns is not None:
+            # このチャンクに存在しない列は欠損値として補う
+            for name in columns:
+                if name not in frame.columns:
+                    frame[name] = None
+            frame = frame[list(columns)]
+        return frame
+
+    @staticmethod
+    def _column_stats(frame: pd.DataFrame) -> Dict[str, List[float]]:
+        stats = {}
+        for name in frame.columns:
+            column = frame[name]
+            if pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column):
+                valid = column.dropna()
+                if len(valid):
+                    stats[name] = [float(valid.min()), float(valid.max())]
+        return stats
+
+    @staticmethod
+    def _chunk_may_match(chunk: Dict[str, Any], ranges: Dict[str, Range]) -> bool:
+        for name, (low, high) in ranges.items():
+            if name not in chunk["columns"]:
+                return False
+            stats = chunk["stats"].get(name)
+            if stats is None:
+                continue
+            if low is not None and stats[1] < low:
+                return False
+            if high is not None and stats[0] > high:
+                return False
+        return True
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        path = self.directory / MANIFEST_NAME
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {"format": None, "chunks": []}
+
+    def _save_manifest(self) -> None:
+        # 書き込み途中で中断されてもマニフェストが壊れないよう、一時ファイルから置き換える
+        path = self.directory / MANIFEST_NAME
+        temporary = path.with_suffix(".json.tmp")
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f, ensure_ascii=False)
+        os.replace(temporary, path)
@@ -0,0 +1,258 @@
+"""
+共有メモリを使ったマルチプロセス実行エンジン
+入出力フレームを multiprocessing.shared_memory 上に置き、ワーカーにはブロック名と処理範囲のみを渡す。
+巨大な配列をpickleで転送せずに、NL-means やバイラテラルフィルタ等のCPU負荷の高い処理を複数コアで実行する。
+"""
+
+import math
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from multiprocessing.context import BaseContext
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from image_toolkit.core.memory_accountant import PRIORITY_POOL, get_memory_accountant
+
+FrameHandle = Tuple[str, Tuple[int, ...], str]
+
+
+# ========== 組み込みタスク（帯単位で実行、halo は帯の上下に必要な余白行数） ==========
+
+def _nlmeans_task(band: np.ndarray, h: float = 10, h_color: float = 10,
+                  template_window_size: int = 7, search_window_size: int = 21) -> np.ndarray:
+    return cv2.fastNlMeansDenoisingColored(band, None, h, h_color, template_window_size, search_window_size)
+
+
+def _nlmeans_halo(params: Dict[str, Any]) -> int:
+    return params.get("template_window_size", 7) // 2 + params.get("search_window_size", 21) // 2
+
+
+def _bilateral_task(band: np.ndarray, d: int = 9, sigma_color: float = 75,
+                    sigma_space: float = 75) -> np.ndarray:
+    return cv2.bilateralFilter(band, d, sigma_color, sigma_space)
+
+
+def _bilateral_halo(params: Dict[str, Any]) -> int:
+    d = params.get("d", 9)
+    return d // 2 if d > 0 else int(round(params.get("sigma_space", 75) * 1.5))
+
+
+def _gaussian_task(band: np.ndarray, sigma: float = 2.0) -> np.ndarray:
+    return cv2.GaussianBlur(band, (0, 0), sigma)
+
+
+def _gaussian_halo(params: Dict[str, Any]) -> int:
+    return int(math.ceil(params.get("sigma", 2.0) * 4)) + 1
+
+
+BUILTIN_TASKS: Dict[str, Tuple[Callable[..., np.ndarray], Callable[[Dict[str, Any]], int]]] = {
+    "nlmeans": (_nlmeans_task, _nlmeans_halo),
+    "bilateral": (_bilateral_task, _bilateral_halo),
+    "gaussian": (_gaussian_task, _gaussian_halo),
+}
+
+
+# ========== 共有メモリブロック ==========
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """既存ブロックに接続（Python 3.13以降はリソーストラッカーへの登録を行わない）"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedFrame:
+    """共有メモリ上のフレーム（ブロックと形状・型の組）"""
+    def __init__(self, block: shared_memory.SharedMemory, shape: Tuple[int, ...], dtype: np.dtype):
+        self.block = block
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+
+    @property
+    def array(self) -> np.ndarray:
+        """ブロックを参照するndarrayビュー（コピーなし）"""
+        return np.ndarray(self.shape, dtype=self.dtype, buffer=self.block.buf)
+
+    @property
+    def handle(self) -> FrameHandle:
+        """ワーカーへ渡すためのハンドル（ブロック名, 形状, 型）"""
+        return (self.block.name, self.shape, self.dtype.str)
+
+
+class SharedFramePool:
+    """
+    共有メモリブロックの再利用プール
+    解放されたブロックは保持しておき、同じかそれ以上のサイズの要求に再利用する
+    メモリ管理の evict() は予算を超えたスレッドから呼ばれるため、ブロックの一覧はロックで保護する
+    （evict() が破棄するのは _free のブロックのみで、acquire() で取り出し中のブロックには触れない）
+    """
+    def __init__(self, max_free_blocks: int = 8):
+        self.max_free_blocks = max_free_blocks
+        self._free: List[shared_memory.SharedMemory] = []
+        self._in_use: Dict[str, shared_memory.SharedMemory] = {}
+        self._lock = threading.Lock()
+        get_memory_accountant().register(self, "共有メモリプール", PRIORITY_POOL)
+
+    def acquire(self, shape: Tuple[int, ...], dtype=np.uint8) -> SharedFrame:
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with self._lock:
+            candidates = [block for block in self._free if block.size >= nbytes]
+            if candidates:
+                block = min(candidates, key=lambda b: b.size)
+                self._free.remove(block)
+            else:
+                block = shared_memory.SharedMemory(create=True, size=max(1, nbytes))
+            self._in_use[block.name] = block
+        return SharedFrame(block, shape, dtype)
+
+    def release(self, frame: SharedFrame) -> None:
+        with self._lock:
+            block = self._in_use.pop(frame.block.name, None)
+            if block is None:
+                return
+            self._free.append(block)
+            # 上限を超えた分は小さいブロックから破棄
+            while len(self._free) > self.max_free_blocks:
+                self._free.sort(key=lambda b: b.size)
+                self._destroy(self._free.pop(0))
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._total_bytes()
+
+    def _total_bytes(self) -> int:
+        return sum(block.size for block in self._free) + sum(block.size for block in self._in_use.values())
+
+    def evict(self, target_bytes: int) -> int:
+        """使用中でない保持ブロックを大きい順に破棄し、解放したバイト数を返す"""
+        with self._lock:
+            before = self._total_bytes()
+            self._free.sort(key=lambda b: b.size)
+            while self._free and self._total_bytes() > target_bytes:
+                self._destroy(self._free.pop())
+            return before - self._total_bytes()
+
+    def close(self) -> None:
+        with self._lock:
+            for block in self._free + list(self._in_use.values()):
+                self._destroy(block)
+            self._free = []
+            self._in_use = {}
+
+    @staticmethod
+    def _destroy(block: shared_memory.SharedMemory) -> None:
+        try:
+            block.close()
+        except BufferError:
+            # 呼び出し側がビューを保持している場合でも名前は解放する
+            pass
+        try:
+            block.unlink()
+        except FileNotFoundError:
+            pass
+
+
+# ========== ワーカー側処理 ==========
+
+def _resolve_task(task: Union[str, Callable], params: Dict[str, Any],
+                  halo: Optional[int]) -> Tuple[Callable[..., np.ndarray], int]:
+    if isinstance(task, str):
+        if task not in BUILTIN_TASKS:
+            raise ValueError(f"未知のタスクです: {task}")
+        function, halo_function = BUILTIN_TASKS[task]
+        return function, halo if halo is not None else halo_function(params)
+    return task, halo or 0
+
+
+def _process_band(task: Union[str, Callable], source: FrameHandle, target: FrameHandle,
+                  row_start: int, row_end: int, params: Dict[str, Any], halo: int) -> None:
+    """ワーカープロセスで1つの帯を処理し、結果を出力ブロックへ直接書き込む"""
+    source_block = _attach(source[0])
+    target_block = _attach(target[0])
+    try:
+        _process_band_arrays(task, source_block, source, target_block, target, row_start, row_end, params, halo)
+    finally:
+        source_block.close()
+        target_block.close()
+
+
+def _process_band_arrays(task, source_block, source, target_block, target,
+                         row_start, row_end, params, halo) -> None:
+    # ブロックを閉じる前にビューが解放されるよう、配列はこの関数内だけで保持する
+    function, halo = _resolve_task(task, params, halo)
+    source_array = np.ndarray(source[1], dtype=np.dtype(source[2]), buffer=source_block.buf)
+    target_array = np.ndarray(target[1], dtype=np.dtype(target[2]), buffer=target_block.buf)
+    height = source_array.shape[0]
+    top = max(0, row_start - halo)
+    bottom = min(height, row_end + halo)
+    result = function(np.ascontiguousarray(source_array[top:bottom]), **params)
+    target_array[row_start:row_end] = result[row_start - top:row_end - top]
+
+
+# ========== 実行エンジン ==========
+
+class SharedMemoryExecutor:
+    """
+    共有メモリ上のフレームを帯に分割してプロセスプールで処理する実行エンジン
+    各帯は上下に halo 行の余白を付けて処理するため、近傍処理でも境界の結果は一括処理と一致する
+    スレッドを持つプロセス（GUI等）から使う場合は mp_context に spawn / forkserver のコンテキストを渡すこと
+    """
+    def __init__(self, max_workers: Optional[int] = None, pool: Optional[SharedFramePool] = None,
+                 bands_per_worker: int = 2, mp_context: Optional[BaseContext] = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=mp_context)
+        self.pool = pool or SharedFramePool()
+        self.bands_per_worker = bands_per_worker
+
+    def run(self, task: Union[str, Callable], image: np.ndarray,
+            params: Optional[Dict[str, Any]] = None, halo: Optional[int] = None,
+            bands: Optional[int] = None) -> np.ndarray:
+        """
+        配列を共有メモリへ1回コピーして処理し、結果の配列を返す
+        task は組み込みタスク名（"nlmeans", "bilateral", "gaussian"）か、
+        モジュールのトップレベルに定義された関数（その場合は halo を指定）
+        bands は帯の数（省略時はワーカー数 × bands_per_worker、帯に分割できない処理は 1）
+        """
+        source = self.pool.acquire(image.shape, image.dtype)
+        target = self.pool.acquire(image.shape, image.dtype)
+        try:
+            np.copyto(source.array, image)
+            self.run_frames(task, source, target, params, halo, bands)
+            return target.array.copy()
+        finally:
+            self.pool.release(source)
+            self.pool.release(target)
+
+    def run_frames(self, task: Union[str, Callable], source: SharedFrame, target: SharedFrame,
+                   params: Optional[Dict[str, Any]] = None, halo: Optional[int] = None,
+                   bands: Optional[int] = None) -> None:
+        """プールから取得済みのフレーム間で処理（コピーなし）"""
+        params = params or {}
+        _, halo = _resolve_task(task, params, halo)
+        height = source.shape[0]
+        band_count = max(1, min(height, bands or self.max_workers * self.bands_per_worker))
+        band_height = int(math.ceil(height / band_count))
+        futures = [
+            self._executor.submit(_process_band, task, source.handle, target.handle,
+                                  row_start, min(height, row_start + band_height), params, halo)
+            for row_start in range(0, height, band_height)
+        ]
+        errors = [future.exception() for future in futures]
+        for error in errors:
+            if error is not None:
+                raise error
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self.pool.close()
+
+    def __enter__(self) -> "SharedMemoryExecutor":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
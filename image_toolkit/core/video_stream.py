@@ -0,0 +1,498 @@
+"""
+動画・連番画像・マルチページ画像のストリーミング処理
+cv2.VideoCapture・連番画像・マルチページTIFF/アニメーションGIFからフレームを読み込み、
+処理して cv2.VideoWriter / 連番画像 / マルチページTIFF・アニメーションGIFへ書き出す。
+デコード・処理・エンコードは上限付きキューで接続した別スレッドで並行に実行し、
+メモリ使用量はクリップの長さ（ページ数）に依存しない。
+"""
+
+import argparse
+import glob
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+import cv2
+import numpy as np
+from PIL import GifImagePlugin, Image, TiffImagePlugin
+
+from image_toolkit.core.image_utils import ImageUtils
+
+_END = object()
+
+# 1ファイルに複数フレームを持てる形式（ページ単位で読み書きする）
+MULTI_FRAME_FORMATS = {'.tif', '.tiff', '.gif'}
+
+# 白黒（モード"1"）専用のTIFF圧縮方式と、白黒では使えない圧縮方式
+# （libtiff は組み合わせを誤ると例外ではなくプロセスごと異常終了することがあるため書き出し前に判定する）
+_BILEVEL_TIFF_COMPRESSIONS = {'group3', 'group4', 'tiff_ccitt'}
+_JPEG_TIFF_COMPRESSIONS = {'jpeg', 'tiff_jpeg'}
+
+
+class VideoFileSource:
+    """動画ファイル（またはカメラ番号）からBGRフレームを読み込む"""
+    def __init__(self, path):
+        self.path = path
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise IOError(f"動画を開けませんでした: {path}")
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        try:
+            while True:
+                ok, frame = self.capture.read()
+                if not ok:
+                    return
+                yield frame
+        finally:
+            self.capture.release()
+
+
+class ImageSequenceSource:
+    """
+    連番画像からBGRフレームを読み込む
+    pattern は "frames/img_%05d.png" 形式、またはglobパターン "frames/*.png"
+    """
+    def __init__(self, pattern: str, fps: float = 30.0):
+        if "%" in pattern:
+            self.paths = self._expand_printf_pattern(pattern)
+        else:
+            self.paths = sorted(glob.glob(pattern))
+        if not self.paths:
+            raise IOError(f"連番画像が見つかりませんでした: {pattern}")
+        self.fps = fps
+        self.frame_count = len(self.paths)
+
+    @staticmethod
+    def _expand_printf_pattern(pattern: str) -> List[str]:
+        paths = []
+        # 開始番号は0または1を許容
+        index = 0 if os.path.exists(pattern % 0) else 1
+        while os.path.exists(pattern % index):
+            paths.append(pattern % index)
+            index += 1
+        return paths
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for path in self.paths:
+            frame = cv2.imread(path, cv2.IMREAD_COLOR)
+            if frame is None:
+                raise IOError(f"画像を読み込めませんでした: {path}")
+            yield frame
+
+
+class VideoFileSink:
+    """BGRフレームを動画ファイルへ書き出す（最初のフレームでサイズを決定）"""
+    def __init__(self, path: str, fps: float, fourcc: str = "mp4v"):
+        self.path = path
+        self.fps = fps
+        self.fourcc = fourcc
+        self.writer = None
+
+    def write(self, frame: np.ndarray) -> None:
+        if self.writer is None:
+            height, width = frame.shape[:2]
+            self.writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, (width, height))
+            if not self.writer.isOpened():
+                raise IOError(f"動画を書き出せませんでした: {self.path}")
+        self.writer.write(frame)
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+
+
+class ImageSequenceSink:
+    """BGRフレームを連番画像として書き出す（pattern は "out/frame_%05d.png" 形式）"""
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.index = 0
+        directory = os.path.dirname(pattern)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(self, frame: np.ndarray) -> None:
+        path = self.pattern % self.index
+        if not cv2.imwrite(path, frame):
+            raise IOError(f"画像を書き出せませんでした: {path}")
+        self.index += 1
+
+    def close(self) -> None:
+        pass
+
+
+class MultiFrameImageSource:
+    """
+    マルチページTIFF・アニメーションGIFからBGRフレームを1ページずつ読み込む
+    seek() で該当ページだけをデコードするため、保持するのは常に現在のページのみ。
+    各フレームの表示時間（ミリ秒、GIF）は読み込んだ順に durations に記録される。
+    TIFFの圧縮方式（Pillowの info["compression"]。GIFでは None）は compression に記録される
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with Image.open(path) as image:
+            self.frame_count = getattr(image, "n_frames", 1)
+            self.mode = image.mode
+            self.format = image.format
+            self.loop = image.info.get("loop")
+            self.dpi = image.info.get("dpi")
+            self.compression = image.info.get("compression")
+            duration = image.info.get("duration")
+        self.fps = 1000.0 / duration if duration else 30.0
+        self.durations: List[int] = []
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        with Image.open(self.path) as image:
+            for index in range(self.frame_count):
+                image.seek(index)
+                self.durations.append(int(image.info.get("duration", 0) or 0))
+                yield cv2.cvtColor(np.asarray(image.convert("RGB")), cv2.COLOR_RGB2BGR)
+
+
+class MultiFrameImageSink:
+    """
+    BGRフレームをマルチページTIFFまたはアニメーションGIFとして1ページずつ追記する
+    TIFFは AppendingTiffWriter でページを書き足し、GIFはフレームごとに減色して
+    ローカルカラーテーブル付きで書き出すため、書き出し済みのフレームはメモリに残らない。
+    durations は各フレームの表示時間（ミリ秒）のリスト（読み込み中のソースの durations を渡せる）
+    """
+    def __init__(self, path: str, fps: float = 30.0, durations: Optional[List[int]] = None,
+                 loop: Optional[int] = 0, mode: Optional[str] = None, compression: Optional[str] = None,
+                 dpi=None):
+        self.path = path
+        self.format = "GIF" if Path(path).suffix.lower() == ".gif" else "TIFF"
+        self.frame_duration = int(round(1000.0 / fps)) if fps else 100
+        self.durations = durations
+        self.loop = loop
+        self.mode = mode
+        self.compression = compression
+        self.dpi = dpi
+        self.index = 0
+        self._file = None
+
+    def write(self, frame: np.ndarray) -> None:
+        image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        if self.format == "GIF":
+            self._write_gif_frame(image)
+        else:
+            self._write_tiff_page(image)
+        self.index += 1
+
+    def _duration(self) -> int:
+        if self.durations is not None and self.index < len(self.durations) and self.durations[self.index]:
+            return self.durations[self.index]
+        return self.frame_duration
+
+    def _write_tiff_page(self, image: Image.Image) -> None:
+        if self._file is None:
+            self._file = TiffImagePlugin.AppendingTiffWriter(self.path, new=True)
+        if self.mode is not None and image.mode != self.mode:
+            image = image.convert(self.mode)
+        options = {}
+        compression = _writable_tiff_compression(self.compression, image.mode)
+        if compression:
+            options["compression"] = compression
+        if self.dpi:
+            options["dpi"] = self.dpi
+        image.save(self._file, format="TIFF", **options)
+        self._file.newFrame()
+
+    def _write_gif_frame(self, image: Image.Image) -> None:
+        paletted = image.quantize(256)
+        if self._file is None:
+            self._file = open(self.path, "wb")
+            header, _ = GifImagePlugin.getheader(paletted, info={"loop": self.loop})
+            for block in header:
+                self._file.write(block)
+        for block in GifImagePlugin.getdata(paletted, duration=self._duration(), include_color_table=True):
+            self._file.write(block)
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        if self.format == "GIF":
+            self._file.write(b";")
+        self._file.close()
+        self._file = None
+
+
+def _writable_tiff_compression(compression: Optional[str], mode: str) -> Optional[str]:
+    """
+    出力ページのモードで書き出せるTIFF圧縮方式（使えない場合は None = 無圧縮）
+    旧形式JPEG（tiff_jpeg）は読み込み専用のため jpeg として書き出す
+    """
+    if not compression or compression == "raw":
+        return None
+    if compression in _BILEVEL_TIFF_COMPRESSIONS:
+        return compression if mode == "1" else None
+    if compression in _JPEG_TIFF_COMPRESSIONS:
+        return "jpeg" if mode in ("L", "RGB", "CMYK", "YCbCr") else None
+    return compression
+
+
+def is_multi_frame_path(path: str) -> bool:
+    return Path(path).suffix.lower() in MULTI_FRAME_FORMATS
+
+
+def open_frame_source(path: str, fps: float = 30.0):
+    """パスの形式に応じてフレーム入力を開く"""
+    if "%" in path or any(char in path for char in "*?["):
+        return ImageSequenceSource(path, fps)
+    if is_multi_frame_path(path):
+        return MultiFrameImageSource(path)
+    return VideoFileSource(path)
+
+
+def open_frame_sink(path: str, fps: float, source=None):
+    """
+    パスの形式に応じてフレーム出力を開く
+    マルチページ出力では、マルチページ入力の表示時間・ループ回数・解像度（dpi）・
+    白黒/グレーのモード・TIFFの圧縮方式を引き継ぐ
+    """
+    if "%" in path:
+        return ImageSequenceSink(path)
+    if is_multi_frame_path(path):
+        if isinstance(source, MultiFrameImageSource):
+            mode = source.mode if source.mode in ("1", "L") else None
+            return MultiFrameImageSink(path, fps, source.durations, source.loop if source.loop is not None else 0,
+                                       mode, compression=source.compression, dpi=source.dpi)
+        return MultiFrameImageSink(path, fps)
+    return VideoFileSink(path, fps)
+
+
+def make_plugin_processor(plugins) -> Callable[[np.ndarray], np.ndarray]:
+    """
+    プラグイン列をBGRフレーム用の処理関数に変換（PluginChainで作業バッファを再利用）
+    float対応プラグインが連続する区間はfloat32のまま受け渡し、量子化は区間ごとに1回
+    """
+    from image_toolkit.core.plugin_base import PluginChain
+    chain = PluginChain(plugins, float_dtype=np.float32)
+
+    def process(frame: np.ndarray) -> np.ndarray:
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return cv2.cvtColor(chain.run(rgb), cv2.COLOR_RGB2BGR)
+    return process
+
+
+def make_adjustment_processor(brightness: int = 0, contrast: int = 0, saturation: int = 0,
+                              gamma: float = 1.0, blur: int = 0) -> Callable[[np.ndarray], np.ndarray]:
+    """ImageUtilsの調整をBGRフレーム用の処理関数にまとめる"""
+    def process(frame: np.ndarray) -> np.ndarray:
+        batch = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)[np.newaxis]
+        batch = ImageUtils.apply_brightness_batch(batch, brightness)
+        batch = ImageUtils.apply_contrast_batch(batch, contrast)
+        batch = ImageUtils.apply_saturation_batch(batch, saturation)
+        batch = ImageUtils.apply_gamma_correction_batch(batch, gamma)
+        batch = ImageUtils.apply_gaussian_blur_batch(batch, blur)
+        return cv2.cvtColor(batch[0], cv2.COLOR_RGB2BGR)
+    return process
+
+
+def make_preset_processor(compiled) -> Callable[[np.ndarray], np.ndarray]:
+    """コンパイル済みプリセット（CompiledPreset）をBGRフレーム用の処理関数に変換"""
+    def process(frame: np.ndarray) -> np.ndarray:
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return cv2.cvtColor(compiled.apply_array(rgb), cv2.COLOR_RGB2BGR)
+    return process
+
+
+class StreamPipeline:
+    """
+    デコード → 処理 → エンコードのストリーミングパイプライン
+    各段は上限付きキューで接続されるため、同時に保持されるフレーム数は最大 2*queue_size+3 枚。
+    queue_size=0 では呼び出し元のスレッドで1フレームずつ順に処理し、保持するのは入力・出力の2枚のみ
+    （大きなページが続くマルチページ文書向け）
+    """
+    def __init__(self, process_fn: Callable[[np.ndarray], np.ndarray], queue_size: int = 8):
+        self.process_fn = process_fn
+        self.queue_size = queue_size
+
+    def run(self, source, sink,
+            progress_callback: Optional[Callable[[int, float], None]] = None,
+            progress_interval: int = 30) -> Dict[str, float]:
+        """
+        全フレームを処理して統計を返す
+        progress_callback(処理済みフレーム数, 直近の持続fps) を progress_interval フレームごとに呼ぶ
+        """
+        if self.queue_size <= 0:
+            return self._run_inline(source, sink, progress_callback, progress_interval)
+        decoded = queue.Queue(maxsize=self.queue_size)
+        processed = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        errors: List[BaseException] = []
+        timings = {"decode_time": 0.0, "process_time": 0.0, "encode_time": 0.0}
+
+        def put(target: queue.Queue, item) -> bool:
+            # 他の段が異常終了した場合に永久に待たないよう、停止フラグを確認しながら投入
+            while not stop.is_set():
+                try:
+                    target.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def get(source_queue: queue.Queue):
+            while not stop.is_set():
+                try:
+                    return source_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            return _END
+
+        def decode_stage():
+            try:
+                iterator = iter(source)
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    frame = next(iterator, _END)
+                    timings["decode_time"] += time.perf_counter() - start
+                    if frame is _END or not put(decoded, frame):
+                        break
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                put(decoded, _END)
+
+        def encode_stage():
+            try:
+                while True:
+                    frame = get(processed)
+                    if frame is _END:
+                        break
+                    start = time.perf_counter()
+                    sink.write(frame)
+                    timings["encode_time"] += time.perf_counter() - start
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                sink.close()
+
+        decoder = threading.Thread(target=decode_stage, name="StreamDecode", daemon=True)
+        encoder = threading.Thread(target=encode_stage, name="StreamEncode", daemon=True)
+        start_time = time.perf_counter()
+        window_start, window_frames = start_time, 0
+        frame_count = 0
+        decoder.start()
+        encoder.start()
+        try:
+            while True:
+                frame = get(decoded)
+                if frame is _END:
+                    break
+                start = time.perf_counter()
+                result = self.process_fn(frame)
+                timings["process_time"] += time.perf_counter() - start
+                if not put(processed, result):
+                    break
+                frame_count += 1
+                window_frames += 1
+                if progress_callback and window_frames >= progress_interval:
+                    now = time.perf_counter()
+                    progress_callback(frame_count, window_frames / (now - window_start))
+                    window_start, window_frames = now, 0
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            put(processed, _END)
+            decoder.join()
+            encoder.join()
+
+        if errors:
+            raise errors[0]
+        elapsed = time.perf_counter() - start_time
+        stats = {"frames": frame_count, "elapsed": elapsed, "fps": frame_count / elapsed if elapsed > 0 else 0.0}
+        stats.update(timings)
+        return stats
+
+    def _run_inline(self, source, sink, progress_callback: Optional[Callable[[int, float], None]],
+                    progress_interval: int) -> Dict[str, float]:
+        timings = {"decode_time": 0.0, "process_time": 0.0, "encode_time": 0.0}
+        start_time = time.perf_counter()
+        window_start, window_frames = start_time, 0
+        frame_count = 0
+        try:
+            iterator = iter(source)
+            while True:
+                start = time.perf_counter()
+                frame = next(iterator, _END)
+                timings["decode_time"] += time.perf_counter() - start
+                if frame is _END:
+                    break
+                start = time.perf_counter()
+                result = self.process_fn(frame)
+                timings["process_time"] += time.perf_counter() - start
+                # 次のページを読む前に入力フレームを手放す
+                del frame
+                start = time.perf_counter()
+                sink.write(result)
+                timings["encode_time"] += time.perf_counter() - start
+                del result
+                frame_count += 1
+                window_frames += 1
+                if progress_callback and window_frames >= progress_interval:
+                    now = time.perf_counter()
+                    progress_callback(frame_count, window_frames / (now - window_start))
+                    window_start, window_frames = now, 0
+        finally:
+            sink.close()
+        elapsed = time.perf_counter() - start_time
+        stats = {"frames": frame_count, "elapsed": elapsed, "fps": frame_count / elapsed if elapsed > 0 else 0.0}
+        stats.update(timings)
+        return stats
+
+
+def process_multi_frame(input_path: str, output_path: str, process_fn: Callable[[np.ndarray], np.ndarray],
+                        progress_callback: Optional[Callable[[int, float], None]] = None,
+                        progress_interval: int = 10) -> Dict[str, float]:
+    """
+    マルチページTIFF・アニメーションGIFを1ページずつ処理して書き出す（ピークメモリは2ページ分）
+    出力形式は output_path の拡張子で決まる（.tif/.tiff ならマルチページTIFF、.gif ならアニメーションGIF）
+    """
+    source = MultiFrameImageSource(input_path)
+    sink = open_frame_sink(output_path, source.fps, source)
+    return StreamPipeline(process_fn, queue_size=0).run(source, sink, progress_callback, progress_interval)
+
+
+def main():
+    """コマンドライン: 動画・連番画像にImageUtilsの調整を適用"""
+    parser = argparse.ArgumentParser(description="動画・連番画像のストリーミング処理")
+    parser.add_argument("input", help="入力動画、マルチページTIFF/GIF、または連番画像パターン（例: in/%%05d.png, in/*.png）")
+    parser.add_argument("output", help="出力動画、マルチページTIFF/GIF、または連番画像パターン（例: out/%%05d.png）")
+    parser.add_argument("--brightness", type=int, default=0)
+    parser.add_argument("--contrast", type=int, default=0)
+    parser.add_argument("--saturation", type=int, default=0)
+    parser.add_argument("--gamma", type=float, default=1.0)
+    parser.add_argument("--blur", type=int, default=0)
+    parser.add_argument("--fps", type=float, default=30.0, help="連番画像入力時のフレームレート")
+    parser.add_argument("--queue-size", type=int, default=None,
+                        help="段間キューの長さ（既定: 動画・連番は8、マルチページ入力は0 = 1ページずつ順に処理）")
+    args = parser.parse_args()
+
+    source = open_frame_source(args.input, args.fps)
+    sink = open_frame_sink(args.output, source.fps, source)
+    queue_size = args.queue_size
+    if queue_size is None:
+        queue_size = 0 if isinstance(source, MultiFrameImageSource) else 8
+    pipeline = StreamPipeline(
+        make_adjustment_processor(args.brightness, args.contrast, args.saturation, args.gamma, args.blur),
+        queue_size=queue_size
+    )
+    stats = pipeline.run(
+        source, sink,
+        progress_callback=lambda frames, fps: print(f"🎞️ {frames} フレーム処理済み ({fps:.1f} fps)")
+    )
+    print(f"✅ 完了: {stats['frames']} フレーム, {stats['elapsed']:.1f} 秒, 平均 {stats['fps']:.1f} fps")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,19 @@
-class TabLayout:
-    def __init__(self, *args, **kwargs):
-        pass
+import customtkinter as ctk
+
+
+class TabLayout(ctk.CTkFrame):
+    """
+    タブモードのレイアウト
+    tabview（CTkTabview）にプラグインの配置先タブを追加して使う。
+    font_mgr / style_mgr は他のレイアウトと同じ引数で生成できるよう受け取って保持する
+    """
+    def __init__(self, master=None, font_mgr=None, style_mgr=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.font_mgr = font_mgr
+        self.style_mgr = style_mgr
+        self.tabview = ctk.CTkTabview(self)
+        self.tabview.pack(expand=True, fill="both", padx=5, pady=5)
+
+    def get_content_frame(self, tab_name=None):
+        """指定タブ（省略時は表示中のタブ）の中身を配置するフレーム"""
+        return self.tabview.tab(tab_name or self.tabview.get())
@@ -1,7 +1,12 @@
 # ImageAnalysisPluginダミー実装
+from image_toolkit.core.analysis_engine import AnalysisEngine
+
+
 class ImageAnalysisPlugin:
     def __init__(self):
         self.name = "image_analysis"
+        # 各コールバックから共通で使う解析エンジン（同じ画像の中間データを共有）
+        self.engine = AnalysisEngine()
         self.histogram_callback = None
         self.feature_callback = None
         self.frequency_callback = None
@@ -28,6 +33,13 @@ class ImageAnalysisPlugin:
         label = ctk.CTkLabel(parent, text="画像解析プラグイン（テスト表示）", fg_color="orange")
         label.pack(fill="x", padx=5, pady=5)
 
+    def analyze(self, image, metrics=None, version=None, full_resolution=False):
+        """
+        解析指標をまとめて計算（histogram, sharpness, noise, frequency, features）
+        コールバック側はこの結果を表示に使う。version には画像の更新ごとに変わる値を渡す
+        """
+        return self.engine.analyze(image, metrics, version, full_resolution)
+
     def set_histogram_callback(self, func):
         self.histogram_callback = func
 
@@ -5,24 +5,29 @@
 ガンマ補正、シャドウ/ハイライト調整、色温度調整を提供
 """
 
+import importlib.util
+
 import numpy as np
 import cv2
 from PIL import Image
 import customtkinter as ctk
-from typing import Dict, Any, Union
+from typing import Dict, Any, Optional, Union
 
-from image_toolkit.core.plugin_base import ImageProcessorPlugin, PluginUIHelper
+from image_toolkit.core.plugin_base import ImageProcessorPlugin, PluginUIHelper, write_to_out
 
-# カーブエディタのインポート
-try:
-    from image_toolkit.ui.curve_editor import CurveEditor
-    CURVE_EDITOR_AVAILABLE = True
-except ImportError as e:
-    print(f"⚠️ カーブエディタインポート警告: {e}")
-    CURVE_EDITOR_AVAILABLE = False
+# カーブエディタ（scipyに依存）はカーブ方式が初めて選ばれた時にインポート・生成する
+# （処理だけ使う場合やスライダー方式のままの場合は読み込まない）
 
 
 class DensityAdjustmentPlugin(ImageProcessorPlugin):
+    supports_float = True
+    # 画素ごとのNumPy演算のみ（GILを解放し、近傍を参照しない）。カーブのLUTは params に含まれないため pure ではない
+    gil_bound = False
+    tileable = True
+    tile_halo = 0
+    pure = False
+    cost_per_megapixel = 0.08
+
     def reset_parameters(self) -> None:
         """濃度調整の全パラメータ・UIを初期値にリセット"""
         self.gamma_value = 1.0
@@ -38,7 +43,7 @@ class DensityAdjustmentPlugin(ImageProcessorPlugin):
         if hasattr(self, 'gamma_mode_var'):
             self.gamma_mode_var.set("slider")
             self._on_gamma_mode_change()
-        if CURVE_EDITOR_AVAILABLE and hasattr(self, 'curve_editor'):
+        if self.curve_editor is not None and self.curve_editor.winfo_exists():
             self.curve_editor._reset_curve()
         if 'gamma' in self._sliders:
             self._sliders['gamma'].set(1.0)
@@ -96,14 +101,35 @@ class DensityAdjustmentPlugin(ImageProcessorPlugin):
             self.use_curve_gamma = False
             self.gamma_lut = None
             self.gamma_slider_frame.pack(fill="x", padx=5, pady=5)
-            if hasattr(self, 'gamma_curve_frame'):
+            if self.gamma_curve_frame is not None:
                 self.gamma_curve_frame.pack_forget()
-        elif mode == "curve" and hasattr(self, 'gamma_curve_frame'):
+        elif mode == "curve" and self._ensure_curve_frame():
             self.use_curve_gamma = True
             self.gamma_slider_frame.pack_forget()
             self.gamma_curve_frame.pack(fill="x", padx=5, pady=5)
         self._on_parameter_change()
 
+    def _ensure_curve_frame(self) -> bool:
+        """カーブエディタの枠を必要になった時点で生成（生成できなければスライダー方式に戻して False）"""
+        # レイアウト切り替えで破棄された枠は作り直す
+        if self.gamma_curve_frame is not None and self.gamma_curve_frame.winfo_exists():
+            return True
+        try:
+            from image_toolkit.ui.curve_editor import CurveEditor
+        except ImportError as e:
+            print(f"⚠️ カーブエディタインポート警告: {e}")
+            self.gamma_mode_var.set("slider")
+            return False
+        self.gamma_curve_frame = ctk.CTkFrame(self.gamma_control_frame)
+        self.curve_editor = CurveEditor(
+            self.gamma_curve_frame, 
+            width=250, 
+            height=250,
+            on_curve_change=self._on_curve_change
+        )
+        self.curve_editor.pack(padx=5, pady=5)
+        return True
+
     def _on_gamma_change(self, value: float) -> None:
         self.gamma_value = float(value)
         print(f"[DEBUG] gamma_value changed: {self.gamma_value}")
@@ -143,8 +169,10 @@ class DensityAdjustmentPlugin(ImageProcessorPlugin):
         self.use_curve_gamma = False
         self.gamma_lut = None
         self.applied_binary = False
-        print("[DEBUG] CurveEditor生成済み")
         self.applied_histogram = False
+        # カーブエディタの枠（カーブ方式を最初に選んだ時に生成）
+        self.gamma_curve_frame = None
+        self.curve_editor = None
 
     def get_display_name(self) -> str:
         return "濃度調整"
@@ -155,11 +183,13 @@ class DensityAdjustmentPlugin(ImageProcessorPlugin):
     def create_ui(self, parent: ctk.CTkFrame) -> None:
         """濃度調整UIを作成（完全移植）"""
         from image_toolkit.core.plugin_base import PluginUIHelper
-        try:
-            from image_toolkit.ui.curve_editor import CurveEditor
-            CURVE_EDITOR_AVAILABLE = True
-        except ImportError:
-            CURVE_EDITOR_AVAILABLE = False
+        # カーブエディタ本体はここでは作らず、依存パッケージの有無だけを確認（インポートしない）
+        CURVE_EDITOR_AVAILABLE = importlib.util.find_spec("scipy") is not None
+        # create_ui はレイアウト切り替えのたびに新しい親で呼ばれるため、前回のカーブエディタは使わない
+        self.gamma_curve_frame = None
+        self.curve_editor = None
+        self.use_curve_gamma = False
+        self.gamma_lut = None
 
         # テスト用ラベル（最低限のUI表示確認）
         test_label = ctk.CTkLabel(parent, text="濃度調整UI（テスト表示）", fg_color="yellow")
@@ -200,17 +230,6 @@ class DensityAdjustmentPlugin(ImageProcessorPlugin):
             command=self._on_gamma_change,
             value_format="{:.2f}"
         )
-        if CURVE_EDITOR_AVAILABLE:
-            self.gamma_curve_frame = ctk.CTkFrame(self.gamma_control_frame)
-            self.curve_editor = CurveEditor(
-                self.gamma_curve_frame, 
-                width=250, 
-                height=250,
-                on_curve_change=self._on_curve_change
-            )
-            self.curve_editor.pack(padx=5, pady=5)
-            print("[DEBUG] CurveEditor生成済み")
-
         self._sliders['shadow'], self._labels['shadow'] = PluginUIHelper.create_slider_with_label(
             parent=parent,
             text="シャドウ",
@@ -274,35 +293,7 @@ class DensityAdjustmentPlugin(ImageProcessorPlugin):
                 return image
 
             print(f"🔄 濃度調整開始...")
-            result_image = image.copy()
-
-            # NumPy配列に変換
-            img_array = np.array(result_image, dtype=np.float32)
-
-            # ガンマ補正
-            if self.use_curve_gamma and self.gamma_lut is not None:
-                print(f"🎯 カーブベースガンマ補正適用")
-                img_array_int = img_array.astype(np.uint8)
-                img_array = self.gamma_lut[img_array_int].astype(np.float32)
-            elif self.gamma_value != 1.0:
-                print(f"🎯 スライダーベースガンマ補正適用: {self.gamma_value}")
-                img_array = img_array / 255.0
-                img_array = np.power(img_array, 1.0 / self.gamma_value)
-                img_array = img_array * 255.0
-
-            # シャドウ/ハイライト調整
-            if self.shadow_value != 0 or self.highlight_value != 0:
-                print(f"🌗 シャドウ/ハイライト調整: シャドウ={self.shadow_value}, ハイライト={self.highlight_value}")
-                img_array = self._apply_shadow_highlight(img_array)
-
-            # 色温度調整
-            if self.temperature_value != 0:
-                print(f"🌡️ 色温度調整: {self.temperature_value}")
-                img_array = self._apply_temperature(img_array)
-
-            # 0-255の範囲にクリップ
-            img_array = np.clip(img_array, 0, 255).astype(np.uint8)
-            result_image = Image.fromarray(img_array)
+            result_image = Image.fromarray(self.process_array(np.asarray(image)))
 
             print(f"✅ 濃度調整完了")
             return result_image
@@ -311,31 +302,86 @@ class DensityAdjustmentPlugin(ImageProcessorPlugin):
             print(f"❌ 濃度調整エラー: {e}")
             return image
 
-    def _apply_shadow_highlight(self, img_array: np.ndarray) -> np.ndarray:
+    def process_array(self, array: np.ndarray, out: Optional[np.ndarray] = None, **params) -> np.ndarray:
+        """
+        濃度調整を配列に直接適用（PIL変換なし、out指定時はそこへ書き込む）
+        params に get_parameters() と同じキー（gamma, shadow, highlight, temperature）を渡すと現在値より優先する
+        """
+        img_array = self._adjust_float(array.astype(np.float32), params, source=array)
+
+        # 0-255の範囲にクリップして出力バッファへ量子化
+        np.clip(img_array, 0, 255, out=img_array)
+        if out is None:
+            out = np.empty(array.shape, dtype=np.uint8)
+        return write_to_out(img_array, out)
+
+    def process_float(self, array: np.ndarray, out: Optional[np.ndarray] = None, **params) -> np.ndarray:
+        """float作業バッファ上で濃度調整を適用（0〜255にクリップのみ、量子化しない）"""
+        img_array = out if out is not None else np.empty_like(array)
+        np.copyto(img_array, array)
+        img_array = self._adjust_float(img_array, params)
+        np.clip(img_array, 0, 255, out=img_array)
+        return write_to_out(img_array.astype(array.dtype, copy=False), out)
+
+    def _adjust_float(self, img_array: np.ndarray, params: Dict[str, Any],
+                      source: Optional[np.ndarray] = None) -> np.ndarray:
+        """ガンマ・シャドウ/ハイライト・色温度をfloat配列に適用（source はuint8の元配列）"""
+        gamma = params.get('gamma', self.gamma_value)
+        shadow = params.get('shadow', self.shadow_value)
+        highlight = params.get('highlight', self.highlight_value)
+        temperature = params.get('temperature', self.temperature_value)
+
+        # ガンマ補正
+        if self.use_curve_gamma and self.gamma_lut is not None:
+            print(f"🎯 カーブベースガンマ補正適用")
+            if source is not None:
+                img_array = self.gamma_lut[source].astype(np.float32)
+            else:
+                # 量子化されていない値はLUTを線形補間して参照
+                img_array = np.interp(img_array, np.arange(256), self.gamma_lut).astype(img_array.dtype)
+        elif gamma != 1.0:
+            print(f"🎯 スライダーベースガンマ補正適用: {gamma}")
+            img_array = img_array / 255.0
+            img_array = np.power(img_array, 1.0 / gamma)
+            img_array = img_array * 255.0
+
+        # シャドウ/ハイライト調整
+        if shadow != 0 or highlight != 0:
+            print(f"🌗 シャドウ/ハイライト調整: シャドウ={shadow}, ハイライト={highlight}")
+            img_array = self._apply_shadow_highlight(img_array, shadow, highlight)
+
+        # 色温度調整
+        if temperature != 0:
+            print(f"🌡️ 色温度調整: {temperature}")
+            img_array = self._apply_temperature(img_array, temperature)
+
+        return img_array
+
+    def _apply_shadow_highlight(self, img_array: np.ndarray, shadow: int, highlight: int) -> np.ndarray:
         """シャドウ/ハイライト調整を適用"""
         img_normalized = img_array / 255.0
-        if self.shadow_value != 0:
-            shadow_factor = self.shadow_value / 100.0
+        if shadow != 0:
+            shadow_factor = shadow / 100.0
             mask = img_normalized < 0.5
             img_normalized = np.where(mask,
                                     img_normalized + shadow_factor * (0.5 - img_normalized),
                                     img_normalized)
-        if self.highlight_value != 0:
-            highlight_factor = self.highlight_value / 100.0
+        if highlight != 0:
+            highlight_factor = highlight / 100.0
             mask = img_normalized > 0.5
             img_normalized = np.where(mask,
                                     img_normalized - highlight_factor * (img_normalized - 0.5),
                                     img_normalized)
         return img_normalized * 255.0
 
-    def _apply_temperature(self, img_array: np.ndarray) -> np.ndarray:
+    def _apply_temperature(self, img_array: np.ndarray, temperature: int) -> np.ndarray:
         """色温度調整を適用"""
-        if self.temperature_value > 0:
-            factor = self.temperature_value / 100.0
+        if temperature > 0:
+            factor = temperature / 100.0
             img_array[:, :, 0] = np.clip(img_array[:, :, 0] * (1.0 + factor * 0.3), 0, 255)
             img_array[:, :, 2] = np.clip(img_array[:, :, 2] * (1.0 - factor * 0.2), 0, 255)
         else:
-            factor = abs(self.temperature_value) / 100.0
+            factor = abs(temperature) / 100.0
             img_array[:, :, 0] = np.clip(img_array[:, :, 0] * (1.0 - factor * 0.2), 0, 255)
             img_array[:, :, 2] = np.clip(img_array[:, :, 2] * (1.0 + factor * 0.3), 0, 255)
         return img_array
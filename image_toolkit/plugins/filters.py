@@ -1,4 +1,7 @@
 # FilterProcessingPluginダミー実装
+from image_toolkit.core.morphology import DEFAULT_ENGINE, find_contours
+
+
 class FilterProcessingPlugin:
     def get_display_name(self):
         return "フィルター処理"
@@ -14,6 +17,8 @@ class FilterProcessingPlugin:
         # TODO: 必要に応じてパラメータを返す
         return {}
     def __init__(self):
+        # モルフォロジー演算エンジン（構造要素キャッシュ・大きな矩形カーネルの分解）
+        self.morphology = DEFAULT_ENGINE
         self.parameter_change_callback = None
         self.special_filter_callback = None
         self.morphology_callback = None
@@ -22,6 +27,17 @@ class FilterProcessingPlugin:
         self.undo_morphology_callback = None
         self.undo_contour_callback = None
 
+    def apply_morphology(self, image, operation, shape="rect", size=3, iterations=1):
+        """
+        モルフォロジー演算を配列に適用
+        operation: erode, dilate, open, close, tophat, blackhat, gradient / shape: rect, ellipse, cross
+        """
+        return self.morphology.apply(image, operation, shape, size, iterations)
+
+    def extract_contours(self, image, threshold=None, external_only=True, min_area=0.0):
+        """輪郭を抽出し、輪郭ごとの統計（面積・周囲長・外接矩形・重心の配列）を返す"""
+        return find_contours(image, threshold, external_only, min_area)
+
     def set_parameter_change_callback(self, func):
         self.parameter_change_callback = func
 
@@ -0,0 +1,50 @@
+"""
+キャンバス画像表示サーフェス
+キャンバスごとにPhotoImageを1つ保持し、同じサイズの更新はpaste()で画素を書き換える
+"""
+
+from typing import Optional, Tuple
+
+from PIL import Image, ImageTk
+
+
+class CanvasImageSurface:
+    """
+    キャンバス上の表示画像を管理するクラス
+    表示サイズが変わらない限りPhotoImageとキャンバスアイテムを再利用し、
+    スライダー操作ごとのPhotoImage再生成とTkへの再登録を避ける
+    """
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self._photo: Optional[ImageTk.PhotoImage] = None
+        self._photo_size: Optional[Tuple[int, int]] = None
+        self._item = None
+        self._center: Optional[Tuple[int, int]] = None
+
+    def show(self, display_image: Image.Image, canvas_width: int, canvas_height: int) -> None:
+        """表示用にリサイズ済みの画像をキャンバス中央に表示"""
+        center = (canvas_width // 2, canvas_height // 2)
+
+        if self._photo is not None and self._photo_size == display_image.size:
+            # 同じサイズなら既存のPhotoImageに画素を書き込むだけ
+            self._photo.paste(display_image)
+        else:
+            self._photo = ImageTk.PhotoImage(display_image)
+            self._photo_size = display_image.size
+            if self._item is not None:
+                self.canvas.itemconfigure(self._item, image=self._photo)
+
+        if self._item is None:
+            self._item = self.canvas.create_image(center[0], center[1], image=self._photo)
+        elif center != self._center:
+            self.canvas.coords(self._item, center[0], center[1])
+        self._center = center
+
+    def clear(self) -> None:
+        """表示を消去してPhotoImageを解放"""
+        if self._item is not None:
+            self.canvas.delete(self._item)
+        self._item = None
+        self._photo = None
+        self._photo_size = None
+        self._center = None
@@ -58,11 +58,20 @@ setup(
         "pandas>=2.0.0",
         "setuptools>=60.0.0"
     ],
+    extras_require={
+        # 結果ストア（image-quality / image-barcode の --store）のParquet保存
+        "store": ["pyarrow>=10.0.0"],
+    },
     entry_points={
         "console_scripts": [
             "imagegui=image_toolkit.apps.gui_basic:main",
             "imagegui-extended=image_toolkit.apps.gui_extended:main",
-            "image-processor=image_toolkit.apps.gui_image_processor:main"
+            "image-processor=image_toolkit.apps.gui_image_processor:main",
+            "image-stream=image_toolkit.core.video_stream:main",
+            "image-preset=image_toolkit.core.presets:main",
+            "image-quality=image_toolkit.core.quality_scoring:main",
+            "image-barcode=image_toolkit.core.barcode_pipeline:main",
+            "image-dedupe=image_toolkit.core.duplicate_finder:main"
         ]
     },
     python_requires=">=3.7",
@@ -0,0 +1,91 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+# AnalysisEngine のキャッシュキー（全画素のCRC）と、別スレッドからの evict との競合の検証
+
+import threading
+
+import numpy as np
+
+from image_toolkit.core.analysis_engine import AnalysisEngine
+
+
+def test_small_edit_is_not_served_from_cache():
+    engine = AnalysisEngine()
+    image = np.zeros((300, 400, 3), np.uint8)
+    before = engine.analyze(image, ["histogram"])["histogram"]
+    edited = image.copy()
+    # 間引きサンプルの格子から外れる1画素だけを変更する
+    edited[3, 5] = 200
+    after = engine.analyze(edited, ["histogram"])["histogram"]
+    assert after is not before
+    assert len(engine._entries) == 2
+
+
+def test_concurrent_analyze_and_evict():
+    engine = AnalysisEngine(max_entries=4)
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, (64, 64, 3), dtype=np.uint8) for _ in range(8)]
+    errors = []
+
+    def analyze():
+        try:
+            for _ in range(20):
+                for image in images:
+                    engine.analyze(image, ["histogram"])
+        except Exception as error:
+            errors.append(error)
+
+    def evict():
+        try:
+            for _ in range(500):
+                engine.evict(0)
+                engine.total_bytes()
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=analyze), threading.Thread(target=analyze), threading.Thread(target=evict)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def test_memory_accounting_while_metrics_are_filled():
+    # 同じバージョンに指標が追加されている間に、メモリ管理が別スレッドから合計・解放を行う
+    engine = AnalysisEngine(proxy_max_side=None)
+    rng = np.random.default_rng(1)
+    images = [rng.integers(0, 256, (96, 128, 3), dtype=np.uint8) for _ in range(6)]
+    errors = []
+    done = threading.Event()
+
+    def analyze():
+        try:
+            for image in images:
+                for metric in ("histogram", "sharpness", "noise", "frequency", "features"):
+                    engine.analyze(image, [metric])
+        except Exception as error:
+            errors.append(error)
+
+    def account():
+        try:
+            while not done.is_set():
+                engine.total_bytes()
+                engine.evict(10 ** 9)
+        except Exception as error:
+            errors.append(error)
+
+    accountant = threading.Thread(target=account)
+    accountant.start()
+    workers = [threading.Thread(target=analyze) for _ in range(3)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    done.set()
+    accountant.join()
+    assert errors == []
+    report = engine.analyze(images[-1])
+    assert set(report) >= {"histogram", "sharpness", "noise", "frequency", "features"}
@@ -0,0 +1,85 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+# BlurEngine と cv2.GaussianBlur の結果一致（直接経路）・誤差上限（ボックス/縮小経路）の検証
+
+import cv2
+import numpy as np
+import pytest
+
+from image_toolkit.core.blur_engine import BlurEngine, box_widths_for_gaussian, kernel_size_to_sigma
+
+
+def _errors(result, exact):
+    error = np.abs(result.astype(np.int16) - exact.astype(np.int16))
+    return int(error.max()), float(error.mean())
+
+
+@pytest.fixture(scope="module")
+def image():
+    return BlurEngine._test_image((300, 450), seed=0)
+
+
+@pytest.mark.parametrize("sigma", [0.5, 1.0, 2.5, 6.0])
+def test_direct_matches_opencv(image, sigma):
+    engine = BlurEngine()
+    assert engine.choose_method(sigma) == "direct"
+    np.testing.assert_array_equal(engine.blur(image, sigma), cv2.GaussianBlur(image, (0, 0), sigma))
+
+
+@pytest.mark.parametrize("kernel_size", [3, 5, 9, 15, 31])
+def test_small_kernel_size_matches_opencv(image, kernel_size):
+    engine = BlurEngine()
+    assert engine.choose_method(kernel_size_to_sigma(kernel_size)) == "direct"
+    np.testing.assert_array_equal(engine.blur_kernel_size(image, kernel_size),
+                                  cv2.GaussianBlur(image, (kernel_size, kernel_size), 0))
+
+
+@pytest.mark.parametrize("sigma", [6.5, 9, 16, 31])
+def test_box_within_error_bound(image, sigma):
+    engine = BlurEngine()
+    assert engine.choose_method(sigma) == "box"
+    max_error, mean_error = _errors(engine.blur(image, sigma), cv2.GaussianBlur(image, (0, 0), sigma))
+    assert max_error <= engine.max_error
+    assert mean_error <= 0.5
+
+
+@pytest.mark.parametrize("size", [(300, 450), (301, 449), (257, 383)])
+@pytest.mark.parametrize("sigma", [32, 48, 64, 96])
+def test_downsample_within_max_error(size, sigma):
+    # 縮小率で割り切れない大きさや、σが画像に対して大きい場合も端を含めて上限内に収まる
+    engine = BlurEngine()
+    image = BlurEngine._test_image(size, seed=3)
+    assert engine.choose_method(sigma) == "downsample"
+    max_error, _ = _errors(engine.blur(image, sigma), cv2.GaussianBlur(image, (0, 0), sigma))
+    assert max_error <= engine.max_error
+
+
+@pytest.mark.parametrize("size", [(600, 900), (601, 899)])
+@pytest.mark.parametrize("sigma", [32, 96])
+def test_downsample_within_mean_error(size, sigma):
+    engine = BlurEngine()
+    image = BlurEngine._test_image(size, seed=3)
+    _, mean_error = _errors(engine.blur(image, sigma), cv2.GaussianBlur(image, (0, 0), sigma))
+    assert mean_error <= 0.5
+
+
+@pytest.mark.parametrize("method", ["box", "downsample"])
+def test_preserves_shape_and_dtype(method):
+    engine = BlurEngine()
+    gray = BlurEngine._test_image((120, 90), seed=1)[:, :, 0].copy()
+    for image in (gray, gray.astype(np.float32)):
+        result = engine.blur(image, 40, method)
+        assert result.shape == image.shape
+        assert result.dtype == image.dtype
+        exact = cv2.GaussianBlur(image, (0, 0), 40)
+        assert np.abs(result.astype(np.float32) - exact.astype(np.float32)).max() <= engine.max_error
+
+
+@pytest.mark.parametrize("sigma", [1.0, 4.0, 12.0, 40.0])
+def test_box_widths_match_gaussian_variance(sigma):
+    widths = box_widths_for_gaussian(sigma)
+    assert all(width % 2 == 1 for width in widths)
+    variance = sum((width * width - 1) / 12.0 for width in widths)
+    assert abs(variance - sigma * sigma) <= (max(widths) + 1) ** 2 / 12.0
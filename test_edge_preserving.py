@@ -0,0 +1,72 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+# EdgePreservingSmoother と cv2.bilateralFilter の対応、ガイデッドフィルタの参照実装との一致、
+# メモリ予算超過時の帯分割と一括処理の一致の検証
+
+import cv2
+import numpy as np
+import pytest
+
+from image_toolkit.core.edge_preserving import QUALITY_SUBSAMPLE, EdgePreservingSmoother, guided_filter
+from image_toolkit.core.memory_accountant import get_memory_accountant
+
+
+@pytest.fixture(scope="module")
+def image():
+    return EdgePreservingSmoother._test_image((240, 330), seed=0)
+
+
+def _reference_guided_filter(image, radius, eps):
+    """float64・積分画像による自己ガイドのガイデッドフィルタ（境界は BORDER_REFLECT_101 と同じ折り返し）"""
+    def box(values):
+        padded = np.pad(values, [(radius, radius), (radius, radius)] + [(0, 0)] * (values.ndim - 2), mode="reflect")
+        integral = np.pad(padded.cumsum(0).cumsum(1), [(1, 0), (1, 0)] + [(0, 0)] * (values.ndim - 2))
+        size = 2 * radius + 1
+        total = integral[size:, size:] - integral[:-size, size:] - integral[size:, :-size] + integral[:-size, :-size]
+        return total / (size * size)
+
+    source = image.astype(np.float64)
+    mean = box(source)
+    variance = np.maximum(box(source * source) - mean * mean, 0)
+    coefficient_a = variance / (variance + eps)
+    coefficient_b = mean - coefficient_a * mean
+    return box(coefficient_a) * source + box(coefficient_b)
+
+
+@pytest.mark.parametrize("quality,diameter", [("exact", 9), ("exact", 15), ("auto", 3), ("auto", 5)])
+def test_bilateral_paths_match_opencv(image, quality, diameter):
+    result = EdgePreservingSmoother(quality=quality).smooth(image, diameter, 80)
+    np.testing.assert_array_equal(result, cv2.bilateralFilter(image, diameter, 80, 80))
+
+
+@pytest.mark.parametrize("radius", [2, 5, 7])
+def test_guided_filter_matches_reference(image, radius):
+    eps = 40.0 ** 2
+    expected = np.clip(np.rint(_reference_guided_filter(image, radius, eps)), 0, 255)
+    result = guided_filter(image, radius, eps)
+    assert np.abs(result.astype(np.int16) - expected.astype(np.int16)).max() <= 1
+
+
+@pytest.mark.parametrize("quality", list(QUALITY_SUBSAMPLE))
+@pytest.mark.parametrize("diameter", [11, 15])
+def test_guided_approximates_bilateral(quality, diameter):
+    # 箱型の窓と ε による近似のため一致はしないが、差の平均・99パーセンタイルは一定以内に収まる
+    image = EdgePreservingSmoother._test_image((600, 900), seed=0)
+    result = EdgePreservingSmoother().smooth(image, diameter, 80, quality)
+    error = np.abs(result.astype(np.int16) - cv2.bilateralFilter(image, diameter, 80, 80).astype(np.int16))
+    assert error.mean() <= 4.0
+    assert np.percentile(error, 99) <= 32
+
+
+@pytest.mark.parametrize("quality,diameter", [("high", 11), ("balanced", 11), ("fast", 15), ("fast", 21)])
+@pytest.mark.parametrize("height", [240, 241, 250])
+def test_tiled_matches_untiled(monkeypatch, quality, diameter, height):
+    image = EdgePreservingSmoother._test_image((height, 330), seed=1)
+    engine = EdgePreservingSmoother()
+    expected = engine.smooth(image, diameter, 80, quality)
+    # 予算を使い切った状態にして、帯に分割した実行へ切り替える
+    monkeypatch.setattr(get_memory_accountant(), "budget_bytes", 1)
+    result = engine.smooth(image, diameter, 80, quality)
+    np.testing.assert_array_equal(result, expected)
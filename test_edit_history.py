@@ -0,0 +1,96 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+# EditHistory の再生成・キーフレーム間隔・キーフレーム保護・メモリ解放の下限・別スレッドからの解放の検証
+
+import threading
+
+import numpy as np
+import pytest
+
+from image_toolkit.core.edit_history import EditHistory
+
+
+def _add(image, amount):
+    return (image.astype(np.int16) + amount).clip(0, 255).astype(np.uint8)
+
+
+def _history(steps, **kwargs):
+    history = EditHistory(np.zeros((8, 8, 3), np.uint8), **kwargs)
+    for amount in range(1, steps + 1):
+        history.push_edit(f"add{amount}", {"amount": 1}, _add)
+    return history
+
+
+def test_undo_redo_regenerates_states():
+    history = _history(6, keyframe_interval=3)
+    for expected in range(5, -1, -1):
+        assert history.undo()[0, 0, 0] == expected
+    assert history.undo() is None
+    assert history.redo()[0, 0, 0] == 1
+
+
+def test_returned_keyframe_cannot_corrupt_history():
+    history = _history(2)
+    current = history.current()
+    with pytest.raises(ValueError):
+        current[...] = 255
+    assert history.current()[0, 0, 0] == 2
+
+
+def test_keyframe_spacing_survives_dropping_old_steps():
+    history = _history(10, keyframe_interval=4, max_steps=7)
+    # 3ステップを焼き込み後も、最初の記録からの通し番号で 4, 8 番目と最新がキーフレームになる
+    assert sorted(history._keyframes) == [0, 1, 5, 7]
+    assert history.current()[0, 0, 0] == 10
+    assert history.image_at(0)[0, 0, 0] == 3
+
+
+def test_evict_keeps_parameter_steps():
+    # メモリ不足でもパラメータだけのステップは残り、すべて元に戻せる
+    history = _history(6, keyframe_interval=2)
+    history.evict(0)
+    assert sorted(history._keyframes) == [0, 6]
+    assert len(history.get_step_names()) == 6
+    for expected in range(5, -1, -1):
+        assert history.undo()[0, 0, 0] == expected
+
+
+def test_evict_bakes_only_leading_destructive_diffs():
+    history = EditHistory(np.zeros((8, 8, 3), np.uint8))
+    noise = np.random.default_rng(0).integers(0, 256, (8, 8, 3), dtype=np.uint8)
+    history.push_destructive("paint1", noise, {"brush": 1})
+    history.push_destructive("paint2", 255 - noise, {"brush": 2})
+    history.push_edit("add", {"amount": 1}, _add)
+    history.push_destructive("paint3", noise, {"brush": 3})
+    history.evict(0)
+    # 先頭の2つだけが状態0に焼き込まれ、パラメータのステップとその後の差分は残る
+    assert history.get_step_names() == ["add", "paint3"]
+    assert history.params_at(0) == {"brush": 2}
+    np.testing.assert_array_equal(history.image_at(0), 255 - noise)
+    np.testing.assert_array_equal(history.undo(), _add(255 - noise, 1))
+    np.testing.assert_array_equal(history.redo(), noise)
+
+
+def test_concurrent_evict_keeps_history_consistent():
+    # メモリ管理の relieve() は別スレッドから evict() を呼ぶ
+    history = EditHistory(np.zeros((64, 64, 3), np.uint8), keyframe_interval=2)
+    errors = []
+
+    def evict():
+        try:
+            for _ in range(300):
+                history.evict(0)
+        except Exception as error:
+            errors.append(error)
+
+    thread = threading.Thread(target=evict)
+    thread.start()
+    try:
+        for amount in range(1, 201):
+            history.push_edit(f"add{amount}", {"amount": 1}, _add)
+            assert history.current()[0, 0, 0] == min(amount, 255)
+    finally:
+        thread.join()
+    assert errors == []
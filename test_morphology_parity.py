@@ -0,0 +1,80 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+# MorphologyEngine と cv2.erode / cv2.dilate / cv2.morphologyEx の結果一致の検証
+
+import cv2
+import numpy as np
+import pytest
+
+from image_toolkit.core.morphology import MorphologyEngine, contour_stats, find_contours
+
+_CV_OPERATIONS = {
+    "open": cv2.MORPH_OPEN,
+    "close": cv2.MORPH_CLOSE,
+    "gradient": cv2.MORPH_GRADIENT,
+    "tophat": cv2.MORPH_TOPHAT,
+    "blackhat": cv2.MORPH_BLACKHAT,
+}
+_CV_SHAPES = {"rect": cv2.MORPH_RECT, "ellipse": cv2.MORPH_ELLIPSE, "cross": cv2.MORPH_CROSS}
+
+
+def _test_image(height=120, width=150, channels=3, seed=0):
+    rng = np.random.default_rng(seed)
+    shape = (height, width, channels) if channels else (height, width)
+    # 一様ノイズでは大きなカーネルの収縮が全面0になり差が出ないため、ぼかして階調を持たせる
+    return cv2.GaussianBlur((rng.random(shape) * 255).astype(np.uint8), (0, 0), 3)
+
+
+def _reference(image, operation, shape, size, iterations):
+    kernel = cv2.getStructuringElement(_CV_SHAPES[shape], size)
+    if operation == "erode":
+        return cv2.erode(image, kernel, iterations=iterations)
+    if operation == "dilate":
+        return cv2.dilate(image, kernel, iterations=iterations)
+    return cv2.morphologyEx(image, _CV_OPERATIONS[operation], kernel, iterations=iterations)
+
+
+@pytest.mark.parametrize("operation", ["erode", "dilate", "open", "close", "gradient", "tophat", "blackhat"])
+@pytest.mark.parametrize("size,iterations", [
+    ((3, 3), 1), ((4, 4), 2), ((6, 3), 2), ((8, 8), 3), ((3, 5), 2), ((5, 5), 3), ((2, 7), 1),
+])
+@pytest.mark.parametrize("decompose_threshold", [301, 2])
+def test_rect_matches_opencv(operation, size, iterations, decompose_threshold):
+    # decompose_threshold=2 では全ての矩形が2点カーネル分解の経路を通る
+    image = _test_image()
+    engine = MorphologyEngine(decompose_threshold=decompose_threshold)
+    result = engine.apply(image, operation, "rect", size, iterations)
+    np.testing.assert_array_equal(result, _reference(image, operation, "rect", size, iterations))
+
+
+@pytest.mark.parametrize("shape", ["ellipse", "cross"])
+@pytest.mark.parametrize("size,iterations", [((5, 5), 1), ((4, 6), 2)])
+def test_other_shapes_match_opencv(shape, size, iterations):
+    image = _test_image(channels=0)
+    result = MorphologyEngine().apply(image, "close", shape, size, iterations)
+    np.testing.assert_array_equal(result, _reference(image, "close", shape, size, iterations))
+
+
+def test_large_rect_decomposition_matches_opencv():
+    image = _test_image(400, 500)
+    engine = MorphologyEngine()
+    for length in (engine.decompose_threshold, engine.decompose_threshold + 1):
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (length, 7))
+        np.testing.assert_array_equal(engine.erode(image, "rect", (length, 7)), cv2.erode(image, kernel))
+
+
+def test_contour_stats_match_opencv():
+    image = np.zeros((200, 200), np.uint8)
+    cv2.rectangle(image, (10, 10), (60, 40), 255, -1)
+    cv2.circle(image, (130, 120), 35, 255, -1)
+    cv2.line(image, (20, 150), (80, 190), 255, 1)
+    stats = find_contours(image, threshold=127)
+    contours, _ = cv2.findContours((image > 127).astype(np.uint8) * 255, cv2.RETR_EXTERNAL,
+                                   cv2.CHAIN_APPROX_SIMPLE)
+    reference = contour_stats(contours)
+    assert len(stats) == len(contours)
+    np.testing.assert_allclose(reference.area, [cv2.contourArea(c) for c in contours])
+    np.testing.assert_allclose(reference.perimeter, [cv2.arcLength(c, True) for c in contours])
+    np.testing.assert_array_equal(reference.bbox, [cv2.boundingRect(c) for c in contours])
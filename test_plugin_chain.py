@@ -0,0 +1,46 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+# PluginChain と process_array / process_float の結果一致の検証
+
+import numpy as np
+
+from image_toolkit.core.plugin_base import ImageProcessorPlugin, PluginChain, write_to_out
+
+
+class _InvertPlugin(ImageProcessorPlugin):
+    """process_array のみ実装したプラグイン（supports_float = False）"""
+    def __init__(self):
+        super().__init__("invert")
+    def get_display_name(self):
+        return "反転"
+    def get_description(self):
+        return "テスト用"
+    def create_ui(self, parent):
+        pass
+    def process_image(self, image, **params):
+        return image
+    def process_array(self, array, out=None, **params):
+        return write_to_out(255 - array, out)
+
+
+def _image(seed=0):
+    return (np.random.default_rng(seed).random((16, 20, 3)) * 255).astype(np.uint8)
+
+
+def test_default_process_float_falls_back_to_process_array():
+    image = _image()
+    plugin = _InvertPlugin()
+    working = image.astype(np.float32) + np.float32(0.25)
+    result = plugin.process_float(working)
+    assert result.dtype == np.float32
+    np.testing.assert_array_equal(result, (255 - image).astype(np.float32))
+
+
+def test_float_chain_with_non_float_plugin_matches_uint8_chain():
+    image = _image(1)
+    plugins = [_InvertPlugin(), _InvertPlugin()]
+    expected = PluginChain(plugins).run(image).copy()
+    np.testing.assert_array_equal(PluginChain(plugins, float_dtype=np.float32).run(image), expected)
+    np.testing.assert_array_equal(expected, image)
@@ -0,0 +1,42 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+# PluginScheduler の実行方法（インライン・スレッド・プロセス）ごとの結果一致と、ワーカーの起動方法の検証
+
+import numpy as np
+
+from image_toolkit.core.plugin_base import ImageProcessorPlugin, write_to_out
+from image_toolkit.core.plugin_scheduler import PluginScheduler
+
+
+class _OffsetPlugin(ImageProcessorPlugin):
+    """GILを保持する純粋な処理として宣言したテスト用プラグイン（プロセスで実行される）"""
+    gil_bound = True
+    pure = True
+    tileable = True
+    cost_per_megapixel = 100.0
+
+    def __init__(self):
+        super().__init__("offset")
+    def get_display_name(self):
+        return "オフセット"
+    def get_description(self):
+        return "テスト用"
+    def create_ui(self, parent):
+        pass
+    def process_image(self, image, **params):
+        return image
+    def process_array(self, array, out=None, amount=10, **params):
+        return write_to_out(np.clip(array.astype(np.int16) + amount, 0, 255).astype(np.uint8), out)
+
+
+def test_process_mode_uses_spawn_and_matches_inline():
+    image = (np.random.default_rng(0).random((256, 96, 3)) * 255).astype(np.uint8)
+    plugin = _OffsetPlugin()
+    params = {"offset": {"amount": 30}}
+    with PluginScheduler(max_processes=2) as scheduler:
+        assert scheduler.mp_context.get_start_method() == "spawn"
+        assert scheduler.choose_mode(plugin, image.shape) == "process"
+        result = scheduler.run([plugin], image, params)
+    np.testing.assert_array_equal(result, plugin.process_array(image, amount=30))
@@ -0,0 +1,148 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+# CompiledPreset と ImageProcessorApp の処理結果の一致の検証
+# （GUIは CompiledPreset を使うため、プログレッシブ経路を含めて同じ結果になること、
+#   および主要な処理タイプが従来のPIL/OpenCVによる逐次処理と同じ結果になることを確認する）
+
+import itertools
+import time
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image, ImageEnhance, ImageFilter
+
+from apps.gui_image_processor import ImageProcessorApp
+from image_toolkit.core.plugin_base import PluginManager
+from image_toolkit.core.presets import PROCESS_TYPES, ProcessingPreset
+from image_toolkit.core.progressive_denoise import ProgressiveDenoiser
+
+_PARAMS = list(itertools.product([0.5, 1.0, 1.3], [0.8, 1.6], [0.4, 1.7]))
+
+
+@pytest.fixture(scope="module")
+def image():
+    rng = np.random.default_rng(0)
+    return Image.fromarray(cv2.GaussianBlur((rng.random((60, 80, 3)) * 255).astype(np.uint8), (0, 0), 1.5))
+
+
+@pytest.fixture
+def app():
+    # Tkのウィンドウを作らずに処理メソッドだけを使う
+    app = object.__new__(ImageProcessorApp)
+    app.denoiser = ProgressiveDenoiser()
+    app._compiled_preset = None
+    app._compiled_key = None
+    app.plugin_settings = {}
+    app.plugin_manager = PluginManager()
+    app.plugin_manager.discover()
+    app.schedule_denoise_poll = lambda: None
+    yield app
+    app.denoiser.close()
+
+
+def _preset(process_type, brightness, contrast, saturation):
+    return ProcessingPreset("test", process_type,
+                            {"brightness": brightness, "contrast": contrast, "saturation": saturation}).compile()
+
+
+@pytest.mark.parametrize("process_type", PROCESS_TYPES)
+@pytest.mark.parametrize("brightness,contrast,saturation", _PARAMS)
+def test_gui_matches_preset(app, image, process_type, brightness, contrast, saturation):
+    result = app.apply_image_processing(image, process_type, brightness, contrast, saturation)
+    expected = _preset(process_type, brightness, contrast, saturation).apply(image)
+    np.testing.assert_array_equal(np.asarray(result), np.asarray(expected))
+
+
+def test_progressive_noise_final_result_matches_preset(app, image):
+    app.apply_image_processing(image, "ノイズ処理", 1.3, 1.6, 1.0, progressive=True)
+    deadline = time.time() + 30
+    result = None
+    while result is None and time.time() < deadline:
+        result = app.denoiser.poll()
+        time.sleep(0.01)
+    assert result is not None
+    expected = _preset("ノイズ処理", 1.3, 1.6, 1.0).apply(image)
+    np.testing.assert_array_equal(np.asarray(result[1]), np.asarray(expected))
+
+
+@pytest.mark.parametrize("brightness,contrast,saturation", _PARAMS)
+def test_basic_matches_sequential_enhance(image, brightness, contrast, saturation):
+    expected = ImageEnhance.Brightness(image).enhance(brightness)
+    expected = ImageEnhance.Contrast(expected).enhance(contrast)
+    expected = ImageEnhance.Color(expected).enhance(saturation)
+    result = _preset("基本調整", brightness, contrast, saturation).apply(image)
+    np.testing.assert_array_equal(np.asarray(result), np.asarray(expected))
+
+
+@pytest.mark.parametrize("brightness,contrast,saturation", _PARAMS)
+def test_professional_matches_sequential_opencv(image, brightness, contrast, saturation):
+    rgb = np.asarray(image)
+    expected = rgb.copy()
+    if brightness > 1.2:
+        expected = cv2.merge([cv2.equalizeHist(channel) for channel in cv2.split(expected)])
+    if contrast != 1.0:
+        expected = (np.power(expected.astype(np.float32) / 255.0, 1.0 / contrast) * 255).astype(np.uint8)
+    if saturation > 1.0:
+        blurred = cv2.GaussianBlur(expected, (0, 0), 2.0)
+        expected = cv2.addWeighted(expected, 1.0 + saturation, blurred, -saturation, 0)
+    result = _preset("プロ補正", brightness, contrast, saturation).apply_array(rgb)
+    np.testing.assert_array_equal(result, expected)
+
+
+@pytest.mark.parametrize("brightness,contrast,saturation", [(1.3, 1.6, 1.7), (1.0, 1.0, 0.4)])
+def test_filter_matches_sequential_pil(image, brightness, contrast, saturation):
+    expected = ImageEnhance.Sharpness(image).enhance(brightness) if brightness > 1.0 else image
+    if contrast > 1.5:
+        expected = expected.filter(ImageFilter.EMBOSS)
+    if saturation > 1.5:
+        expected = expected.filter(ImageFilter.EDGE_ENHANCE_MORE)
+    result = _preset("フィルター効果", brightness, contrast, saturation).apply(image)
+    np.testing.assert_array_equal(np.asarray(result), np.asarray(expected))
+
+
+@pytest.mark.parametrize("brightness,contrast,saturation", _PARAMS)
+def test_vintage_matches_per_pixel_formula(image, brightness, contrast, saturation):
+    bgr = cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
+    bgr[:, :, 0] = np.clip(bgr[:, :, 0] * (0.8 + brightness * 0.2), 0, 255)
+    bgr[:, :, 1] = np.clip(bgr[:, :, 1] * (0.9 + contrast * 0.1), 0, 255)
+    bgr[:, :, 2] = np.clip(bgr[:, :, 2] * (1.0 + saturation * 0.2), 0, 255)
+    h, w = bgr.shape[:2]
+    Y, X = np.ogrid[:h, :w]
+    dist = np.sqrt((X - w // 2) ** 2 + (Y - h // 2) ** 2)
+    mask = np.clip(1 - (dist / np.sqrt((w // 2) ** 2 + (h // 2) ** 2)) * (0.3 + (saturation - 1.0) * 0.2), 0.3, 1.0)
+    for i in range(3):
+        bgr[:, :, i] = bgr[:, :, i] * mask
+    expected = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+    result = _preset("ヴィンテージ", brightness, contrast, saturation).apply(image)
+    np.testing.assert_array_equal(np.asarray(result), expected)
+
+
+_DENSITY_SETTINGS = {"density_adjustment": {"gamma": 1.4, "shadow": 20, "highlight": -10, "temperature": 15}}
+
+
+def test_plugin_settings_are_resolved_without_supplied_plugins(image):
+    # 一括適用（CLI）と同じく plugins を渡さずにコンパイルしても、保存されたプラグイン設定が適用される
+    from image_toolkit.plugins.density_plugin import DensityAdjustmentPlugin
+    compiled = ProcessingPreset("test", "基本調整", {}, _DENSITY_SETTINGS).compile()
+    assert [plugin.name for plugin in compiled.plugins] == ["density_adjustment"]
+    assert compiled.missing_plugins == []
+    expected = DensityAdjustmentPlugin().process_array(np.asarray(image), **_DENSITY_SETTINGS["density_adjustment"])
+    np.testing.assert_array_equal(np.asarray(compiled.apply(image)), expected)
+
+
+def test_gui_applies_loaded_plugin_settings(app, image):
+    app.plugin_settings = _DENSITY_SETTINGS
+    result = app.apply_image_processing(image, "色彩変換", 1.3, 1.0, 1.2)
+    expected = ProcessingPreset("test", "色彩変換", {"brightness": 1.3, "contrast": 1.0, "saturation": 1.2},
+                                _DENSITY_SETTINGS).compile().apply(image)
+    np.testing.assert_array_equal(np.asarray(result), np.asarray(expected))
+    assert not np.array_equal(np.asarray(result), np.asarray(_preset("色彩変換", 1.3, 1.0, 1.2).apply(image)))
+
+
+def test_missing_plugins_are_reported(capsys):
+    compiled = ProcessingPreset("test", "基本調整", {}, {"no_such_plugin": {}}).compile()
+    assert compiled.missing_plugins == ["no_such_plugin"]
+    assert "no_such_plugin" in capsys.readouterr().out
@@ -0,0 +1,42 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+# ResultsStore の追記・問い合わせ・チャンクの読み飛ばしとマニフェストのチャンク形式の検証
+
+import json
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from image_toolkit.core.results_store import MANIFEST_NAME, ResultsStore
+
+
+def test_append_and_query_across_chunks(tmp_path):
+    with ResultsStore(tmp_path, chunk_rows=4) as store:
+        store.extend({"path": f"{index}.png", "sharpness": float(index)} for index in range(10))
+        store.append({"path": "late.png", "sharpness": 100.0, "error": "broken"})
+    store = ResultsStore(tmp_path)
+    assert store.row_count() == 11
+    assert store.column_names() == ["path", "sharpness", "error"]
+    result = store.query("sharpness > 7", columns=["path"])
+    assert list(result["path"]) == ["8.png", "9.png", "late.png"]
+    assert len(list(store.iter_chunks(ranges={"sharpness": (50, None)}))) == 1
+
+
+def test_manifest_records_chunk_format(tmp_path):
+    with ResultsStore(tmp_path, chunk_rows=2) as store:
+        store.extend({"value": index} for index in range(3))
+    with open(tmp_path / MANIFEST_NAME, encoding="utf-8") as f:
+        manifest = json.load(f)
+    assert manifest["format"] == "parquet"
+    assert all(chunk["file"].endswith(".parquet") for chunk in manifest["chunks"])
+
+
+def test_unknown_chunk_format_is_rejected(tmp_path):
+    with open(tmp_path / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        json.dump({"format": "pickle", "chunks": [{"file": "chunk_000000.pkl.gz", "rows": 1,
+                                                   "columns": ["value"], "stats": {}}]}, f)
+    with pytest.raises(ValueError):
+        ResultsStore(tmp_path)
@@ -0,0 +1,80 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+# SharedMemoryExecutor の帯分割処理と一括処理の結果一致、SharedFramePool の再利用・解放の検証
+
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from image_toolkit.core.shared_memory_engine import SharedFramePool, SharedMemoryExecutor
+
+
+@pytest.fixture(scope="module")
+def executor():
+    with SharedMemoryExecutor(max_workers=2, bands_per_worker=3) as engine:
+        yield engine
+
+
+def _image(height=157, width=203, seed=0):
+    return (np.random.default_rng(seed).random((height, width, 3)) * 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize("task,params,reference", [
+    ("gaussian", {"sigma": 2.5}, lambda image: cv2.GaussianBlur(image, (0, 0), 2.5)),
+    ("bilateral", {"d": 9, "sigma_color": 60, "sigma_space": 60},
+     lambda image: cv2.bilateralFilter(image, 9, 60, 60)),
+])
+def test_banded_result_matches_whole_image(executor, task, params, reference):
+    image = _image()
+    np.testing.assert_array_equal(executor.run(task, image, params), reference(image))
+
+
+def test_single_band(executor):
+    image = _image(seed=1)
+    result = executor.run("gaussian", image, {"sigma": 1.5}, bands=1)
+    np.testing.assert_array_equal(result, cv2.GaussianBlur(image, (0, 0), 1.5))
+
+
+def test_pool_reuses_released_blocks_and_evicts_free_only():
+    pool = SharedFramePool()
+    try:
+        frame = pool.acquire((64, 64, 3))
+        name = frame.block.name
+        pool.release(frame)
+        reused = pool.acquire((32, 32, 3))
+        assert reused.block.name == name
+        # 使用中のブロックは evict の対象にならない
+        assert pool.evict(0) == 0
+        pool.release(reused)
+        assert pool.evict(0) > 0
+        assert pool.total_bytes() == 0
+    finally:
+        pool.close()
+
+
+def test_pool_concurrent_acquire_release_and_evict():
+    pool = SharedFramePool(max_free_blocks=2)
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(50):
+                frame = pool.acquire((16, 16, 3))
+                frame.array[...] = 1
+                pool.release(frame)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for _ in range(50):
+        pool.evict(0)
+    for thread in threads:
+        thread.join()
+    pool.close()
+    assert not errors
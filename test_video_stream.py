@@ -0,0 +1,44 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+# マルチページ画像の処理で、入力の圧縮方式・モード・ページ数が出力に引き継がれることの検証
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from image_toolkit.core.video_stream import process_multi_frame
+
+
+def _pages(mode, count=3):
+    rng = np.random.default_rng(0)
+    return [Image.fromarray((rng.random((32, 48, 3)) * 255).astype(np.uint8)).convert(mode) for _ in range(count)]
+
+
+@pytest.mark.parametrize("mode,compression", [
+    ("1", "group4"), ("1", "packbits"), ("L", "tiff_lzw"), ("RGB", "tiff_adobe_deflate"), ("RGB", "raw"),
+])
+def test_tiff_compression_is_preserved(tmp_path, mode, compression):
+    source = tmp_path / "source.tif"
+    pages = _pages(mode)
+    pages[0].save(source, save_all=True, append_images=pages[1:], compression=compression)
+    target = tmp_path / "target.tif"
+    process_multi_frame(str(source), str(target), lambda frame: frame)
+    with Image.open(target) as image:
+        assert image.n_frames == len(pages)
+        for index in range(image.n_frames):
+            image.seek(index)
+            assert image.mode == mode
+            assert image.info.get("compression") == compression
+
+
+def test_gif_to_tiff_is_written_uncompressed(tmp_path):
+    source = tmp_path / "source.gif"
+    pages = _pages("RGB")
+    pages[0].save(source, save_all=True, append_images=pages[1:], duration=50, loop=0)
+    target = tmp_path / "target.tif"
+    process_multi_frame(str(source), str(target), lambda frame: frame)
+    with Image.open(target) as image:
+        assert image.n_frames == len(pages)
+        assert image.info.get("compression") == "raw"